@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+# Annotates sequencing reads with the tables produced by the pipeline.
+#
+# Usage:
+#   python3 annotate.py --names=<.names file> [--lookup=<.lookup file>]
+#       [--occurrences=<occurrences file> | --sources=<sources file>]
+#       [READS FILE]
+#   python3 annotate.py --fragment-table=<fragment table file>
+#       [--occurrences=<occurrences file>] [READS FILE]
+#
+# Each read which is one of the fragments listed in the .names file
+# (or in the fragment table written by fragment_table.py) is printed
+# on a line of the following form.
+#
+#   <read name> <read> <fragment types> <Y|N> <source tRNAs>
+#
+# The fields are separated by tabs. The read name is taken from the
+# FASTQ header, or is the (1-based) number of the read in a plain
+# file holding one read per line. The fragment types are the
+# comma-separated types listed in the .names file; the Y/N field is
+# taken from the .lookup file, and the source tRNAs from the table
+# written by occurrences.py or from the sources file written by
+# naming.py --sources. A field whose table was not given, or
+# which is empty, is printed as a '-'. With --all, reads which are
+# not fragments are printed as well, with '-' in every field.
+#
+# The .names and .lookup tables are loaded into a dictionary. A
+# fragment table is instead mapped into memory and binary searched,
+# which is slower per read but starts at once and needs little memory.
+#
+# Reads are read from the reads file, or from stdin, which may be
+# FASTQ or plain, and may be gzip-compressed. They are annotated in
+# batches of --batch-size reads, and the number of reads annotated per
+# second is reported on stderr. With --processes greater than 1, the
+# main process only cuts the input into blocks of the lines of a batch,
+# which are passed to the worker processes as single strings; the
+# workers parse and annotate the reads, and return their output as a
+# single string as well, so that little is pickled either way.
+#
+# Sample usage:
+#
+#   python3 annotate.py \
+#       --names=gen/mm10/mm10-tRNAs.names \
+#       --lookup=gen/mm10/mm10-tRNAs.lookup \
+#       --occurrences=gen/mm10/mm10-tRNAs.occurrences.gz \
+#       reads/sample1.fastq.gz \
+#       --processes=8 \
+#       >gen/mm10/sample1.annotations
+
+import argparse
+import gzip
+import io
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+import fragment_sources
+import fragment_table
+import trnapy
+
+
+# Number of reads annotated at a time by a worker.
+DEFAULT_BATCH_SIZE = 1 << 16
+
+# The first bytes of a gzip file.
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Seconds between reports of the throughput.
+REPORT_INTERVAL = 10
+
+
+# Opens the file at path for reading text, decompressing it if its
+# name ends in .gz. Opens stdin if path is None, decompressing it if
+# it starts with GZIP_MAGIC.
+def OpenText(path):
+    if path is None:
+        if sys.stdin.buffer.peek(len(GZIP_MAGIC)).startswith(GZIP_MAGIC):
+            return gzip.open(sys.stdin.buffer, "rt")
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+
+# Returns a dictionary mapping each fragment listed in the .names file
+# to its annotation: the types, Y/N and source tRNAs fields of the
+# output, joined by tabs. lookup_file and occurrences_file may be
+# None. If sources, a FragmentSources object, is given, the source
+# tRNAs are taken from it rather than from occurrences_file.
+def LoadAnnotations(names_file, lookup_file=None, occurrences_file=None,
+        sources=None):
+    types = {}
+    for line in names_file:
+        fields = line.rstrip("\n").split("\t", 1)
+        if not fields[0]:
+            continue
+        fragment_types = fields[1].replace(" ", "") if len(fields) > 1 \
+                else ""
+        types[fields[0]] = fragment_types or "-"
+
+    exclusive = {}
+    if lookup_file is not None:
+        for line in lookup_file:
+            fields = line.split()
+            if fields:
+                exclusive[fields[0]] = fields[1]
+
+    trnas = {}
+    if sources is not None:
+        # Fragment ids are line numbers in the .names file, which
+        # types holds in order.
+        for fragment_id, fragment in enumerate(types):
+            trnas[fragment] = sorted(set(map(trnapy.DropExpansion,
+                sources.trnas(fragment_id))))
+    elif occurrences_file is not None:
+        trnas = LoadSources(occurrences_file)
+
+    return {fragment: "\t".join([fragment_types,
+        exclusive.get(fragment, "-"),
+        ",".join(trnas.get(fragment, ())) or "-"])
+        for fragment, fragment_types in types.items()}
+
+
+# Returns a dictionary mapping each fragment listed in the table
+# written by occurrences.py to the sorted list of its source tRNAs.
+def LoadSources(occurrences_file):
+    sources = {}
+    for line in occurrences_file:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 5 or fields[4] == "-":
+            continue
+        if fields[0] not in sources:
+            sources[fields[0]] = set()
+        sources[fields[0]].update(fields[4].split(","))
+    return {fragment: sorted(trnas) for fragment, trnas in sources.items()}
+
+
+# Returns the annotation of fragment, as LoadAnnotations() would, from
+# a FragmentTable and the sources returned by LoadSources(), or None
+# if fragment is not in the table.
+def TableAnnotation(table, sources, fragment):
+    entry = table.lookup(fragment)
+    if entry is None:
+        return None
+    types, exclusive = entry
+    return "\t".join([",".join(types) if types else "-",
+        "-" if exclusive is None else "Y" if exclusive else "N",
+        ",".join(sources.get(fragment, ())) or "-"])
+
+
+# Yields a pair (read name, read) for each read in reads_file, which
+# may be FASTQ or hold one read per line. Reads are uppercased.
+# first_number is the number of the first line of a plain file.
+def ReadReads(reads_file, first_number=1):
+    first_line = reads_file.readline()
+    lines = itertools.chain([first_line], reads_file)
+    if first_line.startswith("@"):
+        for header, read, separator, quality in zip(*[lines] * 4):
+            yield header[1:].split(None, 1)[0], read.strip().upper()
+    else:
+        for number, line in enumerate(lines, first_number):
+            read = line.strip()
+            if read:
+                yield str(number), read.upper()
+
+
+# Yields the reads in batches of batch_size.
+def Batches(reads, batch_size):
+    while True:
+        batch = list(itertools.islice(reads, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# Yields the lines of reads_file in blocks holding batch_size reads,
+# as pairs (number of the first line, text of the lines), from which
+# ReadReads() reads the reads of the block.
+def TextBatches(reads_file, batch_size):
+    first_line = reads_file.readline()
+    lines = itertools.chain([first_line], reads_file)
+    # A FASTQ read takes four lines.
+    batch_lines = 4 * batch_size if first_line.startswith("@") \
+            else batch_size
+    number = 1
+    while True:
+        batch = list(itertools.islice(lines, batch_lines))
+        if not batch:
+            return
+        yield number, "".join(batch)
+        number += len(batch)
+
+
+# The annotations used by AnnotateBatch(): either a dictionary
+# returned by LoadAnnotations(), or a FragmentTable and the sources
+# returned by LoadSources(). Worker processes inherit them from the
+# process which forked them, rather than each loading the tables.
+_annotations = {}
+_table = None
+_sources = {}
+_print_all = False
+
+_UNANNOTATED = "\t".join(["-"] * 3)
+
+
+# Returns the output for a batch of (read name, read) pairs, as a
+# string, and the number of reads in the batch.
+def AnnotateBatch(batch):
+    lines = []
+    count = 0
+    for name, read in batch:
+        count += 1
+        if _table is not None:
+            annotation = TableAnnotation(_table, _sources, read)
+        else:
+            annotation = _annotations.get(read)
+        if annotation is not None:
+            lines.append(name + "\t" + read + "\t" + annotation + "\n")
+        elif _print_all:
+            lines.append(name + "\t" + read + "\t" + _UNANNOTATED + "\n")
+    return "".join(lines), count
+
+
+# Returns the output for a block of reads yielded by TextBatches(), as
+# AnnotateBatch() does.
+def AnnotateTextBatch(text_batch):
+    first_number, text = text_batch
+    return AnnotateBatch(ReadReads(io.StringIO(text), first_number))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description="Annotates reads with the fragment tables.")
+    parser.add_argument("reads_file", nargs="?")
+    table_group = parser.add_mutually_exclusive_group(required=True)
+    table_group.add_argument("--names")
+    table_group.add_argument("--fragment-table")
+    parser.add_argument("--lookup")
+    sources_group = parser.add_mutually_exclusive_group()
+    sources_group.add_argument("--occurrences")
+    sources_group.add_argument("--sources")
+    parser.add_argument("--all", action="store_true")
+    parser.add_argument("-j", "--processes", type=int,
+            default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int,
+            default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+    if args.processes < 1 or args.batch_size < 1:
+        parser.error("--processes and --batch-size must be positive")
+
+    if args.fragment_table is not None and args.lookup is not None:
+        parser.error("--lookup cannot be used with --fragment-table")
+    if args.fragment_table is not None and args.sources is not None:
+        parser.error("--sources cannot be used with --fragment-table")
+
+    occurrences_file = None if args.occurrences is None else \
+            OpenText(args.occurrences)
+    if args.fragment_table is not None:
+        _table = fragment_table.FragmentTable(args.fragment_table)
+        if occurrences_file is not None:
+            _sources = LoadSources(occurrences_file)
+    else:
+        with open(args.names, 'r') as names_file:
+            lookup_file = None if args.lookup is None else \
+                    open(args.lookup, 'r')
+            sources = None if args.sources is None else \
+                    fragment_sources.FragmentSources(args.sources)
+            _annotations = LoadAnnotations(names_file, lookup_file,
+                    occurrences_file, sources)
+            if sources is not None:
+                sources.close()
+            if lookup_file is not None:
+                lookup_file.close()
+    if occurrences_file is not None:
+        occurrences_file.close()
+    _print_all = args.all
+
+    reads_file = OpenText(args.reads_file)
+    if args.processes > 1:
+        pool = multiprocessing.get_context("fork").Pool(args.processes)
+        results = pool.imap(AnnotateTextBatch,
+                TextBatches(reads_file, args.batch_size))
+    else:
+        pool = None
+        results = map(AnnotateBatch,
+                Batches(ReadReads(reads_file), args.batch_size))
+
+    start_time = time.monotonic()
+    last_report = start_time
+    annotated = 0
+    for output, count in results:
+        sys.stdout.write(output)
+        annotated += count
+        now = time.monotonic()
+        if not args.quiet and now - last_report >= REPORT_INTERVAL:
+            print("{} reads, {:.0f} reads/s".format(annotated,
+                annotated / (now - start_time)), file=sys.stderr)
+            last_report = now
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    reads_file.close()
+    if not args.quiet:
+        elapsed = time.monotonic() - start_time
+        print("{} reads, {:.0f} reads/s".format(annotated,
+            annotated / elapsed if elapsed > 0 else 0), file=sys.stderr)
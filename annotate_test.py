@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+import io
+
+import annotate
+import testing
+
+ut = testing.UnitTestCollection()
+
+names_file_text = "ACGTACGTACGTACGT\ti-tRF, 5'-tRF\nTTTTGGGGCCCCAAAA\t3'-tRH\n"
+lookup_file_text = "ACGTACGTACGTACGT\tY\nTTTTGGGGCCCCAAAA\tN\n"
+occurrences_file_text = \
+        "ACGTACGTACGTACGT\tchr1\t10-25\t+\tchr1.trna7,chr2.trna9\n" \
+        "ACGTACGTACGTACGT\tchr3\t50-65\t-\tchr3.trna1\n"
+
+
+@ut()
+def LoadAnnotations_test():
+    annotations = annotate.LoadAnnotations(io.StringIO(names_file_text),
+            io.StringIO(lookup_file_text),
+            io.StringIO(occurrences_file_text))
+    ut.ExpectEq(annotations, {
+        "ACGTACGTACGTACGT":
+            "i-tRF,5'-tRF\tY\tchr1.trna7,chr2.trna9,chr3.trna1",
+        "TTTTGGGGCCCCAAAA": "3'-tRH\tN\t-"})
+    annotations = annotate.LoadAnnotations(io.StringIO(names_file_text))
+    ut.ExpectEq(annotations["TTTTGGGGCCCCAAAA"], "3'-tRH\t-\t-")
+
+
+@ut()
+def ReadReads_test():
+    fastq = io.StringIO("@read1 extra\nacgt\n+\nIIII\n@read2\nTTTT\n+\nIIII\n")
+    ut.ExpectEq(list(annotate.ReadReads(fastq)),
+            [("read1", "ACGT"), ("read2", "TTTT")])
+    plain = io.StringIO("ACGT\n\nTTTT\n")
+    ut.ExpectEq(list(annotate.ReadReads(plain)),
+            [("1", "ACGT"), ("3", "TTTT")])
+
+
+@ut()
+def AnnotateBatch_test():
+    annotate._annotations = annotate.LoadAnnotations(
+            io.StringIO(names_file_text), io.StringIO(lookup_file_text))
+    output, count = annotate.AnnotateBatch(
+            [("r1", "TTTTGGGGCCCCAAAA"), ("r2", "ACGT")])
+    ut.ExpectEq(count, 2)
+    ut.ExpectEq(output, "r1\tTTTTGGGGCCCCAAAA\t3'-tRH\tN\t-\n")
+
+
+@ut()
+def AnnotateTextBatch_test():
+    annotate._annotations = annotate.LoadAnnotations(
+            io.StringIO(names_file_text), io.StringIO(lookup_file_text))
+    plain = "ACGT\n\nTTTTGGGGCCCCAAAA\n"
+    batches = list(annotate.TextBatches(io.StringIO(plain), 2))
+    ut.ExpectEq(batches, [(1, "ACGT\n\n"), (3, "TTTTGGGGCCCCAAAA\n")])
+    ut.ExpectEq(list(map(annotate.AnnotateTextBatch, batches)),
+            [("", 1), ("3\tTTTTGGGGCCCCAAAA\t3'-tRH\tN\t-\n", 1)])
+    fastq = "@r1\nACGT\n+\nIIII\n@r2\nTTTTGGGGCCCCAAAA\n+\nIIII\n"
+    ut.ExpectEq(list(annotate.TextBatches(io.StringIO(fastq), 1)),
+            [(1, "@r1\nACGT\n+\nIIII\n"),
+            (5, "@r2\nTTTTGGGGCCCCAAAA\n+\nIIII\n")])
+
+
+if __name__ == "__main__":
+    ut.RunTests()
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+# Builds the tables of several genomes in a single run.
+#
+# Usage:
+#   python3 batch.py <manifest file> --output-dir=<directory>
+#       [pipeline.py scanning options]
+#
+# Each line of the manifest describes a genome:
+#
+#   <genome name> <ss|fa|trna> <tRNA records file> <haystack files>
+#
+# The haystack files are the preprocessed chromosomes of the genome,
+# and may be given as glob patterns (e.g. gen/rn6/chr/*.fa.mint). With
+# --scanner=python, they may also be (gzip-compressed) multi-record
+# FASTA files, such as the whole genome in a single file.
+# Blank lines and lines starting with '#' are skipped.
+#
+# The tRNA records of each genome are read once, and used to write
+# its .names and .patterns files and to build its tRNA space. Every
+# chromosome of every genome is then scanned by a single set of
+# scanners and containment workers (see pipeline.py), with at most
+# --jobs scans running at once, and the .lookup file of each genome is
+# written. The files of a genome are written to
+#
+#   <output dir>/<genome name>/<genome name>-tRNAs.{names,patterns,lookup}
+#
+# and, with --keep-matches, the matches of each chromosome to
+# <output dir>/<genome name>/matches/<chromosome>.matches.
+#
+# Fragments are given ids shared by all the genomes: the sorted union
+# of the fragments of every genome is written to
+# <output dir>/all-tRNAs.names, and the id of a fragment is its
+# (0-based) line number in that file (see trnapy.NamesFile).
+# A fragment found in several genomes is stored once, and the results
+# of the scans are kept, per genome, in an array indexed by this id.
+#
+# With --shared-index (and --scanner=python), the pattern index of
+# each genome is built once, in shared memory, for all its scanners.
+#
+# Sample usage:
+#
+#   python3 batch.py genomes.txt --output-dir=gen \
+#       --jobs=16 --workers=8
+#
+# where genomes.txt holds
+#
+#   hg19 ss data/hg19/hg19-tRNAs-confidence-set.ss gen/hg19/chr/*.mint
+#   mm10 ss data/mm10/mm10-tRNAs-confidence-set.ss gen/mm10/chr/*.mint
+#   rn6 ss data/rn6/rn6-tRNAs-confidence-set.ss gen/rn6/chr/*.mint
+
+import argparse
+import array
+import asyncio
+import bisect
+import copy
+import glob
+import heapq
+import os
+
+import extsort
+import naming
+import output
+import patterns_and_intervals
+import pipeline
+import reduced_postprocess
+import trnapy
+from trnapy import FileFormat
+
+
+_FILE_FORMATS = {
+    "ss": FileFormat.SS,
+    "fa": FileFormat.FA,
+    "trna": FileFormat.TRNA,
+}
+
+
+# A genome listed in the manifest, and the files written for it.
+class Genome:
+    def __init__(self, name, file_format, records_path, haystack_paths,
+            output_dir):
+        self.name = name
+        self.file_format = file_format
+        self.records_path = records_path
+        self.haystack_paths = haystack_paths
+        self.directory = os.path.join(output_dir, name)
+        self.names_path = os.path.join(self.directory,
+                name + "-tRNAs.names")
+        self.patterns_path = os.path.join(self.directory,
+                name + "-tRNAs.patterns")
+        self.lookup_path = os.path.join(self.directory,
+                name + "-tRNAs.lookup")
+        self.matches_dir = os.path.join(self.directory, "matches")
+        # The sorted global ids of the fragments of the genome.
+        self.fragment_ids = None
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "<Genome " + self.name + " with " + \
+                str(len(self.haystack_paths)) + " haystacks>"
+
+
+# Reads the genomes listed in manifest_file. Raises ValueError if a
+# line is malformed, or if a genome is listed twice.
+def ReadManifest(manifest_file, output_dir):
+    genomes = []
+    for line_number, line in enumerate(manifest_file, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        if len(fields) < 4 or fields[1] not in _FILE_FORMATS:
+            raise ValueError("Malformed manifest line " +
+                    str(line_number) + ": " + line.strip())
+        if any(genome.name == fields[0] for genome in genomes):
+            raise ValueError("Genome listed twice: " + fields[0])
+        haystack_paths = []
+        for pattern in fields[3:]:
+            haystack_paths.extend(sorted(glob.glob(pattern)) or [pattern])
+        genomes.append(Genome(fields[0], _FILE_FORMATS[fields[1]],
+            fields[2], haystack_paths, output_dir))
+    return genomes
+
+
+# Reads the tRNA records of genome, writes its .names and .patterns
+# files, and returns its tRNA space and the sorted list of its
+# fragments.
+def PrepareGenome(genome, buffer_size, temp_dir):
+    with open(genome.records_path, 'r') as records_file:
+        trna_records = trnapy.ReadTRNARecords(records_file,
+                genome.file_format)
+    trna_records.AddCCAToAll()
+    trna_records.ExpandAll()
+
+    with output.OutputWriter(genome.patterns_path) as patterns_file:
+        patterns_file.WriteLines(
+                patterns_and_intervals.PatternRecords(trna_records))
+
+    with_types = genome.file_format == FileFormat.SS
+    fragments = []
+    with output.OutputWriter(genome.names_path) as names_file:
+        for sequence, types, sources in naming.EnumerateSortedFragments(
+                list(trna_records), with_types, buffer_size=buffer_size,
+                temp_dir=temp_dir):
+            fragments.append(sequence)
+            if with_types:
+                names_file.WriteLine(sequence + "\t" +
+                        ", ".join(map(str, naming.SortedTypes(types))))
+            else:
+                names_file.WriteLine(sequence)
+
+    return trnapy.ConstructTRNASpace(trna_records), fragments
+
+
+# Returns the sorted union of the sorted lists of fragments of the
+# genomes, and sets the fragment_ids of each genome to the positions
+# of its fragments in the union. The positions are found by binary
+# search, each starting from the last one found.
+def AssignFragmentIds(genomes, genome_fragments):
+    all_fragments = list(extsort.UniqueSorted(
+        heapq.merge(*genome_fragments)))
+    for genome, fragments in zip(genomes, genome_fragments):
+        genome.fragment_ids = array.array("I")
+        fragment_id = 0
+        for fragment in fragments:
+            fragment_id = bisect.bisect_left(all_fragments, fragment,
+                    fragment_id)
+            genome.fragment_ids.append(fragment_id)
+    return all_fragments
+
+
+# Writes the .lookup file of genome from the results of its scans, as
+# returned by pipeline.RunScans().
+def WriteGenomeLookup(genome, all_fragments, outside_trna_space,
+        closest_outside_trna_space, graded):
+    closest = bytearray([reduced_postprocess.NOT_OUTSIDE_TRNA_SPACE]) * \
+            len(all_fragments)
+    # Fragments which are not in any .names file are ignored, as
+    # reduced_postprocess.py ignores them.
+    for fragment in outside_trna_space:
+        fragment_id = trnapy.FindFragment(all_fragments, fragment)
+        if fragment_id is not None:
+            closest[fragment_id] = 0
+    if closest_outside_trna_space is not None:
+        for fragment, mismatches in closest_outside_trna_space.items():
+            fragment_id = trnapy.FindFragment(all_fragments, fragment)
+            if fragment_id is not None:
+                closest[fragment_id] = min(closest[fragment_id],
+                        mismatches)
+
+    with output.OutputWriter(genome.lookup_path) as lookup_file:
+        reduced_postprocess.WriteLookupTableFromIds(
+                [all_fragments[i] for i in genome.fragment_ids],
+                bytes(closest[i] for i in genome.fragment_ids),
+                lookup_file, graded)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the .names, "
+            ".patterns and .lookup tables of several genomes at once.")
+    parser.add_argument("manifest_file")
+    parser.add_argument("-o", "--output-dir", required=True)
+    parser.add_argument("--keep-matches", action="store_true")
+    parser.add_argument("--buffer-size", type=int,
+            default=naming.DEFAULT_BUFFER_SIZE)
+    parser.add_argument("--temp-dir")
+    pipeline.AddScanArguments(parser)
+    args = parser.parse_args()
+    pipeline.CheckScanArguments(parser, args)
+    # The fragments named are those the scanners look for.
+    naming.range_lower = args.range_lower
+    naming.range_upper = args.range_upper
+
+    with open(args.manifest_file, 'r') as manifest_file:
+        try:
+            genomes = ReadManifest(manifest_file, args.output_dir)
+        except ValueError as error:
+            parser.error(str(error))
+
+    pipeline.CheckHaystackFiles(parser, args, [haystack_path
+        for genome in genomes for haystack_path in genome.haystack_paths])
+
+    trna_spaces = {}
+    genome_fragments = []
+    for genome in genomes:
+        os.makedirs(genome.directory, exist_ok=True)
+        if args.keep_matches:
+            os.makedirs(genome.matches_dir, exist_ok=True)
+        trna_space, fragments = PrepareGenome(genome, args.buffer_size,
+                args.temp_dir)
+        trna_spaces[genome.name] = trna_space
+        genome_fragments.append(fragments)
+
+    all_fragments = AssignFragmentIds(genomes, genome_fragments)
+    del genome_fragments
+    with output.OutputWriter(os.path.join(args.output_dir,
+            "all-tRNAs.names")) as names_file:
+        names_file.WriteLines(all_fragments)
+
+    shared_indexes = []
+    haystack_scans = []
+    try:
+        for genome in genomes:
+            scan_args = copy.copy(args)
+            scan_args.patterns_file = genome.patterns_path
+            scan_args.matches_dir = genome.matches_dir \
+                    if args.keep_matches else None
+            scan_args.shared_index_name = None
+            if args.shared_index:
+                shared_indexes.append(pipeline.CreateSharedIndex(args,
+                    genome.patterns_path))
+                scan_args.shared_index_name = shared_indexes[-1].name
+            haystack_scans.extend((scan_args, genome.name, haystack_path)
+                    for haystack_path in genome.haystack_paths)
+
+        results = asyncio.run(pipeline.RunScans(args, haystack_scans,
+            trna_spaces))
+    finally:
+        for shared_index in shared_indexes:
+            shared_index.close()
+            shared_index.unlink()
+
+    for genome in genomes:
+        outside_trna_space, closest_outside_trna_space = \
+                results[genome.name]
+        WriteGenomeLookup(genome, all_fragments, outside_trna_space,
+                closest_outside_trna_space, args.graded)
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+
+import io
+
+import batch
+import testing
+from trnapy import FileFormat
+
+ut = testing.UnitTestCollection()
+
+
+@ut()
+def ReadManifest_test():
+    manifest = io.StringIO("# genomes\n\n"
+            "rn6 ss data/rn6.ss gen/rn6/chr1.mint gen/rn6/chr2.mint\n"
+            "hg19 fa data/hg19.fa gen/hg19/chr1.mint\n")
+    genomes = batch.ReadManifest(manifest, "gen")
+    ut.ExpectEq([genome.name for genome in genomes], ["rn6", "hg19"])
+    ut.ExpectEq(genomes[0].file_format, FileFormat.SS)
+    ut.ExpectEq(genomes[0].haystack_paths,
+            ["gen/rn6/chr1.mint", "gen/rn6/chr2.mint"])
+    ut.ExpectEq(genomes[1].lookup_path, "gen/hg19/hg19-tRNAs.lookup")
+
+    for bad_manifest in ["rn6 ss data/rn6.ss\n",
+            "rn6 gff data/rn6.ss gen/rn6/chr1.mint\n",
+            "rn6 ss a b\nrn6 ss c d\n"]:
+        try:
+            batch.ReadManifest(io.StringIO(bad_manifest), "gen")
+            ut.ExpectEq(bad_manifest, "rejected")
+        except ValueError:
+            pass
+
+
+@ut()
+def AssignFragmentIds_test():
+    genomes = batch.ReadManifest(io.StringIO(
+        "a ss a.ss a.mint\nb ss b.ss b.mint\n"), "gen")
+    all_fragments = batch.AssignFragmentIds(genomes,
+            [["AAC", "CGT", "TTA"], ["AAA", "CGT"]])
+    ut.ExpectEq(all_fragments, ["AAA", "AAC", "CGT", "TTA"])
+    ut.ExpectEq(list(genomes[0].fragment_ids), [1, 2, 3])
+    ut.ExpectEq(list(genomes[1].fragment_ids), [0, 2])
+
+
+if __name__ == "__main__":
+    ut.RunTests()
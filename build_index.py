@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+# Compiles a .patterns file into an index file which scanner.py can
+# map into memory (see flat_index.py), instead of building the index
+# each time it runs.
+#
+# The range and wildcard arguments are those of scanner.py, and must
+# match the ones the scanner is run with. The index file records a
+# digest of the patterns file and of the arguments, so a stale index
+# file is detected, and rebuilt, by scanner.py --index-file.
+#
+# Sample usage:
+#
+#   python3 build_index.py \
+#       gen/mm10/mm10-tRNAs.patterns \
+#       gen/mm10/mm10-tRNAs.index \
+#       --range-lower=16 --range-upper=50
+
+import argparse
+
+import flat_index
+import pattern_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description="Compiles a patterns file into an index file.")
+    parser.add_argument("patterns_file")
+    parser.add_argument("index_file")
+    parser.add_argument("--range-lower", type=int, default=16)
+    parser.add_argument("--range-upper", type=int, default=50)
+    parser.add_argument("-p", "--pattern-wildcard")
+    parser.add_argument("--max-wildcards", type=int,
+            default=pattern_index.DEFAULT_MAX_WILDCARDS)
+    parser.add_argument("--both-strands", action="store_true")
+    parser.add_argument("--force", action="store_true",
+            help="Rebuilds the index file even if it is up to date.")
+    args = parser.parse_args()
+
+    if args.pattern_wildcard is not None and \
+            len(args.pattern_wildcard) != 1:
+        parser.error("wildcards must be single characters")
+
+    digest = flat_index.IndexDigest(args.patterns_file, args.range_lower,
+            args.range_upper, args.pattern_wildcard, args.max_wildcards,
+            args.both_strands)
+    index = None if args.force else \
+            flat_index.OpenIndexFile(args.index_file, digest)
+    if index is not None:
+        index.close()
+    else:
+        with open(args.patterns_file, 'r') as patterns_file:
+            patterns = pattern_index.ReadPatternsFile(patterns_file)
+        flat_index.WriteIndexFile(pattern_index.PatternIndex(patterns,
+            args.range_lower, args.range_upper,
+            pattern_wildcard=args.pattern_wildcard,
+            max_wildcards=args.max_wildcards,
+            both_strands=args.both_strands), digest, args.index_file)
@@ -0,0 +1,158 @@
+# This module lets a long scan be stopped, e.g. by the preemption of
+# the node it runs on, and resumed where it left off.
+#
+# A ResumableWriter writes the .matches file at path under the name
+# <path>.incomplete, and renames it to path only once the scan is
+# complete, so that a file under its real name is always a finished
+# one. From time to time, the scanner calls SaveCheckpoint() at a
+# point where every match starting before some position of the
+# haystack has been written and none after it: the output is then
+# flushed to disk, and the position, along with the size of the
+# output, is recorded in the checkpoint file <path>.checkpoint, which
+# is replaced atomically.
+#
+# A writer opened again on the same path finds the checkpoint, cuts
+# the incomplete file back to the recorded size, and holds the
+# position in resume_point, from which the scanner carries on. The
+# checkpoint records a digest of the arguments of the scan, and a
+# writer given another digest refuses to resume from it.
+#
+# Sample usage:
+#
+#   with checkpoint.ResumableWriter(path, digest) as output_file:
+#       for record_index, position, lines in Scan(
+#               output_file.resume_point):
+#           output_file.WriteLines(lines)
+#           if output_file.CheckpointDue():
+#               output_file.SaveCheckpoint(record_index, position)
+
+import os
+import time
+
+import output
+
+
+# Suffixes of the names of the incomplete output file and of the
+# checkpoint file.
+INCOMPLETE_SUFFIX = ".incomplete"
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+# Number of seconds between two checkpoints, by default.
+DEFAULT_CHECKPOINT_INTERVAL = 300
+
+
+# Reads the checkpoint file at path, and returns a tuple (digest,
+# record index, position, output size), or None if there is no such
+# file. Raises ValueError if the file is malformed.
+def ReadCheckpoint(path):
+    try:
+        with open(path, 'r') as checkpoint_file:
+            fields = checkpoint_file.read().split()
+    except FileNotFoundError:
+        return None
+    if len(fields) != 4:
+        raise ValueError("malformed checkpoint file " + path)
+    return (fields[0],) + tuple(map(int, fields[1:]))
+
+
+# Writes lines of text to the file at path, with checkpoints from
+# which a scan which was stopped can be resumed.
+#
+# resume_point is None for a new scan, and otherwise the pair (record
+# index, position) last passed to SaveCheckpoint().
+class ResumableWriter:
+    def __init__(self, path, digest,
+            interval=DEFAULT_CHECKPOINT_INTERVAL,
+            batch_size=output.DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.incomplete_path = path + INCOMPLETE_SUFFIX
+        self.checkpoint_path = path + CHECKPOINT_SUFFIX
+        self.digest = digest
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lines = []
+        self.resume_point = None
+
+        checkpoint = ReadCheckpoint(self.checkpoint_path)
+        if checkpoint is not None and \
+                os.path.exists(self.incomplete_path):
+            checkpoint_digest, record_index, position, size = checkpoint
+            if checkpoint_digest != digest:
+                raise ValueError("the checkpoint " + self.checkpoint_path +
+                        " was written by a scan with other arguments")
+            self.file = open(self.incomplete_path, 'r+b')
+            # Drops what was written after the checkpoint.
+            self.file.truncate(size)
+            self.file.seek(size)
+            self.resume_point = (record_index, position)
+        else:
+            self.file = open(self.incomplete_path, 'wb')
+        self.last_save = time.monotonic()
+
+    def __str__(self):
+        return "<ResumableWriter to " + self.path + ">"
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    # The incomplete file and its checkpoint are left in place if the
+    # scan fails, so that it can be resumed.
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+    # Writes line, which should not end in a newline.
+    def WriteLine(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.batch_size:
+            self._WriteBatch()
+
+    def WriteLines(self, lines):
+        for line in lines:
+            self.WriteLine(line)
+
+    def flush(self):
+        self._WriteBatch()
+        self.file.flush()
+
+    # Returns True iff interval seconds have passed since the last
+    # checkpoint.
+    def CheckpointDue(self):
+        return time.monotonic() - self.last_save >= self.interval
+
+    # Records a checkpoint, after which the scan resumes at position
+    # of the record numbered record_index. Every match before that
+    # point should have been written, and none after it.
+    def SaveCheckpoint(self, record_index, position):
+        self.flush()
+        os.fsync(self.file.fileno())
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, 'w') as checkpoint_file:
+            checkpoint_file.write("\t".join([self.digest, str(record_index),
+                str(position), str(self.file.tell())]) + "\n")
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+        self.last_save = time.monotonic()
+
+    # Writes out what is left, moves the file into place, and removes
+    # the checkpoint.
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.incomplete_path, self.path)
+        if os.path.exists(self.checkpoint_path):
+            os.unlink(self.checkpoint_path)
+
+    def _WriteBatch(self):
+        if self.lines:
+            self.file.write(("\n".join(self.lines) + "\n").encode())
+            self.lines = []
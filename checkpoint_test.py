@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+
+import checkpoint
+import testing
+
+ut = testing.UnitTestCollection()
+
+
+@ut()
+def ResumableWriter_test():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chr1.matches")
+        try:
+            with checkpoint.ResumableWriter(path, "digest", 0,
+                    batch_size=2) as output_file:
+                ut.ExpectEq(output_file.resume_point, None)
+                output_file.WriteLines(["header", "a", "b"])
+                output_file.SaveCheckpoint(0, 100)
+                output_file.WriteLines(["c", "d", "e"])
+                raise ValueError()
+        except ValueError:
+            pass
+        # The stopped scan is marked as incomplete.
+        ut.ExpectEq(sorted(os.listdir(directory)), ["chr1.matches.checkpoint",
+            "chr1.matches.incomplete"])
+
+        with checkpoint.ResumableWriter(path, "digest", 0) as output_file:
+            ut.ExpectEq(output_file.resume_point, (0, 100))
+            output_file.SaveCheckpoint(2, 50)
+            output_file.WriteLine("f")
+        with open(path, "r") as matches_file:
+            ut.ExpectEq(matches_file.read(), "header\na\nb\nf\n")
+        ut.ExpectEq(os.listdir(directory), ["chr1.matches"])
+
+
+@ut()
+def ResumableWriter_digest_test():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chr1.matches")
+        output_file = checkpoint.ResumableWriter(path, "digest")
+        output_file.SaveCheckpoint(0, 10)
+        output_file.file.close()
+        ut.ExpectEq(checkpoint.ReadCheckpoint(path + ".checkpoint"),
+                ("digest", 0, 10, 0))
+        try:
+            checkpoint.ResumableWriter(path, "other digest")
+            ut.ExpectEq("resumed", "refused")
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    ut.RunTests()
@@ -0,0 +1,145 @@
+# This module provides an external merge sort for streams of records
+# which are too large to be held in memory all at once.
+#
+# Records are collected into sorted runs. Whenever the in-memory
+# buffer fills up, it is sorted and spilled to a temporary file.
+# The runs are then combined with a k-way merge (heapq.merge), which
+# holds only one block of records per run in memory at a time.
+#
+# Records can be any picklable objects which can be compared with
+# one another, typically tuples.
+
+import heapq
+import pickle
+import tempfile
+
+
+# Number of records held in memory before they are spilled.
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+# Number of records written to a run file with each call to pickle.
+RUN_BLOCK_SIZE = 1 << 12
+
+# Maximum number of runs merged at once. If there are more runs than
+# this, groups of them are first merged into longer runs.
+MAX_MERGE_FAN_IN = 64
+
+
+# Yields the records in iterable, dropping each record equal to the
+# one before it. If iterable is sorted, the result holds no repeats.
+def UniqueSorted(iterable):
+    previous = None
+    first = True
+    for record in iterable:
+        if first or record != previous:
+            yield record
+        previous = record
+        first = False
+
+
+# Sorts the records added to it using bounded memory.
+#
+# Records are either added one at a time with add(), or a whole
+# sorted run at a time with AddRun(). Once all records have been
+# added, Merge() yields them in sorted order. Temporary files are
+# deleted by close(), or when the sorter is used as a context
+# manager, on leaving the with block.
+class ExternalSorter:
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE, temp_dir=None):
+        self.buffer_size = buffer_size
+        self.temp_dir = temp_dir
+        self.buffer = []
+        self.runs = []
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __str__(self):
+        return "<ExternalSorter with " + str(len(self)) + " runs>"
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.buffer_size:
+            self._Spill()
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    # Stores records, which must already be sorted, as a run of its
+    # own, without passing it through the buffer.
+    def AddRun(self, records):
+        self.runs.append(self._WriteRun(records))
+
+    # Yields all the records added so far, in sorted order. If unique
+    # is set, repeated records are only yielded once.
+    #
+    # If key is given, records are merged by key(record) alone, as
+    # heapq.merge() merges them; records with equal keys are then
+    # yielded in the order of the runs they are in. Runs added with
+    # AddRun() should then hold records sorted by key.
+    def Merge(self, unique=False, key=None):
+        self._Spill()
+        while len(self.runs) > MAX_MERGE_FAN_IN:
+            merged_runs = []
+            for i in range(0, len(self.runs), MAX_MERGE_FAN_IN):
+                group = self.runs[i : i + MAX_MERGE_FAN_IN]
+                merged = heapq.merge(*map(self._ReadRun, group), key=key)
+                if unique:
+                    merged = UniqueSorted(merged)
+                merged_runs.append(self._WriteRun(merged))
+                for run in group:
+                    run.close()
+            self.runs = merged_runs
+
+        merged = heapq.merge(*map(self._ReadRun, self.runs), key=key)
+        if unique:
+            merged = UniqueSorted(merged)
+        yield from merged
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.buffer = []
+
+    # Sorts the buffer and writes it out as a run.
+    def _Spill(self):
+        if not self.buffer:
+            return
+        self.buffer.sort()
+        self.runs.append(self._WriteRun(self.buffer))
+        self.buffer = []
+
+    # Writes the (sorted) records to a new temporary file and returns
+    # the file.
+    def _WriteRun(self, records):
+        run = tempfile.TemporaryFile(dir=self.temp_dir)
+        block = []
+        for record in records:
+            block.append(record)
+            if len(block) >= RUN_BLOCK_SIZE:
+                pickle.dump(block, run, pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, run, pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        return run
+
+    # Yields the records stored in a run file, one block at a time.
+    def _ReadRun(self, run):
+        while True:
+            try:
+                block = pickle.load(run)
+            except EOFError:
+                return
+            yield from block
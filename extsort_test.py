@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+import random
+
+import extsort
+import testing
+
+ut = testing.UnitTestCollection()
+
+
+@ut()
+def UniqueSorted_test():
+    ut.ExpectEq(list(extsort.UniqueSorted([1, 1, 2, 3, 3, 3])), [1, 2, 3])
+    ut.ExpectEq(list(extsort.UniqueSorted([])), [])
+
+
+@ut()
+def ExternalSorter_test():
+    records = [(random.randrange(100), random.randrange(10))
+            for _ in range(1000)]
+    with extsort.ExternalSorter(buffer_size=37) as sorter:
+        sorter.extend(records)
+        ut.ExpectEq(len(sorter), 1000 // 37)
+        ut.ExpectEq(list(sorter.Merge()), sorted(records))
+
+
+@ut()
+def ExternalSorter_unique_test():
+    records = list(range(0, 500, 3))
+    with extsort.ExternalSorter() as sorter:
+        # More runs than can be merged at once.
+        for _ in range(extsort.MAX_MERGE_FAN_IN + 10):
+            sorter.AddRun(records)
+        ut.ExpectEq(list(sorter.Merge(unique=True)), records)
+
+
+@ut()
+def ExternalSorter_key_test():
+    with extsort.ExternalSorter() as sorter:
+        sorter.AddRun([(1, "b"), (2, "b")])
+        sorter.AddRun([(1, "a"), (3, "a")])
+        # Records with equal keys come in the order of their runs.
+        ut.ExpectEq(list(sorter.Merge(key=lambda record: record[0])),
+                [(1, "b"), (1, "a"), (2, "b"), (3, "a")])
+
+
+if __name__ == "__main__":
+    ut.RunTests()
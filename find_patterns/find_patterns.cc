@@ -19,6 +19,14 @@ the following format.
 
 If the haystack file is provided on the command line, the
 file name is echoed to stdout before the matches are printed.
+
+When --range-lower and --range-upper are given, every key of the
+trie is at least range-lower characters long, so a match can only
+start where the next range-lower characters of the haystack are the
+prefix of a key. Unless --no-prefilter is given, these prefixes are
+held in a Bloom filter (see kmer_filter.h), and the matcher only
+starts sliders at positions whose prefix passes it, rather than at
+every character of the haystack. The output is the same either way.
 */
 
 
@@ -33,6 +41,7 @@ file name is echoed to stdout before the matches are printed.
 #include <stdio.h>
 
 #include "gopt/gopt.h"
+#include "kmer_filter.h"
 #include "matcher.h"
 #include "trie.h"
 
@@ -47,7 +56,8 @@ void ReadPatternsFileOrDie(
         std::istream& patterns_file,
         const bool add_substrings = false,
         const int length_lower_bound = 0,
-        const int length_upper_bound = 0);
+        const int length_upper_bound = 0,
+        std::vector<uint64_t>* prefix_codes = nullptr);
 
 // If the flag to ReadPatternsFileOrDie() is set indicating
 // that all substrings within a given length range should
@@ -59,6 +69,13 @@ void AddSubstringsIntoTrie(
         int length_lower_bound,
         int length_upper_bound);
 
+// Appends the codes of the substrings of s of length k made up of A,
+// C, G and T to codes (see KmerFilter::Encode()).
+void AddPrefixCodes(
+        std::vector<uint64_t>& codes,
+        const std::string& s,
+        const int k);
+
 // Dies and reports that the patterns file was not properly
 // formatted.
 void DieOnInvalidFileFormat();
@@ -76,7 +93,7 @@ void PrintAllKeys(const Trie<Annotation>& patterns);
 void PrintAllKeysAndValues(const Trie<Annotation>& patterns);
 
 int main(int argc, char** argv) {
-    struct option options[10];
+    struct option options[11];
 
     // Prints help information.
     options[0].long_name = "help";
@@ -113,7 +130,12 @@ int main(int argc, char** argv) {
     options[8].long_name = "no-debug";
     options[8].flags = GOPT_ARGUMENT_FORBIDDEN;
 
-    options[9].flags = GOPT_LAST;
+    // Starts a slider at every character of the haystack, rather than
+    // only where the prefilter lets it through.
+    options[9].long_name = "no-prefilter";
+    options[9].flags = GOPT_ARGUMENT_FORBIDDEN;
+
+    options[10].flags = GOPT_LAST;
 
     argc = gopt(argv, options);
     gopt_errors(argv[0], options);
@@ -176,11 +198,19 @@ int main(int argc, char** argv) {
         length_bounds_set = true;
     }
 
+    // The prefixes of the keys can only be filtered when the keys
+    // have a common minimum length which fits in a KmerFilter.
+    const bool use_prefilter = length_bounds_set && options[9].count < 1 &&
+        length_lower_bound >= 1 &&
+        length_lower_bound <= KmerFilter::kMaxK;
+
     // Reads the patterns file and populates the Trie.
     Trie<Annotation> patterns;
+    std::vector<uint64_t> prefix_codes;
     if (length_bounds_set) {
         ReadPatternsFileOrDie(patterns, patterns_file, true,
-                length_lower_bound, length_upper_bound);
+                length_lower_bound, length_upper_bound,
+                use_prefilter ? &prefix_codes : nullptr);
     } else {
         ReadPatternsFileOrDie(patterns, patterns_file);
     }
@@ -200,6 +230,12 @@ int main(int argc, char** argv) {
 
     // Constructs the Matcher object.
     Matcher<Annotation> matcher(patterns, include_debug);
+    std::unique_ptr<KmerFilter> prefilter;
+    if (use_prefilter) {
+        prefilter.reset(new KmerFilter(length_lower_bound, prefix_codes));
+        prefix_codes = std::vector<uint64_t>();
+        matcher.set_prefilter(prefilter.get());
+    }
 
     // Sets wildcard character if required.
     if (options[1].count >= 1) {
@@ -280,7 +316,8 @@ void ReadPatternsFileOrDie(
         std::istream& patterns_file,
         const bool add_substrings,
         const int length_lower_bound,
-        const int length_upper_bound) {
+        const int length_upper_bound,
+        std::vector<uint64_t>* prefix_codes) {
     std::string line;
     while (getline(patterns_file, line)) {
         std::istringstream iss(line);
@@ -301,6 +338,9 @@ void ReadPatternsFileOrDie(
                     pattern,
                     length_lower_bound,
                     length_upper_bound);
+            if (prefix_codes != nullptr) {
+                AddPrefixCodes(*prefix_codes, pattern, length_lower_bound);
+            }
         } else {
             trie.add(pattern, Annotation{name});
         }
@@ -328,6 +368,18 @@ void AddSubstringsIntoTrie(
     }
 }
 
+void AddPrefixCodes(
+        std::vector<uint64_t>& codes,
+        const std::string& s,
+        const int k) {
+    uint64_t code;
+    for (int i = 0; i + k <= (int)s.length(); ++i) {
+        if (KmerFilter::Encode(s.c_str() + i, k, code)) {
+            codes.push_back(code);
+        }
+    }
+}
+
 void PrintAllKeys(const Trie<Annotation>& patterns) {
     for (const std::string& s : patterns.AllKeys()) {
         std::cout << s << std::endl;
@@ -0,0 +1,123 @@
+#ifndef KMER_FILTER_H_
+#define KMER_FILTER_H_
+
+// A Bloom filter over k-mers of A, C, G and T, with k at most 32.
+// Each k-mer is encoded in 2 bits per base, so that it fits in a
+// single 64-bit word and can be updated in constant time as a window
+// slides along the haystack (see Roll()).
+//
+// contains() never returns false for a k-mer which was added, and
+// returns true for a k-mer which was not with a probability of
+// roughly (1 - e^(-hash_count / bits_per_kmer))^hash_count, about
+// 0.2% with the defaults.
+
+#include <stdint.h>
+
+#include <vector>
+
+class KmerFilter {
+  public:
+    static const int kMaxK = 32;
+
+    // Builds the filter from the encoded k-mers in codes, using
+    // about bits_per_kmer bits for each of them.
+    KmerFilter(const int k, const std::vector<uint64_t>& codes,
+            const int bits_per_kmer = 16, const int hash_count = 4) :
+        k_(k), hash_count_(hash_count) {
+        uint64_t bit_count = 64;
+        while (bit_count < codes.size() * bits_per_kmer) {
+            bit_count <<= 1;
+        }
+        bit_mask_ = bit_count - 1;
+        bits_.assign(bit_count / 64, 0);
+        for (const uint64_t code : codes) {
+            add(code);
+        }
+    };
+    KmerFilter() = delete;
+
+    // Returns the 2-bit code of the base c, or -1 if c is not one of
+    // A, C, G and T.
+    static int EncodeBase(const char c) {
+        switch (c) {
+            case 'A': return 0;
+            case 'C': return 1;
+            case 'G': return 2;
+            case 'T': return 3;
+            default: return -1;
+        }
+    }
+
+    // Encodes the k characters starting at s into code. Returns false
+    // if one of them is not one of A, C, G and T.
+    static bool Encode(const char* s, const int k, uint64_t& code) {
+        code = 0;
+        for (int i = 0; i < k; ++i) {
+            const int base = EncodeBase(s[i]);
+            if (base < 0) {
+                return false;
+            }
+            code = (code << 2) | base;
+        }
+        return true;
+    }
+
+    // Returns the code of the k-mer obtained by dropping the first
+    // base of the k-mer encoded in code and appending base.
+    uint64_t Roll(const uint64_t code, const int base) const {
+        return ((code << 2) | base) & code_mask();
+    }
+
+    void add(const uint64_t code) {
+        uint64_t h1, h2;
+        Hash(code, h1, h2);
+        for (int i = 0; i < hash_count_; ++i) {
+            const uint64_t bit = (h1 + i * h2) & bit_mask_;
+            bits_[bit >> 6] |= uint64_t(1) << (bit & 63);
+        }
+    }
+
+    bool contains(const uint64_t code) const {
+        uint64_t h1, h2;
+        Hash(code, h1, h2);
+        for (int i = 0; i < hash_count_; ++i) {
+            const uint64_t bit = (h1 + i * h2) & bit_mask_;
+            if ((bits_[bit >> 6] & (uint64_t(1) << (bit & 63))) == 0) {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    int k() const { return k_; }
+
+    // Size of the filter, in bits.
+    uint64_t bit_count() const { return bit_mask_ + 1; }
+
+  private:
+    const int k_;
+    const int hash_count_;
+    uint64_t bit_mask_;
+    std::vector<uint64_t> bits_;
+
+    uint64_t code_mask() const {
+        return k_ == kMaxK ? ~uint64_t(0) : (uint64_t(1) << (2 * k_)) - 1;
+    }
+
+    // Derives the two hashes combined by add() and contains() from
+    // code, with the finalizer of SplitMix64. h2 is odd, so that the
+    // hash_count bits probed are distinct.
+    static void Hash(const uint64_t code, uint64_t& h1, uint64_t& h2) {
+        h1 = Mix(code);
+        h2 = Mix(h1) | 1;
+    }
+
+    static uint64_t Mix(uint64_t x) {
+        x += 0x9e3779b97f4a7c15ULL;
+        x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+        x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+        return x ^ (x >> 31);
+    }
+};
+
+#endif
@@ -0,0 +1,122 @@
+#include <algorithm>
+#include <iostream>
+#include <random>
+#include <string>
+#include <vector>
+
+using namespace std;
+
+#include "kmer_filter.h"
+#include "matcher.h"
+#include "trie.h"
+
+struct StringValue {
+    std::string name = "";
+};
+
+string RandomString(mt19937& generator, const string& alphabet,
+        const int length) {
+    string s;
+    for (int i = 0; i < length; ++i) {
+        s += alphabet[generator() % alphabet.size()];
+    }
+    return s;
+}
+
+// Returns the matches found in host_string, one per line.
+string Matches(const Trie<StringValue>& trie, const string& host_string,
+        const KmerFilter* prefilter, const int wildcard_limit) {
+    Matcher<StringValue> matcher(trie);
+    if (prefilter != nullptr) {
+        matcher.set_prefilter(prefilter);
+    }
+    matcher.set_wildcard('N');
+    matcher.set_wildcard_limit(wildcard_limit);
+    string matches;
+    for (char c : host_string) {
+        matcher.advance(c);
+        for (MatchIterator<StringValue> it = matcher.begin();
+                it != matcher.end(); ++it) {
+            const Match<StringValue>* match = it.match();
+            matches += match->key + " " +
+                to_string(match->start_index) + " " +
+                match->value.name + "\n";
+        }
+    }
+    return matches;
+}
+
+int main() {
+    mt19937 generator(46);
+
+    cout << "Encoding...\n";
+    uint64_t code;
+    cout << KmerFilter::Encode("ACGT", 4, code) << " " << code << endl;
+    cout << KmerFilter::Encode("ACNT", 4, code) << endl;
+
+    cout << "Every k-mer added is found...\n";
+    const int k = 16;
+    vector<uint64_t> codes;
+    for (int i = 0; i < 10000; ++i) {
+        KmerFilter::Encode(RandomString(generator, "ACGT", k).c_str(), k,
+                code);
+        codes.push_back(code);
+    }
+    KmerFilter filter(k, codes);
+    int missing = 0;
+    for (const uint64_t code : codes) {
+        missing += !filter.contains(code);
+    }
+    cout << "missing: " << missing << endl;
+    int false_positives = 0;
+    for (int i = 0; i < 100000; ++i) {
+        KmerFilter::Encode(RandomString(generator, "ACGT", k).c_str(), k,
+                code);
+        false_positives += filter.contains(code);
+    }
+    cout << "false positives below 1%: " << (false_positives < 1000)
+        << endl;
+
+    cout << "Rolling...\n";
+    const string host = RandomString(generator, "ACGT", 100);
+    uint64_t rolled = 0;
+    bool rolled_right = true;
+    for (int i = 0; i < (int)host.size(); ++i) {
+        rolled = filter.Roll(rolled, KmerFilter::EncodeBase(host[i]));
+        if (i + 1 >= k) {
+            KmerFilter::Encode(host.c_str() + i + 1 - k, k, code);
+            rolled_right = rolled_right && rolled == code;
+        }
+    }
+    cout << "rolled codes match: " << rolled_right << endl;
+
+    cout << "Prefiltered matchers find the same matches...\n";
+    for (int trial = 0; trial < 20; ++trial) {
+        const int lower = 2 + trial % 4;
+        Trie<StringValue> trie;
+        vector<uint64_t> prefix_codes;
+        for (int i = 0; i < 5; ++i) {
+            const string pattern = RandomString(generator, "ACGT", 12);
+            for (int start = 0; start + lower <= 12; ++start) {
+                trie.add(pattern.c_str() + start, lower, lower + 4,
+                        StringValue{to_string(i) + ":" +
+                        to_string(start)});
+                KmerFilter::Encode(pattern.c_str() + start, lower, code);
+                prefix_codes.push_back(code);
+            }
+        }
+        KmerFilter prefilter(lower, prefix_codes);
+        const string host_string = RandomString(generator, "ACGTNNX",
+                300);
+        const int wildcard_limit = trial % 3 - 1;
+        const string expected = Matches(trie, host_string, nullptr,
+                wildcard_limit);
+        const string prefiltered = Matches(trie, host_string, &prefilter,
+                wildcard_limit);
+        cout << "trial " << trial << ": " <<
+            count(expected.begin(), expected.end(), '\n') << " matches, " <<
+            (expected == prefiltered ? "same" : "different") << endl;
+    }
+
+    return 0;
+}
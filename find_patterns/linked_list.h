@@ -23,15 +23,17 @@ class LinkedList {
   public:
     // Creates a dummy node at the head.
     LinkedList() : head_(std::make_unique<LinkedListNode<T>>()),
-        size_(0) {};
+        size_(0) { tail_ = head_.get(); };
 
     LinkedList(const LinkedList&) = delete;
     void operator=(const LinkedList&) = delete;
     LinkedList(LinkedList&& rhs) :
-        size_(rhs.size_), head_(std::move(rhs.head_)) {};
+        size_(rhs.size_), head_(std::move(rhs.head_)),
+        tail_(rhs.tail_) {};
     void operator=(LinkedList&& rhs) {
         size_ = rhs.size_;
         head_ = std::move(rhs.head_);
+        tail_ = rhs.tail_;
     };
 
 
@@ -45,14 +47,44 @@ class LinkedList {
         new_node->next = std::move(head_->next);
         if (new_node->next != nullptr) {
             new_node->next->previous = new_node.get();
+        } else {
+            tail_ = new_node.get();
         }
         head_->next = std::move(new_node);
         ++size_;
     }
 
+    // Moves the nodes of other, in order, to the beginning or to the
+    // end of the linked list, leaving other empty.
+    void splice(LinkedList&& other, const bool at_end) {
+        if (other.size_ == 0) {
+            return;
+        }
+        LinkedListNode<T>* first = other.head_->next.get();
+        if (at_end) {
+            first->previous = tail_;
+            tail_->next = std::move(other.head_->next);
+            tail_ = other.tail_;
+        } else {
+            other.tail_->next = std::move(head_->next);
+            if (other.tail_->next != nullptr) {
+                other.tail_->next->previous = other.tail_;
+            } else {
+                tail_ = other.tail_;
+            }
+            first->previous = head_.get();
+            head_->next = std::move(other.head_->next);
+        }
+        size_ += other.size_;
+        other.size_ = 0;
+        other.tail_ = other.head_.get();
+    }
+
     void remove(LinkedListNode<T>* node) {
         if (node->next != nullptr) {
             node->next->previous = node->previous;
+        } else {
+            tail_ = node->previous;
         }
         node->previous->next = std::move(node->next);
         --size_;
@@ -77,6 +109,8 @@ class LinkedList {
 
   private:
     std::unique_ptr<LinkedListNode<T>> head_;
+    // The last node, or the head if the list is empty.
+    LinkedListNode<T>* tail_;
     int size_;
 };
 
@@ -8,6 +8,7 @@
 // DEBUG
 #include <iostream>
 
+#include "kmer_filter.h"
 #include "linked_list.h"
 #include "slider.h"
 #include "trie.h"
@@ -129,42 +130,26 @@ class Matcher {
     } 
 
     void advance(const char c) {
+        if (prefilter_ != nullptr) {
+            advance_prefiltered(c);
+            return;
+        }
         sliders_.add(std::make_unique<Slider<A>>(
                     fragments_, start_index_));
         ++start_index_;
         if (has_wildcard_ && c == wildcard_) {
-            LinkedList<Slider<A>> new_list;
-
             // If there have been too many wildcards in a row,
             // we simply kill all existing sliders.
             ++wildcards_in_a_row_;
             if (wildcard_limit_ != -1 &&
                     wildcards_in_a_row_ > wildcard_limit_) {
-                sliders_ = std::move(new_list);
+                sliders_ = LinkedList<Slider<A>>();
                 return;
             }
-
-            for (auto slider_it = sliders_.begin();
-                    slider_it != sliders_.end();
-                    ++slider_it) {
-                for (const char c : slider_it.get_value()->children()) {
-                    std::unique_ptr<Slider<A>> new_slider(
-                            new Slider<A>(*slider_it.get_value()));
-                    new_slider->feed_wildcard(c);
-                    new_list.add(std::move(new_slider));
-                }
-            }
-            sliders_ = std::move(new_list);
         } else {
             wildcards_in_a_row_ = 0;
-            for (auto slider_it = sliders_.begin();
-                    slider_it != sliders_.end();
-                    ++slider_it) {
-                if (!slider_it.get_value()->feed(c)) {
-                    sliders_.remove(slider_it);
-                }
-            }
         }
+        feed(sliders_, c);
     }
 
     int size() const {
@@ -180,6 +165,15 @@ class Matcher {
         wildcard_limit_ = limit;
     }
 
+    // Only starts a slider where the next prefilter->k() characters
+    // of the haystack may be the prefix of a key of the trie, which
+    // requires every key to be at least that long. Must be called
+    // before the first character is fed.
+    void set_prefilter(const KmerFilter* prefilter) {
+        prefilter_ = prefilter;
+        window_.assign(prefilter->k(), '\0');
+    }
+
   private:
     const Trie<A>& fragments_;
     LinkedList<Slider<A>> sliders_;
@@ -189,6 +183,104 @@ class Matcher {
     int wildcards_in_a_row_ = 0;
     int start_index_;
     const bool include_debug_;
+
+    // The prefilter, if any, the last prefilter_->k() characters fed,
+    // indexed by position modulo k, the code of those characters and
+    // the number of A, C, G and T characters in a row ending at the
+    // last one.
+    const KmerFilter* prefilter_ = nullptr;
+    std::string window_;
+    uint64_t window_code_ = 0;
+    int encoded_in_a_row_ = 0;
+    // Position of the last character at which the sliders were killed
+    // by too many wildcards in a row.
+    int last_kill_index_ = -1;
+
+    // Feeds c to every slider of sliders, removing those which die. A
+    // wildcard is fed as each of the characters which may follow.
+    void feed(LinkedList<Slider<A>>& sliders, const char c) const {
+        if (has_wildcard_ && c == wildcard_) {
+            LinkedList<Slider<A>> new_list;
+            for (auto slider_it = sliders.begin();
+                    slider_it != sliders.end();
+                    ++slider_it) {
+                for (const char c : slider_it.get_value()->children()) {
+                    std::unique_ptr<Slider<A>> new_slider(
+                            new Slider<A>(*slider_it.get_value()));
+                    new_slider->feed_wildcard(c);
+                    new_list.add(std::move(new_slider));
+                }
+            }
+            sliders = std::move(new_list);
+        } else {
+            for (auto slider_it = sliders.begin();
+                    slider_it != sliders.end();
+                    ++slider_it) {
+                if (!slider_it.get_value()->feed(c)) {
+                    sliders.remove(slider_it);
+                }
+            }
+        }
+    }
+
+    // Does what advance() does, but starts the slider for a position
+    // only once the k characters from it on have been fed, and only
+    // if the prefilter lets them through. Since no key is shorter than
+    // k, the slider could not have found a match before.
+    //
+    // The new slider is fed the k characters in one go, and put in the
+    // list where advance() would have left it: advance() adds sliders
+    // to the front of the list, and every wildcard reverses the list,
+    // so it goes to the end if the window holds an odd number of
+    // wildcards. The matches are then reported in the same order.
+    void advance_prefiltered(const char c) {
+        const int k = prefilter_->k();
+        const int index = start_index_;
+        ++start_index_;
+        window_[index % k] = c;
+        const int base = KmerFilter::EncodeBase(c);
+        if (base < 0) {
+            encoded_in_a_row_ = 0;
+        } else {
+            window_code_ = prefilter_->Roll(window_code_, base);
+            ++encoded_in_a_row_;
+        }
+
+        if (has_wildcard_ && c == wildcard_) {
+            ++wildcards_in_a_row_;
+            if (wildcard_limit_ != -1 &&
+                    wildcards_in_a_row_ > wildcard_limit_) {
+                sliders_ = LinkedList<Slider<A>>();
+                last_kill_index_ = index;
+                return;
+            }
+        } else {
+            wildcards_in_a_row_ = 0;
+        }
+        feed(sliders_, c);
+
+        const int start = index - k + 1;
+        if (start < 0 || start <= last_kill_index_) {
+            return;
+        }
+        // Windows holding other characters than A, C, G and T, such
+        // as wildcards, cannot be encoded and are let through.
+        if (encoded_in_a_row_ >= k &&
+                !prefilter_->contains(window_code_)) {
+            return;
+        }
+        LinkedList<Slider<A>> new_sliders;
+        new_sliders.add(std::make_unique<Slider<A>>(fragments_, start));
+        int wildcards = 0;
+        for (int i = start; i <= index && new_sliders.size() > 0; ++i) {
+            const char d = window_[i % k];
+            if (has_wildcard_ && d == wildcard_) {
+                ++wildcards;
+            }
+            feed(new_sliders, d);
+        }
+        sliders_.splice(std::move(new_sliders), wildcards % 2 == 1);
+    }
 };
 
 #endif 
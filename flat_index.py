@@ -0,0 +1,415 @@
+# This module stores a PatternIndex (see pattern_index.py) as a single
+# flat buffer of fixed-width arrays, so that it can be placed in
+# shared memory and used by many scanner processes at once without
+# being copied or rebuilt by each of them.
+#
+# The buffer starts with a header (see _HEADER) followed by these
+# sections, each aligned to 8 bytes:
+#
+#   slots: uint32[table_size], an open-addressing hash table of
+#       seeds. A slot holds 0 if it is empty, or 1 + the id of the
+#       seed stored in it. Seeds are hashed with zlib.crc32, and
+#       collisions are resolved by linear probing.
+#   seed_keys: the seeds, range_lower bytes each, in order of id.
+#   seed_window_offsets: uint32[seed_count + 1]; the windows of seed
+#       i are seed_windows[seed_window_offsets[i] :
+#       seed_window_offsets[i + 1]].
+#   seed_windows: uint32[seed_window_count], window ids.
+#   seed_orientations: int8[seed_window_count], the orientation of
+#       each window under its seed. Only present if both_strands is
+#       set.
+#   window_text_offsets, window_texts: the text of each window.
+#   window_entry_offsets: uint32[window_count + 1], delimiting the
+#       entries of each window.
+#   entry_names, entry_starts: uint32[entry_count], the pattern name
+#       id and start index of each entry.
+#   name_offsets, names: the pattern names, sorted.
+#   pattern_lengths: uint32[name_count], the length of each pattern,
+#       or 0 if it is not known.
+#
+# Arrays are stored in native byte order.
+#
+# A flat index can also be saved to an index file (see build_index.py)
+# and mapped into memory by the scanners. The file starts with
+# _FILE_HEADER, which holds the version of the file format, a marker
+# of the byte order of the machine which wrote the file, and a SHA-256
+# digest of the patterns file and of the arguments the index was built
+# with (see IndexDigest()). The flat buffer follows. A file whose
+# header does not match is stale, and is rebuilt by LoadIndexFile().
+
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from pattern_index import DEFAULT_MAX_WILDCARDS
+from pattern_index import PatternIndex
+from pattern_index import ReadPatternsFile
+from pattern_index import VirtualPatternName
+
+
+_MAGIC = b"TRNAFIDX"
+
+_HEADER = struct.Struct("=8s13Q")
+
+_FILE_MAGIC = b"TRNAIDXF"
+
+_FILE_HEADER = struct.Struct("=8sII32s")
+
+# Version of the index file format. It should be incremented whenever
+# the layout of the flat buffer changes.
+INDEX_FILE_VERSION = 1
+
+_BYTE_ORDER_MARKER = 0x01020304
+
+# Number of seeds whose windows are cached by each FlatPatternIndex.
+WINDOWS_CACHE_SIZE = 1 << 16
+
+
+def _Align(n):
+    return (n + 7) & ~7
+
+
+# Returns the buffer (a bytearray) holding the flattened version of
+# index, which should be a PatternIndex.
+def FlattenPatternIndex(index):
+    window_ids = {}
+    windows = []
+    seed_keys = []
+    seed_window_offsets = [0]
+    seed_windows = []
+    seed_orientations = []
+    for seed, values in index.seeds.items():
+        seed_keys.append(seed.encode())
+        for value in values:
+            if index.both_strands:
+                window, orientation = value
+                seed_orientations.append(orientation)
+            else:
+                window = value
+            if window[0] not in window_ids:
+                window_ids[window[0]] = len(windows)
+                windows.append(window)
+            seed_windows.append(window_ids[window[0]])
+        seed_window_offsets.append(len(seed_windows))
+
+    names = set(index.pattern_lengths)
+    for window in windows:
+        names.update(name for name, start in window[1])
+    names = sorted(names)
+    name_ids = {name: name_id for name_id, name in enumerate(names)}
+
+    table_size = 1
+    while table_size < 2 * len(seed_keys):
+        table_size *= 2
+    slots = [0] * table_size
+    for seed_id, key in enumerate(seed_keys):
+        slot = zlib.crc32(key) & (table_size - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (table_size - 1)
+        slots[slot] = seed_id + 1
+
+    window_texts = [window[0].encode() for window in windows]
+    window_entry_offsets = [0]
+    entry_names = []
+    entry_starts = []
+    for window in windows:
+        for name, start in window[1]:
+            entry_names.append(name_ids[name])
+            entry_starts.append(start)
+        window_entry_offsets.append(len(entry_names))
+    encoded_names = [name.encode() for name in names]
+
+    def Offsets(blobs):
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return offsets
+
+    def UInt32s(values):
+        return struct.pack("=" + str(len(values)) + "I", *values)
+
+    sections = [
+        UInt32s(slots),
+        b"".join(seed_keys),
+        UInt32s(seed_window_offsets),
+        UInt32s(seed_windows),
+        struct.pack("=" + str(len(seed_orientations)) + "b",
+            *seed_orientations),
+        UInt32s(Offsets(window_texts)),
+        b"".join(window_texts),
+        UInt32s(window_entry_offsets),
+        UInt32s(entry_names),
+        UInt32s(entry_starts),
+        UInt32s(Offsets(encoded_names)),
+        b"".join(encoded_names),
+        UInt32s([index.pattern_lengths.get(name, 0) for name in names]),
+    ]
+
+    wildcard = index.pattern_wildcard
+    header = _HEADER.pack(_MAGIC, index.range_lower, index.range_upper,
+            index.max_wildcards, int(index.both_strands),
+            0 if wildcard is None else ord(wildcard), table_size,
+            len(seed_keys), len(seed_windows), len(windows),
+            len(entry_names), len(names), len(b"".join(window_texts)),
+            len(b"".join(encoded_names)))
+
+    buffer = bytearray(header)
+    for section in sections:
+        buffer.extend(bytes(_Align(len(buffer)) - len(buffer)))
+        buffer.extend(section)
+    return buffer
+
+
+# A PatternIndex read from a buffer produced by FlattenPatternIndex().
+# The buffer (for instance the buf of a SharedMemory block, or an
+# mmap) is used in place rather than copied; only the pattern names,
+# and the windows of the most recently looked up seeds, are held as
+# Python objects.
+#
+# owner is kept referenced for as long as the index is, in case the
+# buffer would be released along with it.
+class FlatPatternIndex:
+    def __init__(self, buffer, owner=None):
+        self.buffer = memoryview(buffer)
+        self.owner = owner
+        (magic, self.range_lower, self.range_upper, self.max_wildcards,
+                both_strands, wildcard, self.table_size, seed_count,
+                seed_window_count, window_count, entry_count, name_count,
+                window_text_size, name_size) = \
+                        _HEADER.unpack_from(self.buffer)
+        if magic != _MAGIC:
+            raise ValueError("Invalid flat index")
+        self.both_strands = bool(both_strands)
+        self.pattern_wildcard = chr(wildcard) if wildcard else None
+
+        self._views = []
+        offset = _HEADER.size
+        def Section(size, format="B"):
+            nonlocal offset
+            offset = _Align(offset)
+            item_size = struct.calcsize(format)
+            section = self.buffer[offset : offset + size * item_size]
+            offset += size * item_size
+            self._views.append(section)
+            self._views.append(section.cast(format))
+            return self._views[-1]
+
+        self.slots = Section(self.table_size, "I")
+        self.seed_keys = Section(seed_count * self.range_lower)
+        self.seed_window_offsets = Section(seed_count + 1, "I")
+        self.seed_windows = Section(seed_window_count, "I")
+        self.seed_orientations = Section(
+                seed_window_count if self.both_strands else 0, "b")
+        self.window_text_offsets = Section(window_count + 1, "I")
+        self.window_texts = Section(window_text_size)
+        self.window_entry_offsets = Section(window_count + 1, "I")
+        self.entry_names = Section(entry_count, "I")
+        self.entry_starts = Section(entry_count, "I")
+        name_offsets = Section(name_count + 1, "I")
+        names = Section(name_size)
+        pattern_lengths = Section(name_count, "I")
+
+        self.names = [bytes(names[name_offsets[i] : name_offsets[i + 1]])
+                .decode() for i in range(name_count)]
+        self.pattern_lengths = {name: length
+                for name, length in zip(self.names, pattern_lengths)
+                if length}
+        self.seed_count = seed_count
+        self._windows = functools.lru_cache(WINDOWS_CACHE_SIZE)(
+                self._Windows)
+
+    def __len__(self):
+        return self.seed_count
+
+    def __str__(self):
+        return "<FlatPatternIndex with " + str(len(self)) + " seeds>"
+
+    def __repr__(self):
+        return str(self)
+
+    def __contains__(self, seed):
+        return self._SeedId(seed) is not None
+
+    # Releases the buffer, and closes its owner if it has a close()
+    # method. The index can no longer be used afterwards.
+    def close(self):
+        self._windows.cache_clear()
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self.buffer.release()
+        if hasattr(self.owner, "close"):
+            self.owner.close()
+
+    # Returns the sorted list of the pattern names matches may carry.
+    def MatchNames(self):
+        names = set(self.names)
+        if self.both_strands:
+            names.update([VirtualPatternName(name, length)
+                for name, length in self.pattern_lengths.items()])
+        return sorted(names)
+
+    # Returns the windows stored under seed, as PatternIndex.lookup()
+    # does.
+    def lookup(self, seed):
+        seed_id = self._SeedId(seed)
+        if seed_id is None:
+            return ()
+        return self._windows(seed_id)
+
+    # Returns the id of seed, or None if it is not in the index.
+    def _SeedId(self, seed):
+        range_lower = self.range_lower
+        if len(seed) != range_lower:
+            return None
+        key = seed.encode()
+        mask = self.table_size - 1
+        slot = zlib.crc32(key) & mask
+        while True:
+            seed_id = self.slots[slot]
+            if not seed_id:
+                return None
+            seed_id -= 1
+            if self.seed_keys[seed_id * range_lower :
+                    (seed_id + 1) * range_lower] == key:
+                return seed_id
+            slot = (slot + 1) & mask
+
+    def _Windows(self, seed_id):
+        windows = []
+        for i in range(self.seed_window_offsets[seed_id],
+                self.seed_window_offsets[seed_id + 1]):
+            window_id = self.seed_windows[i]
+            window_text = bytes(self.window_texts[
+                self.window_text_offsets[window_id] :
+                self.window_text_offsets[window_id + 1]]).decode()
+            entries = tuple((self.names[self.entry_names[j]],
+                self.entry_starts[j]) for j in range(
+                    self.window_entry_offsets[window_id],
+                    self.window_entry_offsets[window_id + 1]))
+            window = (window_text, entries)
+            if self.both_strands:
+                window = (window, self.seed_orientations[i])
+            windows.append(window)
+        return windows
+
+
+# Names of the blocks of shared memory created by this process.
+_created_blocks = set()
+
+
+# Flattens index into a new block of shared memory, which is returned.
+# The block should be unlinked by the caller once no more processes
+# need to attach to it.
+def CreateSharedPatternIndex(index):
+    buffer = FlattenPatternIndex(index)
+    block = shared_memory.SharedMemory(create=True, size=len(buffer))
+    block.buf[:len(buffer)] = buffer
+    _created_blocks.add(block.name)
+    return block
+
+
+# Returns a FlatPatternIndex backed by the block of shared memory
+# called name, created by CreateSharedPatternIndex().
+def AttachSharedPatternIndex(name):
+    block = shared_memory.SharedMemory(name=name)
+    # Only the creator of the block should unlink it; otherwise the
+    # resource tracker of this process would do so when it exits.
+    # Processes forked from the creator share its resource tracker.
+    if block.name not in _created_blocks:
+        resource_tracker.unregister(block._name, "shared_memory")
+    return FlatPatternIndex(block.buf, owner=block)
+
+
+# Returns the digest identifying an index built from the patterns in
+# the file at patterns_path with the given arguments.
+def IndexDigest(patterns_path, range_lower, range_upper,
+        pattern_wildcard=None, max_wildcards=DEFAULT_MAX_WILDCARDS,
+        both_strands=False):
+    digest = hashlib.sha256()
+    with open(patterns_path, "rb") as patterns_file:
+        for block in iter(lambda: patterns_file.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(repr((range_lower, range_upper, pattern_wildcard,
+        max_wildcards, bool(both_strands))).encode())
+    return digest.digest()
+
+
+# Writes the flattened version of index, a PatternIndex, to the index
+# file at path, with digest in its header. The file is written under a
+# temporary name first, so that scanners never see it half written.
+def WriteIndexFile(index, digest, path):
+    header = _FILE_HEADER.pack(_FILE_MAGIC, INDEX_FILE_VERSION,
+            _BYTE_ORDER_MARKER, digest)
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        try:
+            f.write(header)
+            f.write(bytes(_Align(len(header)) - len(header)))
+            f.write(FlattenPatternIndex(index))
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    # Temporary files are only readable by their owner.
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(f.name, 0o666 & ~umask)
+    os.replace(f.name, path)
+
+
+# Maps the index file at path into memory and returns the
+# FlatPatternIndex it holds. Returns None if the file does not exist,
+# was written in another format version or byte order, or does not
+# carry digest.
+def OpenIndexFile(path, digest):
+    try:
+        index_file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with index_file:
+        header = index_file.read(_FILE_HEADER.size)
+        if len(header) != _FILE_HEADER.size or \
+                _FILE_HEADER.unpack(header) != (_FILE_MAGIC,
+                        INDEX_FILE_VERSION, _BYTE_ORDER_MARKER, digest):
+            return None
+        mapping = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+    buffer = memoryview(mapping)[_Align(_FILE_HEADER.size):]
+    return FlatPatternIndex(buffer, owner=_MappedBuffer(mapping, buffer))
+
+
+# Returns the FlatPatternIndex held in the index file at path, which
+# should have been built from the patterns in the file at
+# patterns_path with the given arguments. If the file is missing or
+# stale, the index is first rebuilt and written to path.
+def LoadIndexFile(path, patterns_path, range_lower, range_upper,
+        pattern_wildcard=None, max_wildcards=DEFAULT_MAX_WILDCARDS,
+        both_strands=False):
+    digest = IndexDigest(patterns_path, range_lower, range_upper,
+            pattern_wildcard, max_wildcards, both_strands)
+    index = OpenIndexFile(path, digest)
+    if index is None:
+        with open(patterns_path, "r") as patterns_file:
+            patterns = ReadPatternsFile(patterns_file)
+        WriteIndexFile(PatternIndex(patterns, range_lower, range_upper,
+            pattern_wildcard=pattern_wildcard, max_wildcards=max_wildcards,
+            both_strands=both_strands), digest, path)
+        index = OpenIndexFile(path, digest)
+    return index
+
+
+# Closes a memory mapping along with the view of it a FlatPatternIndex
+# was built on.
+class _MappedBuffer:
+    def __init__(self, mapping, view):
+        self.mapping = mapping
+        self.view = view
+
+    def close(self):
+        self.view.release()
+        self.mapping.close()
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+
+import flat_index
+import pattern_index
+import scanner
+import testing
+
+ut = testing.UnitTestCollection()
+
+patterns = [
+        ("0-71", "GCCCGGATAGCTCAGTCGGTAGAGCATCAGACTTTTAATCTGAGGGTCCCA"),
+        ("!3-74", "TGGGACCCTCAGATTAAAAGTCTGATGCTCTACCGACTGAGCTATCCGGGC")]
+
+haystack_text = "ACGT" * 40 + patterns[1][1] + "ACGT" * 40 + \
+        patterns[0][1][10:40] + "ACGT" * 40
+
+
+@ut(patterns)
+def FlatPatternIndex_test(patterns):
+    for both_strands in [False, True]:
+        index = pattern_index.PatternIndex(patterns[:1 + (not both_strands)],
+                16, 50, pattern_wildcard="N", both_strands=both_strands)
+        flat = flat_index.FlatPatternIndex(
+                flat_index.FlattenPatternIndex(index))
+        ut.ExpectEq(len(flat), len(index))
+        ut.ExpectEq(flat.MatchNames(), index.MatchNames())
+        ut.ExpectEq(flat.pattern_lengths, index.pattern_lengths)
+        for seed in index.seeds:
+            ut.ExpectEq(flat.lookup(seed), index.lookup(seed))
+        ut.ExpectEq(flat.lookup("A" * 16), ())
+        ut.ExpectEq(list(scanner.Scanner(flat).Scan([haystack_text])),
+                list(scanner.Scanner(index).Scan([haystack_text])))
+        flat.close()
+
+
+@ut(patterns)
+def SharedPatternIndex_test(patterns):
+    index = pattern_index.PatternIndex(patterns, 16, 50)
+    block = flat_index.CreateSharedPatternIndex(index)
+    try:
+        shared = flat_index.AttachSharedPatternIndex(block.name)
+        ut.ExpectEq(list(scanner.Scanner(shared).Scan([haystack_text])),
+                list(scanner.Scanner(index).Scan([haystack_text])))
+        shared.close()
+    finally:
+        block.close()
+        block.unlink()
+
+
+@ut(patterns)
+def IndexFile_test(patterns):
+    with tempfile.TemporaryDirectory() as directory:
+        patterns_path = os.path.join(directory, "test.patterns")
+        index_path = os.path.join(directory, "test.index")
+        with open(patterns_path, "w") as patterns_file:
+            for name, pattern in patterns:
+                print(name, pattern, file=patterns_file)
+
+        digest = flat_index.IndexDigest(patterns_path, 16, 50)
+        ut.ExpectEq(flat_index.OpenIndexFile(index_path, digest), None)
+        index = flat_index.LoadIndexFile(index_path, patterns_path, 16, 50)
+        ut.ExpectEq(list(scanner.Scanner(index).Scan([haystack_text])),
+                list(scanner.Scanner(pattern_index.PatternIndex(
+                    patterns, 16, 50)).Scan([haystack_text])))
+        index.close()
+
+        # Other arguments or patterns make the file stale.
+        ut.ExpectEq(flat_index.OpenIndexFile(index_path,
+            flat_index.IndexDigest(patterns_path, 16, 40)), None)
+        with open(patterns_path, "w") as patterns_file:
+            print(*patterns[0], file=patterns_file)
+        ut.ExpectEq(flat_index.OpenIndexFile(index_path,
+            flat_index.IndexDigest(patterns_path, 16, 50)), None)
+        index = flat_index.LoadIndexFile(index_path, patterns_path, 16, 50)
+        ut.ExpectEq(index.MatchNames(), [patterns[0][0]])
+        index.close()
+
+
+if __name__ == "__main__":
+    ut.RunTests()
@@ -0,0 +1,230 @@
+# This module reads and writes the fragment sources file, a reverse
+# index from each fragment listed in a .names file to the places in
+# the tRNAs it was cut from. It is written by naming.py --sources.
+#
+# Fragments are identified by their line number in the .names file
+# (see trnapy.NamesFile), and tRNAs by their number in the
+# list of tRNA names held in the file. The file starts with _HEADER,
+# followed by these sections, each aligned to 8 bytes, which hold the
+# sources in compressed sparse row form:
+#
+#   offsets: uint64[fragment_count + 1]; the sources of fragment i
+#       are entries offsets[i] to offsets[i + 1] - 1.
+#   trna_ids: uint32[entry_count], the tRNA of each entry.
+#   starts: uint16[entry_count], the start index of the fragment in
+#       the (CCA-added, possibly expanded) tRNA.
+#   lengths: uint8[entry_count], the length of the fragment.
+#   types: uint8[entry_count], the MatchType value of the fragment,
+#       or 0 if it has none.
+#   name_offsets: uint64[trna_count + 1], and names: the tRNA names.
+#
+# Arrays are stored in native byte order.
+
+import array
+import mmap
+import shutil
+import struct
+import tempfile
+
+from trnapy import MatchType
+
+
+_MAGIC = b"TRNASRCS"
+
+_HEADER = struct.Struct("=8sIIQQQQ")
+
+# Version of the file format.
+FRAGMENT_SOURCES_VERSION = 1
+
+# Maps MatchType values to their names, as printed in .names files.
+_TYPE_NAMES = {match_type.value: str(match_type) for match_type in MatchType}
+
+
+def _Align(n):
+    return (n + 7) & ~7
+
+
+# Number of entries of a column held in memory by a
+# FragmentSourcesWriter before they are spilled to disk.
+_SPILL_SIZE = 1 << 20
+
+
+# Writes a fragment sources file to path, one fragment at a time in
+# the order of their ids, as the .names file is written. trna_names
+# holds the name of each tRNA id.
+#
+# The columns are gathered in arrays, which are spilled to a temporary
+# file per column (under temp_dir, if given) whenever one holds
+# _SPILL_SIZE entries, so that memory use does not depend on the
+# number of fragments. The file is put together by close().
+#
+# Sample usage:
+#
+#   with FragmentSourcesWriter(path, trna_names) as writer:
+#       for sources in fragment_sources:
+#           writer.AddFragment(sources)
+class FragmentSourcesWriter:
+    def __init__(self, path, trna_names, temp_dir=None):
+        self.path = path
+        self.trna_names = trna_names
+        self.fragment_count = 0
+        self.entry_count = 0
+        # The offsets, tRNA ids, starts, lengths and types columns,
+        # each paired with the file it is spilled to.
+        self.columns = [(array.array(format),
+            tempfile.TemporaryFile(dir=temp_dir)) for format in "QIHBB"]
+        self.columns[0][0].append(0)
+
+    def __str__(self):
+        return "<FragmentSourcesWriter to " + self.path + ">"
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    # Nothing is written to path if an exception was raised.
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._CloseSpillFiles()
+
+    # Adds the next fragment, given the list of its sources as (tRNA id,
+    # start, length, MatchType or None) tuples.
+    def AddFragment(self, sources):
+        offsets, trna_ids, starts, lengths, types = \
+                [column for column, _ in self.columns]
+        for trna_id, start, length, match_type in sources:
+            trna_ids.append(trna_id)
+            starts.append(start)
+            lengths.append(length)
+            types.append(0 if match_type is None else match_type.value)
+        self.entry_count += len(sources)
+        self.fragment_count += 1
+        offsets.append(self.entry_count)
+        if len(offsets) >= _SPILL_SIZE or len(trna_ids) >= _SPILL_SIZE:
+            self._Spill()
+
+    # Writes the file, from the spilled columns.
+    def close(self):
+        if self.columns is None:
+            return
+        self._Spill()
+        encoded_names = [name.encode() for name in self.trna_names]
+        name_offsets = array.array("Q", [0])
+        for name in encoded_names:
+            name_offsets.append(name_offsets[-1] + len(name))
+
+        with open(self.path, "wb") as sources_file:
+            sources_file.write(_HEADER.pack(_MAGIC,
+                FRAGMENT_SOURCES_VERSION, 0, self.fragment_count,
+                self.entry_count, len(self.trna_names), name_offsets[-1]))
+            def Align():
+                position = sources_file.tell()
+                sources_file.write(bytes(_Align(position) - position))
+
+            for _, spill_file in self.columns:
+                Align()
+                spill_file.seek(0)
+                shutil.copyfileobj(spill_file, sources_file)
+            Align()
+            name_offsets.tofile(sources_file)
+            Align()
+            sources_file.write(b"".join(encoded_names))
+        self._CloseSpillFiles()
+
+    def _Spill(self):
+        for column, spill_file in self.columns:
+            column.tofile(spill_file)
+            del column[:]
+
+    def _CloseSpillFiles(self):
+        for _, spill_file in self.columns:
+            spill_file.close()
+        self.columns = None
+
+
+# Writes a fragment sources file to path. fragment_sources holds, for
+# each fragment id, the list of its sources as FragmentSourcesWriter
+# takes them; trna_names holds the name of each tRNA id.
+def WriteFragmentSources(path, fragment_sources, trna_names):
+    with FragmentSourcesWriter(path, trna_names) as writer:
+        for sources in fragment_sources:
+            writer.AddFragment(sources)
+
+
+# A fragment sources file, mapped into memory. The sources of a
+# fragment are found in O(1) time from its id.
+class FragmentSources:
+    def __init__(self, path):
+        with open(path, "rb") as sources_file:
+            self.mapping = mmap.mmap(sources_file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mapping)
+        magic, version, flags, fragment_count, entry_count, trna_count, \
+                names_size = _HEADER.unpack_from(self.buffer)
+        if magic != _MAGIC or version != FRAGMENT_SOURCES_VERSION:
+            raise ValueError("Invalid fragment sources file: " + path)
+        self.fragment_count = fragment_count
+
+        self._views = []
+        offset = _HEADER.size
+        def Section(size, format="B"):
+            nonlocal offset
+            offset = _Align(offset)
+            item_size = struct.calcsize(format)
+            section = self.buffer[offset : offset + size * item_size]
+            offset += size * item_size
+            self._views.append(section)
+            self._views.append(section.cast(format))
+            return self._views[-1]
+
+        self.offsets = Section(fragment_count + 1, "Q")
+        self.trna_ids = Section(entry_count, "I")
+        self.starts = Section(entry_count, "H")
+        self.lengths = Section(entry_count)
+        self.types = Section(entry_count)
+        name_offsets = Section(trna_count + 1, "Q")
+        names = Section(names_size)
+        self.trna_names = [bytes(names[name_offsets[i] :
+            name_offsets[i + 1]]).decode() for i in range(trna_count)]
+
+    def __len__(self):
+        return self.fragment_count
+
+    def __str__(self):
+        return "<FragmentSources of " + str(len(self)) + " fragments>"
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self.buffer.release()
+        self.mapping.close()
+
+    # Returns the sources of the fragment with id fragment_id, as a
+    # list of (tRNA name, start, length, type name) tuples. The type
+    # name is None if the fragment has no type.
+    def sources(self, fragment_id):
+        return [(self.trna_names[self.trna_ids[i]], self.starts[i],
+            self.lengths[i], _TYPE_NAMES.get(self.types[i]))
+            for i in range(self.offsets[fragment_id],
+                self.offsets[fragment_id + 1])]
+
+    # Returns the sorted names of the tRNAs the fragment with id
+    # fragment_id was cut from.
+    def trnas(self, fragment_id):
+        return sorted(set(self.trna_names[self.trna_ids[i]]
+            for i in range(self.offsets[fragment_id],
+                self.offsets[fragment_id + 1])))
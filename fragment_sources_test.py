@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+
+import fragment_sources
+import testing
+from trnapy import MatchType
+
+ut = testing.UnitTestCollection()
+
+
+@ut()
+def FragmentSources_test():
+    trna_names = ["chr1.trna1", "chr1.trna1_A", "chr2.trna5"]
+    sources = [
+            [(0, 3, 16, MatchType.I_TRF), (2, 0, 16, MatchType.FIVE_PRIME_TRF)],
+            [],
+            [(1, 0, 20, None)]]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "test.sources")
+        fragment_sources.WriteFragmentSources(path, sources, trna_names)
+        with fragment_sources.FragmentSources(path) as index:
+            ut.ExpectEq(len(index), 3)
+            ut.ExpectEq(index.sources(0), [("chr1.trna1", 3, 16, "i-tRF"),
+                ("chr2.trna5", 0, 16, "5'-tRF")])
+            ut.ExpectEq(index.sources(1), [])
+            ut.ExpectEq(index.sources(2), [("chr1.trna1_A", 0, 20, None)])
+            ut.ExpectEq(index.trnas(0), ["chr1.trna1", "chr2.trna5"])
+
+        # The columns are spilled to disk several times.
+        spill_size = fragment_sources._SPILL_SIZE
+        fragment_sources._SPILL_SIZE = 2
+        try:
+            spilled_path = os.path.join(directory, "spilled.sources")
+            with fragment_sources.FragmentSourcesWriter(spilled_path,
+                    trna_names, directory) as writer:
+                for fragment in sources * 3:
+                    writer.AddFragment(fragment)
+        finally:
+            fragment_sources._SPILL_SIZE = spill_size
+        with fragment_sources.FragmentSources(spilled_path) as index:
+            ut.ExpectEq(len(index), 9)
+            ut.ExpectEq(index.sources(6), index.sources(0))
+            ut.ExpectEq(index.sources(7), [])
+            ut.ExpectEq(index.sources(8), [("chr1.trna1_A", 0, 20, None)])
+
+
+if __name__ == "__main__":
+    ut.RunTests()
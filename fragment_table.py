@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+# Converts the .names table, and optionally the .lookup table, into a
+# compact columnar binary file, and reads such files back.
+#
+# Usage:
+#   python3 fragment_table.py <.names file> [<.lookup file>]
+#       -o <fragment table file>
+#
+# The file starts with _HEADER, followed by these columns, each
+# aligned to 8 bytes. Fragments are sorted, and column i describes
+# fragment i.
+#
+#   offsets: uint64[count + 1]; fragment i is packed in
+#       packed[offsets[i] : offsets[i + 1]].
+#   lengths: uint8[count], the length of each fragment.
+#   types: uint8[count], a bitmask of the types of each fragment (see
+#       TYPE_BITS). Only present if the .names file lists types.
+#   exclusive: count bits, set iff the fragment is exclusive to tRNA
+#       space (a 'Y' in the .lookup file). Only present if a .lookup
+#       file was given.
+#   packed: the fragments, two bits per base (A, C, G, T = 0, 1, 2, 3),
+#       four bases per byte, with the first base in the high bits. The
+#       last byte of each fragment is padded with A's.
+#
+# Fragments holding bases other than A, C, G and T cannot be packed.
+# They are rare, and are stored after the columns as lines of text,
+#
+#   <fragment> <types bitmask> <exclusive (0 or 1)>
+#
+# which are read into a dictionary when the file is opened.
+#
+# Padding with A's, the least base, preserves the order of the
+# fragments: comparing the packed bytes of two fragments, and then
+# their lengths, orders them just as comparing their sequences does.
+# FragmentTable.find() can therefore binary search the packed column
+# directly, without unpacking the fragments.
+
+import argparse
+import mmap
+import struct
+
+from trnapy import MatchType
+
+
+_MAGIC = b"TRNAFTAB"
+
+_HEADER = struct.Struct("=8sIIQQQ")
+
+# Version of the file format.
+FRAGMENT_TABLE_VERSION = 1
+
+_HAS_TYPES = 1
+_HAS_EXCLUSIVE = 2
+
+# Maps the name of each fragment type, as printed in the .names file,
+# to its bit in the types column.
+TYPE_BITS = {str(match_type): 1 << i
+        for i, match_type in enumerate(MatchType)}
+TYPE_BITS["None"] = 1 << len(MatchType)
+
+_BASE_DIGITS = str.maketrans("ACGT", "0123")
+
+# The four bases packed in each possible byte.
+_UNPACKED_BYTES = ["".join("ACGT"[(b >> shift) & 3]
+    for shift in (6, 4, 2, 0)) for b in range(256)]
+
+
+def _Align(n):
+    return (n + 7) & ~7
+
+
+# Returns fragment packed two bits per base, or None if it holds a
+# base other than A, C, G and T.
+def PackFragment(fragment):
+    if not fragment or fragment.strip("ACGT"):
+        return None
+    padding = -len(fragment) % 4
+    code = int(fragment.translate(_BASE_DIGITS) + "0" * padding, 4)
+    return code.to_bytes((len(fragment) + padding) // 4, "big")
+
+
+def UnpackFragment(packed, length):
+    return "".join(map(_UNPACKED_BYTES.__getitem__, packed))[:length]
+
+
+# Returns the types bitmask of the comma-separated list of types in
+# the second column of a .names file.
+def TypesBitmask(types):
+    bitmask = 0
+    for fragment_type in types.split(","):
+        fragment_type = fragment_type.strip()
+        if fragment_type:
+            bitmask |= TYPE_BITS[fragment_type]
+    return bitmask
+
+
+def TypesFromBitmask(bitmask):
+    return [name for name, bit in TYPE_BITS.items() if bitmask & bit]
+
+
+# Writes the fragment table for the .names file, and, if it is not
+# None, the .lookup file, to the file at path.
+def WriteFragmentTable(path, names_file, lookup_file=None):
+    types = {}
+    has_types = False
+    for line in names_file:
+        fields = line.rstrip("\n").split("\t", 1)
+        if not fields[0]:
+            continue
+        if len(fields) > 1:
+            has_types = True
+            types[fields[0]] = TypesBitmask(fields[1])
+        else:
+            types[fields[0]] = 0
+
+    exclusive = None
+    if lookup_file is not None:
+        exclusive = {}
+        for line in lookup_file:
+            fields = line.split()
+            if fields:
+                exclusive[fields[0]] = fields[1] == "Y"
+
+    packed_fragments = []
+    other_fragments = []
+    for fragment in sorted(types):
+        packed = PackFragment(fragment)
+        if packed is None:
+            other_fragments.append(fragment)
+        else:
+            packed_fragments.append((fragment, packed))
+
+    count = len(packed_fragments)
+    offsets = [0]
+    for fragment, packed in packed_fragments:
+        offsets.append(offsets[-1] + len(packed))
+    exclusive_bits = bytearray((count + 7) // 8)
+    if exclusive is not None:
+        for i, (fragment, packed) in enumerate(packed_fragments):
+            if exclusive.get(fragment, False):
+                exclusive_bits[i >> 3] |= 1 << (i & 7)
+    others = "".join("{}\t{}\t{}\n".format(fragment, types[fragment],
+        int(exclusive is not None and exclusive.get(fragment, False)))
+        for fragment in other_fragments).encode()
+
+    columns = [
+        struct.pack("=" + str(count + 1) + "Q", *offsets),
+        bytes(len(fragment) for fragment, packed in packed_fragments),
+        bytes(types[fragment] for fragment, packed in packed_fragments)
+            if has_types else b"",
+        bytes(exclusive_bits) if exclusive is not None else b"",
+        b"".join(packed for fragment, packed in packed_fragments),
+        others,
+    ]
+    flags = (_HAS_TYPES if has_types else 0) | \
+            (_HAS_EXCLUSIVE if exclusive is not None else 0)
+    with open(path, "wb") as table_file:
+        table_file.write(_HEADER.pack(_MAGIC, FRAGMENT_TABLE_VERSION,
+            flags, count, offsets[-1], len(others)))
+        position = _HEADER.size
+        for column in columns:
+            table_file.write(bytes(_Align(position) - position))
+            position = _Align(position) + len(column)
+            table_file.write(column)
+
+
+# A fragment table file, mapped into memory. Fragments are looked up
+# by binary search, so opening the table takes constant time and
+# memory, whatever its size.
+class FragmentTable:
+    def __init__(self, path):
+        with open(path, "rb") as table_file:
+            self.mapping = mmap.mmap(table_file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mapping)
+        magic, version, flags, count, packed_size, others_size = \
+                _HEADER.unpack_from(self.buffer)
+        if magic != _MAGIC or version != FRAGMENT_TABLE_VERSION:
+            raise ValueError("Invalid fragment table file: " + path)
+        self.count = count
+        self.has_types = bool(flags & _HAS_TYPES)
+        self.has_exclusive = bool(flags & _HAS_EXCLUSIVE)
+
+        self._views = []
+        offset = _HEADER.size
+        def Column(size, format="B"):
+            nonlocal offset
+            offset = _Align(offset)
+            item_size = struct.calcsize(format)
+            column = self.buffer[offset : offset + size * item_size]
+            offset += size * item_size
+            self._views.append(column)
+            self._views.append(column.cast(format))
+            return self._views[-1]
+
+        self.offsets = Column(count + 1, "Q")
+        self.lengths = Column(count)
+        self.types = Column(count if self.has_types else 0)
+        self.exclusive = Column(
+                (count + 7) // 8 if self.has_exclusive else 0)
+        self.packed = Column(packed_size)
+        others = bytes(Column(others_size)).decode()
+
+        # Maps each fragment which could not be packed to a pair
+        # (types bitmask, exclusive).
+        self.others = {}
+        for line in others.splitlines():
+            fragment, types, exclusive = line.split("\t")
+            self.others[fragment] = (int(types), exclusive == "1")
+
+    def __len__(self):
+        return self.count + len(self.others)
+
+    def __str__(self):
+        return "<FragmentTable with " + str(len(self)) + " fragments>"
+
+    def __repr__(self):
+        return str(self)
+
+    def __contains__(self, fragment):
+        return fragment in self.others or self.find(fragment) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self.buffer.release()
+        self.mapping.close()
+
+    # Returns the i-th packed fragment.
+    def fragment(self, i):
+        return UnpackFragment(
+                self.packed[self.offsets[i] : self.offsets[i + 1]],
+                self.lengths[i])
+
+    # Returns the index of fragment among the packed fragments, or None
+    # if it is not one of them.
+    def find(self, fragment):
+        packed = PackFragment(fragment)
+        if packed is None:
+            return None
+        key = (packed, len(fragment))
+        offsets = self.offsets
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (bytes(self.packed[offsets[mid] : offsets[mid + 1]]),
+                    self.lengths[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.lengths[lo] == len(fragment) and \
+                self.packed[offsets[lo] : offsets[lo + 1]] == packed:
+            return lo
+        return None
+
+    # Returns a pair (types, exclusive) for fragment, or None if the
+    # table does not hold it. types is a list of type names, and
+    # exclusive is True iff the fragment is exclusive to tRNA space;
+    # either is None if the table was written without that column.
+    def lookup(self, fragment):
+        if fragment in self.others:
+            bitmask, exclusive = self.others[fragment]
+        else:
+            i = self.find(fragment)
+            if i is None:
+                return None
+            bitmask = self.types[i] if self.has_types else 0
+            exclusive = bool(self.exclusive[i >> 3] & (1 << (i & 7))) \
+                    if self.has_exclusive else False
+        return (TypesFromBitmask(bitmask) if self.has_types else None,
+                exclusive if self.has_exclusive else None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts the .names "
+            "and .lookup tables into a fragment table file.")
+    parser.add_argument("names_file")
+    parser.add_argument("lookup_file", nargs="?")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    with open(args.names_file, 'r') as names_file:
+        if args.lookup_file is not None:
+            with open(args.lookup_file, 'r') as lookup_file:
+                WriteFragmentTable(args.output, names_file, lookup_file)
+        else:
+            WriteFragmentTable(args.output, names_file)
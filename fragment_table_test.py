@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+import io
+import os
+import tempfile
+
+import fragment_table
+import testing
+
+ut = testing.UnitTestCollection()
+
+names = {
+        "ACGTACGTACGTACGT": "i-tRF",
+        "ACGTACGTACGTACGTA": "i-tRF, 5'-tRF",
+        "ACGTACGTACGTACG": "3'-tRH",
+        "TTTTGGGGCCCCAAAAT": "5'-tRH",
+        "ACGTNCGTACGTACGT": "3'-tRF"}
+exclusive = {
+        "ACGTACGTACGTACGT": "Y",
+        "ACGTACGTACGTACGTA": "N",
+        "ACGTACGTACGTACG": "N",
+        "TTTTGGGGCCCCAAAAT": "Y",
+        "ACGTNCGTACGTACGT": "Y"}
+
+
+@ut()
+def PackFragment_test():
+    for fragment in ["A", "ACGT", "TTTTG", "GATTACA" * 7]:
+        packed = fragment_table.PackFragment(fragment)
+        ut.ExpectEq(len(packed), (len(fragment) + 3) // 4)
+        ut.ExpectEq(fragment_table.UnpackFragment(packed, len(fragment)),
+                fragment)
+    ut.ExpectEq(fragment_table.PackFragment("ACNT"), None)
+
+    # Packed fragments sort as their sequences do.
+    fragments = ["AC", "ACA", "ACAA", "ACAAC", "ACC", "C", "CA", "T"]
+    ut.ExpectEq(sorted(fragments, key=lambda f: (
+        fragment_table.PackFragment(f), len(f))), fragments)
+
+
+@ut(names, exclusive)
+def FragmentTable_test(names, exclusive):
+    names_file = io.StringIO("".join(fragment + "\t" + types + "\n"
+        for fragment, types in names.items()))
+    lookup_file = io.StringIO("".join(fragment + "\t" + y_or_n + "\n"
+        for fragment, y_or_n in exclusive.items()))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "test.ftab")
+        fragment_table.WriteFragmentTable(path, names_file, lookup_file)
+        with fragment_table.FragmentTable(path) as table:
+            ut.ExpectEq(len(table), len(names))
+            ut.ExpectEq([table.fragment(i) for i in range(table.count)],
+                    sorted(f for f in names if "N" not in f))
+            for fragment, types in names.items():
+                ut.ExpectEq(table.lookup(fragment),
+                        (sorted(types.split(", "),
+                            key=list(fragment_table.TYPE_BITS).index),
+                            exclusive[fragment] == "Y"))
+            ut.ExpectEq(table.lookup("ACGTACGTACGTAC"), None)
+            ut.ExpectEq(table.lookup("ACGTACGTACGTACGTAA"), None)
+            ut.ExpectIn("ACGTNCGTACGTACGT", table)
+
+
+if __name__ == "__main__":
+    ut.RunTests()
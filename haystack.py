@@ -0,0 +1,132 @@
+# This module provides functions for reading haystack (chromosome)
+# data in bounded-size chunks, and for locating runs of the
+# haystack wildcard character (normally N) inside the haystack.
+#
+# A haystack file is either preprocessed (*.mint, see
+# chr_preprocess.sh), holding a single chromosome, or a FASTA file
+# holding any number of records, such as a whole genome as it is
+# downloaded. Either may be gzip-compressed.
+
+import gzip
+import itertools
+import re
+
+
+# Number of characters read from a haystack file at a time.
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+
+# Reads a preprocessed (*.mint) haystack file one chunk at a time.
+# Such files hold a single line of uppercased nucleotides and no
+# header; see chr_preprocess.sh. Newlines are skipped over, as they
+# are in find_patterns.
+def ReadHaystackChunks(haystack_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    while True:
+        chunk = haystack_file.read(chunk_size)
+        if not chunk:
+            return
+        chunk = chunk.replace("\n", "")
+        if chunk:
+            yield chunk
+
+
+# Opens the haystack file at path as text, decompressing it if its name
+# ends in .gz.
+def OpenHaystack(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+# Reads a FASTA file, given as an iterable of lines, one chunk of
+# about chunk_size characters at a time, and yields a triple
+# (record name, chunk, offset) for each chunk of each record. The name
+# of a record is the first word of its header line, and offset is the
+# position of the chunk in the record. The sequence is uppercased, as
+# chr_preprocess.sh does, and records with an empty sequence are
+# skipped.
+def ReadFastaChunks(lines, chunk_size=DEFAULT_CHUNK_SIZE):
+    name = None
+    pieces = []
+    size = 0
+    offset = 0
+    for line in lines:
+        if line.startswith(">"):
+            if size:
+                yield name, "".join(pieces).upper(), offset
+            fields = line[1:].split(None, 1)
+            name = fields[0] if fields else ""
+            pieces = []
+            size = 0
+            offset = 0
+            continue
+        if name is None:
+            raise ValueError("FASTA sequence found before any header")
+        piece = line.rstrip()
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield name, "".join(pieces).upper(), offset
+            offset += size
+            pieces = []
+            size = 0
+    if size:
+        yield name, "".join(pieces).upper(), offset
+
+
+# Reads a haystack file, FASTA or preprocessed, one chunk at a time,
+# and yields a triple (record name, chunk, offset) for each chunk, as
+# ReadFastaChunks() does. A file is read as FASTA if its first
+# character is a '>'. A preprocessed file is a single record, whose
+# name is given as default_name.
+def ReadHaystackRecords(haystack_file, default_name=None,
+        chunk_size=DEFAULT_CHUNK_SIZE):
+    first = haystack_file.read(1)
+    if first == ">":
+        yield from ReadFastaChunks(itertools.chain(
+            [first + haystack_file.readline()], haystack_file), chunk_size)
+        return
+
+    chunks = ReadHaystackChunks(haystack_file, chunk_size)
+    if first.strip():
+        chunks = itertools.chain([first], chunks)
+    offset = 0
+    for chunk in chunks:
+        yield default_name, chunk, offset
+        offset += len(chunk)
+
+
+# Returns True iff the haystack file at path is a FASTA file.
+def IsFasta(path):
+    with OpenHaystack(path) as haystack_file:
+        return haystack_file.read(1) == ">"
+
+
+# Holds the maximal runs of the wildcard character in a piece of
+# haystack text. Runs are stored as two sorted lists of 0-based,
+# inclusive endpoints.
+#
+# Genomes contain few, but very long, runs of N (assembly gaps,
+# centromeres and telomeres). Keeping the runs in a table lets the
+# scanner decide in O(1) whether a window of the haystack crosses a
+# run that is too long to be matched, and jump straight past it,
+# instead of feeding every N to the matcher.
+class WildcardRunTable:
+    def __init__(self, text, wildcard):
+        self.starts = []
+        self.ends = []
+        for m in re.finditer(re.escape(wildcard) + "+", text):
+            self.starts.append(m.start())
+            self.ends.append(m.end() - 1)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __str__(self):
+        return "<WildcardRunTable with " + str(len(self)) + " runs>"
+
+    def __repr__(self):
+        return str(self)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
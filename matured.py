@@ -4,26 +4,42 @@
 # The records of the *matured.fa file have the following format.
 # <trna name>_<amino acid><anticodon>_<chromosome number>_<+->
 #   _<start position>_<end position>
+#
+# The records are written to stdout, or with --output <file>, to
+# <file> (see output.py).
 
 import re
 import sys
+import output
 import trnapy
 
 if __name__ == "__main__":
+    usage_message = \
+            "\nUsage:\tpython3 matured.py <.ss file> [--output <file>]"
+    output_path = None
+    if "--output" in sys.argv:
+        i = sys.argv.index("--output")
+        if i + 1 >= len(sys.argv):
+            raise Exception(usage_message)
+        output_path = sys.argv[i + 1]
+        del sys.argv[i : i + 2]
+    if len(sys.argv) < 2:
+        raise Exception(usage_message)
+
     with open(sys.argv[1], 'r') as ss_file:
         trna_records = trnapy.ReadTRNARecordsFromSSFile(ss_file)
     trna_records.AddCCAToAll()
-    for trna in trna_records:
-        chromosome_number = re.sub(r"chr([^.]*).*", r"\1",
-                trna.identifier)
-        trna_name = re.sub(r"chr[^.]*\.(.*)", r"\1", trna.identifier)
-        matured_string = ">"
-        matured_string += trna_name + "_"
-        matured_string += trna.amino_acid + trna.anticodon + "_"
-        matured_string += chromosome_number + "_"
-        matured_string += trna.sign + "_"
-        matured_string += str(trna.genome_interval[0]) + "_"
-        matured_string += str(trna.genome_interval[1])
-        print(matured_string)
-        print(trna.sequence())
-
+    with output.OutputWriter(output_path) as output_file:
+        for trna in trna_records:
+            chromosome_number = re.sub(r"chr([^.]*).*", r"\1",
+                    trna.identifier)
+            trna_name = re.sub(r"chr[^.]*\.(.*)", r"\1", trna.identifier)
+            matured_string = ">"
+            matured_string += trna_name + "_"
+            matured_string += trna.amino_acid + trna.anticodon + "_"
+            matured_string += chromosome_number + "_"
+            matured_string += trna.sign + "_"
+            matured_string += str(trna.genome_interval[0]) + "_"
+            matured_string += str(trna.genome_interval[1])
+            output_file.WriteLine(matured_string)
+            output_file.WriteLine(trna.sequence())
@@ -5,6 +5,31 @@
 # simply produces a list of fragments,
 # but does not include their names.
 #
+# The fragments are printed in sorted order, just as piping the
+# output through sort -k1,1 would print them. They are collected in
+# memory, and sorted runs of --buffer-size distinct fragments are
+# spilled to disk (under --temp-dir, if given) and merged, so that
+# memory use is bounded however many fragments there are.
+#
+# If --sources <file> is given, the tRNAs, start indices, lengths
+# and types each fragment is produced from are written to <file>
+# (see fragment_sources.py). A fragment is identified in that file
+# by its line number in the .names file.
+#
+# With --automaton, the tRNAs are added to a suffix automaton (see
+# suffix_automaton.py), which yields each distinct fragment once, in
+# sorted order, so that neither a dictionary of the fragments nor a
+# sort is needed.
+#
+# With --jobs <n>, the tRNAs are split into n shards, whose fragments
+# are enumerated by a pool of n processes. Each process returns its
+# fragments sorted and without repeats; each shard is spilled to disk
+# (under --temp-dir) as it arrives, and the shards are merged from
+# there.
+#
+# The output is written to stdout, or with --output <file>, to <file>
+# (see output.py), which is compressed if its name ends in .gz.
+#
 # Sample usages:
 #
 #   python3 naming.py \
@@ -15,7 +40,15 @@
 #        data/hg19/tRNAspace.Spliced.Sequences.MINTmap_v1.fa \
 #       >gen/hg19/hg19-tRNAs.names
 
+import contextlib
+import extsort
+import heapq
+import multiprocessing
+import operator
+import output
 import sys
+import fragment_sources
+import suffix_automaton
 import trnapy
 from trnapy import FileFormat
 
@@ -25,10 +58,196 @@ from trnapy import FileFormat
 range_lower = 16
 range_upper = 50
 
+# Number of distinct fragments held in memory before they are spilled
+# to disk by EnumerateSortedFragments().
+DEFAULT_BUFFER_SIZE = 1 << 21
+
+
+# Returns a dictionary mapping each fragment of the tRNAs to a pair
+# (types, sources). types is the set of the fragment's types, which is
+# left empty unless with_types; sources is the list of its sources, as
+# (tRNA id, start, length, type) tuples, which is left empty unless
+# with_sources. The tRNAs are numbered from first_id. The fragments
+# are added to fragments, if it is given.
+def EnumerateFragments(trnas, first_id=0, with_types=True,
+        with_sources=False, fragments=None):
+    if fragments is None:
+        fragments = {}
+    for trna_id, trna in enumerate(trnas, first_id):
+        for fragment in trnapy.TRNAFragments(trna, range_lower,
+                range_upper):
+            sequence = fragment.sequence()
+            if sequence not in fragments:
+                fragments[sequence] = (set(), [])
+            types, sources = fragments[sequence]
+            if with_types:
+                types.add(fragment.fragment_type())
+            if with_sources:
+                sources.append((trna_id, fragment.start_index,
+                    len(fragment),
+                    fragment.fragment_type() if with_types else None))
+    return fragments
+
+
+# Yields a (sequence, types, sources) tuple for each fragment of the
+# tRNAs, as EnumerateFragments() returns them, in sorted order.
+#
+# The fragments of consecutive tRNAs are collected in a dictionary.
+# Whenever it holds buffer_size fragments, they are sorted and spilled
+# to disk (under temp_dir) as a run, and the runs are merged at the
+# end, so that memory use is bounded. If every fragment fits in the
+# buffer, nothing is written to disk.
+def EnumerateSortedFragments(trnas, with_types=True, with_sources=False,
+        buffer_size=DEFAULT_BUFFER_SIZE, temp_dir=None):
+    def SortedItems(fragments):
+        return [(sequence, types, sources)
+                for sequence, (types, sources) in sorted(fragments.items())]
+
+    with extsort.ExternalSorter(temp_dir=temp_dir) as sorter:
+        fragments = {}
+        for trna_id, trna in enumerate(trnas):
+            EnumerateFragments([trna], trna_id, with_types, with_sources,
+                    fragments)
+            if len(fragments) >= buffer_size:
+                sorter.AddRun(SortedItems(fragments))
+                fragments = {}
+        if not len(sorter):
+            yield from SortedItems(fragments)
+            return
+        sorter.AddRun(SortedItems(fragments))
+        # Runs hold consecutive tRNAs, and are merged in order, so the
+        # sources of a fragment remain ordered by tRNA id.
+        yield from MergeShards([sorter.Merge(key=operator.itemgetter(0))])
+
+
+# Yields a (sequence, types, sources) tuple for each fragment of the
+# tRNAs, as EnumerateSortedFragments() does, read from a suffix
+# automaton of the tRNAs.
+#
+# The whole of each tRNA is added to the automaton, but only the
+# occurrences starting at the first base of an expanded tRNA are kept
+# as sources, as TRNAFragments() yields. The others lie in the tRNA it
+# was expanded from, which is added as well, so no fragment is left
+# without a source.
+def EnumerateFragmentsWithAutomaton(trnas, with_types=True,
+        with_sources=False):
+    automaton = suffix_automaton.SuffixAutomaton()
+    for trna_id, trna in enumerate(trnas):
+        automaton.add(trna.sequence(), trna_id)
+
+    for sequence, state in automaton.Substrings(range_lower, range_upper):
+        types = set()
+        sources = []
+        if with_types or with_sources:
+            length = len(sequence)
+            for trna_id, start in sorted((trna_id, end - length + 1)
+                    for trna_id, end in automaton.EndPositions(state)):
+                trna = trnas[trna_id]
+                if start and trna.expanded:
+                    continue
+                fragment_type = trna.FragmentType(start, length) \
+                        if with_types else None
+                if with_types:
+                    types.add(fragment_type)
+                if with_sources:
+                    sources.append((trna_id, start, length, fragment_type))
+        yield sequence, types, sources
+
+
+# Returns the types in a fixed order: by MatchType, with None last.
+def SortedTypes(types):
+    return sorted(types, key=lambda match_type: (match_type is None,
+        0 if match_type is None else match_type.value))
+
+
+# The tRNAs enumerated by _NameShard(). Worker processes inherit them
+# from the process which forked them.
+_trnas = []
+
+
+# Enumerates the fragments of the tRNAs _trnas[begin:end], and returns
+# them as a sorted list of (sequence, types, sources) tuples.
+def _NameShard(shard):
+    begin, end, with_types, with_sources = shard
+    fragments = EnumerateFragments(_trnas[begin:end], begin, with_types,
+            with_sources)
+    return [(sequence, types, sources)
+            for sequence, (types, sources) in sorted(fragments.items())]
+
+
+# Merges the sorted lists of (sequence, types, sources) tuples returned
+# for consecutive shards, and yields a (sequence, types, sources) tuple
+# for each fragment, in sorted order. The types of a fragment found in
+# several shards are united, and its sources concatenated in the order
+# of the shards.
+def MergeShards(shards):
+    sequence = None
+    for next_sequence, types, sources in heapq.merge(*shards,
+            key=operator.itemgetter(0)):
+        if next_sequence != sequence:
+            if sequence is not None:
+                yield sequence, merged_types, merged_sources
+            sequence = next_sequence
+            merged_types = set()
+            merged_sources = []
+        merged_types.update(types)
+        merged_sources.extend(sources)
+    if sequence is not None:
+        yield sequence, merged_types, merged_sources
+
+
+# Yields a (sequence, types, sources) tuple for each fragment of the
+# tRNAs, in sorted order, as EnumerateSortedFragments() does. The
+# fragments are enumerated in jobs shards by a pool of jobs processes.
+# Each shard is spilled to disk (under temp_dir) as a run as soon as
+# it is returned, so that at most one is held in memory, and the runs
+# are merged.
+def EnumerateFragmentsInParallel(trnas, jobs, with_types=True,
+        with_sources=False, temp_dir=None):
+    global _trnas
+    _trnas = trnas
+    bounds = [len(trnas) * i // jobs for i in range(jobs + 1)]
+    shards = [(bounds[i], bounds[i + 1], with_types, with_sources)
+            for i in range(jobs)]
+    with extsort.ExternalSorter(temp_dir=temp_dir) as sorter:
+        with multiprocessing.get_context("fork").Pool(jobs) as pool:
+            # Shards are returned in order, so the sources of a
+            # fragment remain ordered by tRNA id.
+            for shard in pool.imap(_NameShard, shards):
+                sorter.AddRun(shard)
+        _trnas = []
+        yield from MergeShards([sorter.Merge(key=operator.itemgetter(0))])
+
+
 if __name__ == "__main__":
     usage_message = \
-            "\nUsage:\tpython3 postprocess.py [-s] <.ss file>\n" + \
-                "\tpython3 postprocess.py -f <.fa file>"
+            "\nUsage:\tpython3 naming.py [-s] <.ss file>\n" + \
+                "\tpython3 naming.py -f <.fa file>\n" + \
+                "\t[--sources <file>] [--jobs <n>] [--output <file>]\n" + \
+                "\t[--buffer-size <n>] [--temp-dir <dir>] [--automaton]"
+    def PopOption(option):
+        if option not in sys.argv:
+            return None
+        i = sys.argv.index(option)
+        if i + 1 >= len(sys.argv):
+            raise Exception(usage_message)
+        value = sys.argv[i + 1]
+        del sys.argv[i : i + 2]
+        return value
+    sources_path = PopOption("--sources")
+    jobs = PopOption("--jobs")
+    jobs = None if jobs is None else int(jobs)
+    buffer_size = PopOption("--buffer-size")
+    buffer_size = DEFAULT_BUFFER_SIZE if buffer_size is None \
+            else int(buffer_size)
+    temp_dir = PopOption("--temp-dir")
+    output_path = PopOption("--output")
+    use_automaton = "--automaton" in sys.argv
+    if use_automaton:
+        sys.argv.remove("--automaton")
+    if (jobs is not None and jobs < 1) or buffer_size < 1:
+        raise Exception(usage_message)
+
     if len(sys.argv) < 2:
         raise Exception(usage_message)
 
@@ -55,33 +274,32 @@ if __name__ == "__main__":
     trna_records.AddCCAToAll()
     trna_records.ExpandAll()
 
-    fragment_sequences_and_types = {}
-    def AddFragmentType(fragment):
-        if fragment.sequence() not in \
-                fragment_sequences_and_types:
-            fragment_sequences_and_types[fragment.sequence()] = set()
-        if file_format == FileFormat.SS:
-            fragment_sequences_and_types[fragment.sequence()].add(
-                            fragment.fragment_type())
-
-    for trna in trna_records:
-        # If [ACTG] has been prepended.
-        if trna.expanded:
-            for length in range(range_lower, 1 + min(
-                    range_upper, len(trna))):
-                fragment = trna.fragment(0, length)
-                AddFragmentType(fragment)
-        else:
-            for start_index in range(len(trna) - range_lower + 1):
-                for length in range(range_lower, 1 + min(
-                            range_upper, len(trna) - start_index)):
-                    fragment = trna.fragment(start_index, length)
-                    AddFragmentType(fragment)
-
-    for sequence, types in fragment_sequences_and_types.items():
-        if file_format == FileFormat.SS:
-            print(sequence + "\t", end="")
-            print(*types, sep=", ")
-        else:
-            print(sequence)
+    trnas = list(trna_records)
+    with_types = file_format == FileFormat.SS
+    with_sources = sources_path is not None
+    if use_automaton:
+        fragments = EnumerateFragmentsWithAutomaton(trnas, with_types,
+                with_sources)
+    elif jobs is not None:
+        fragments = EnumerateFragmentsInParallel(trnas, jobs, with_types,
+                with_sources, temp_dir)
+    else:
+        fragments = EnumerateSortedFragments(trnas, with_types,
+                with_sources, buffer_size, temp_dir)
 
+    # Fragments are identified by line number in the sources file. The
+    # sources of each fragment are streamed to the sources file as the
+    # fragment is written.
+    sources_writer = fragment_sources.FragmentSourcesWriter(sources_path,
+            [trna.identifier for trna in trnas], temp_dir) \
+                    if with_sources else contextlib.nullcontext()
+    with output.OutputWriter(output_path) as output_file, \
+            sources_writer:
+        for sequence, types, sources in fragments:
+            if with_types:
+                output_file.WriteLine(sequence + "\t" +
+                        ", ".join(map(str, SortedTypes(types))))
+            else:
+                output_file.WriteLine(sequence)
+            if with_sources:
+                sources_writer.AddFragment(sources)
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+import io
+
+import naming
+import testing
+import trnapy
+
+ut = testing.UnitTestCollection()
+
+fa_file = """>trna17_HisGTG_M_+_12138_12206
+GTAAATATAGTTTAACCAAAACATCAGATTGTGAATCTGACAACAGAGGCTTACGACCCCTTATTTACC
+>trna18_SerGCT_M_+_12207_12265
+GAGAAAGCTCACAAGAACTGCTAACTCATGCCCCCATGTCTAACAACATGGCTTTCTCA
+>trna19_LeuTAG_M_+_12266_12336
+ACTTTTAAAGGATAACAGCTATCCATTGGTCTTAGGCCCCAAAAATTTTGGTGCAACTCCAAATAAAAGTA
+>trna20_GluTTC_M_-_14674_14742
+GTTCTTGTAGTTGAAATACAACGATGGTTTTTCATATCATTGGTCGTGGTTGTAGTCCGTGCGAGAATA"""
+
+
+@ut()
+def MergeShards_test():
+    shards = [
+        [("AC", {1}, [(0, 0, 2, 1)]), ("GT", {2}, [(0, 2, 2, 2)])],
+        [("AC", {3}, [(1, 0, 2, 3)]), ("CC", {1}, [(1, 1, 2, 1)])],
+    ]
+    ut.ExpectEq(list(naming.MergeShards(shards)), [
+        ("AC", {1, 3}, [(0, 0, 2, 1), (1, 0, 2, 3)]),
+        ("CC", {1}, [(1, 1, 2, 1)]),
+        ("GT", {2}, [(0, 2, 2, 2)]),
+    ])
+
+
+@ut()
+def EnumerateFragmentsInParallel_test():
+    frame = trnapy.ReadTRNARecordsFromFAFile(io.StringIO(fa_file))
+    frame.AddCCAToAll()
+    frame.ExpandAll()
+    trnas = list(frame)
+    serial = sorted((sequence, types, sources) for sequence,
+            (types, sources) in naming.EnumerateFragments(trnas, 0,
+                with_types=False, with_sources=True).items())
+    for jobs in (1, 3):
+        ut.ExpectEq(list(naming.EnumerateFragmentsInParallel(trnas, jobs,
+            with_types=False, with_sources=True)), serial)
+
+
+@ut()
+def EnumerateSortedFragments_test():
+    frame = trnapy.ReadTRNARecordsFromFAFile(io.StringIO(fa_file))
+    frame.AddCCAToAll()
+    frame.ExpandAll()
+    trnas = list(frame)
+    expected = sorted((sequence, types, sources) for sequence,
+            (types, sources) in naming.EnumerateFragments(trnas, 0,
+                with_types=False, with_sources=True).items())
+    # Spills a run after every tRNA.
+    for buffer_size in (1, len(expected)):
+        ut.ExpectEq(list(naming.EnumerateSortedFragments(trnas,
+            with_types=False, with_sources=True,
+            buffer_size=buffer_size)), expected)
+
+
+@ut()
+def EnumerateFragmentsWithAutomaton_test():
+    frame = trnapy.ReadTRNARecordsFromFAFile(io.StringIO(fa_file))
+    frame.AddCCAToAll()
+    frame.ExpandAll()
+    trnas = list(frame)
+    for with_sources in (False, True):
+        expected = sorted((sequence, types, sources) for sequence,
+                (types, sources) in naming.EnumerateFragments(trnas, 0,
+                    with_types=False, with_sources=with_sources).items())
+        ut.ExpectEq(list(naming.EnumerateFragmentsWithAutomaton(trnas,
+            with_types=False, with_sources=with_sources)), expected)
+
+
+if __name__ == "__main__":
+    ut.RunTests()
@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+# Produces the second output table described in MINTMAP.txt, listing
+# the genomic occurrences of each fragment, from .matches files.
+#
+# Usage:
+#   python3 occurrences.py [-o <output file>] [--gzip]
+#       [--names <.names file> --sources <sources file>]
+#       [.matches FILES]
+#
+# For each place in the genome where a fragment was found, a line of
+# the following form is printed.
+#
+#   <fragment> <chromosome> <start>-<end> <+|-> <tRNA names>
+#
+# The fields are separated by tabs. The fragment is given as it is in
+# the .names file, i.e. read on the strand of its tRNA; <start> and
+# <end> are the 0-based, inclusive positions of the match in the
+# chromosome, and the sign gives the strand on which it was found.
+# <tRNA names> is a comma-separated list of the tRNAs the fragment was
+# matched as a part of, without their sign and expansion (e.g.
+# chr1.trna702). In reduced mode the .matches files do not name the
+# tRNAs; they are then found in the sources file written by
+# naming.py --sources, if it is given along with its .names file, and
+# a '-' is printed otherwise.
+#
+# Lines are sorted by fragment, so all the occurrences of a fragment
+# are listed together. The matches are sorted with an external merge
+# sort (see extsort.py), so memory use does not depend on the number
+# of matches; at most --buffer-size of them are held in memory at a
+# time. The table is written as output.py writes it; with --gzip, or
+# if the output file name ends in .gz, it is compressed.
+
+import argparse
+import array
+import bisect
+import gzip
+import mmap
+import re
+import shutil
+import tempfile
+
+import extsort
+import fragment_sources
+import output
+import reduced_postprocess
+import trnapy
+from trnapy import InverseComplement
+
+
+# Yields a record (fragment, chromosome, start, end, sign, tRNA name)
+# for each line of a .matches file produced from the haystack of
+# chromosome.
+#
+# In reduced mode, a record is yielded for each of the tRNAs listed
+# for the fragment in sources, a FragmentSources object, if it is not
+# None; fragments is then the trnapy.NamesFile of the .names file it
+# was written for. Otherwise, the tRNA name is empty.
+def ReadOccurrences(matches_file, chromosome, fragments=None,
+        sources=None):
+    for line in matches_file:
+        fields = line.split()
+        if not fields:
+            continue
+        seq, haystack_start, pattern_start, name = fields[:4]
+        start = int(haystack_start)
+        sign = "-" if name[0] == "!" else "+"
+        fragment = seq if sign == "+" else InverseComplement(seq)
+        trna_names = [""]
+        if not re.fullmatch(r"!?\d+-\d+", name):
+            trna_names = [trnapy.DropExpansion(
+                    trnapy.StripSignFromTRNAName(name))]
+        elif sources is not None:
+            fragment_id = fragments.find(fragment)
+            if fragment_id is not None:
+                trna_names = set(map(trnapy.DropExpansion,
+                    sources.trnas(fragment_id)))
+        for trna_name in trna_names:
+            yield (fragment, chromosome, start, start + len(seq) - 1,
+                    sign, trna_name)
+
+
+# The lines of an occurrences table, as written by occurrences.py,
+# for each fragment of fragments, a trnapy.NamesFile. The table is
+# mapped into memory (a compressed table is first decompressed to a
+# temporary file, under temp_dir), and only the byte range of the
+# lines of each fragment is held, 16 bytes per fragment. Since both
+# the table and the .names file are sorted by fragment, the ranges are
+# found in a single pass. Lines of fragments which are not in
+# fragments are ignored. Raises ValueError if the table is not sorted.
+class OccurrencesIndex:
+    def __init__(self, path, fragments, temp_dir=None):
+        self.path = path
+        if path.endswith(".gz"):
+            self.file = tempfile.TemporaryFile(dir=temp_dir)
+            with gzip.open(path, "rb") as compressed_file:
+                shutil.copyfileobj(compressed_file, self.file)
+            self.file.flush()
+            self.file.seek(0)
+        else:
+            self.file = open(path, "rb")
+        self.starts = array.array("Q", bytes(8 * len(fragments)))
+        self.ends = array.array("Q", bytes(8 * len(fragments)))
+
+        position = 0
+        previous = None
+        fragment_id = None
+        next_id = 0
+        for line in self.file:
+            fragment = line.split(b"\t", 1)[0].strip().decode()
+            if fragment and fragment != previous:
+                if previous is not None and fragment < previous:
+                    raise ValueError("The occurrences table " + path +
+                            " is not sorted")
+                previous = fragment
+                found = bisect.bisect_left(fragments, fragment, next_id)
+                if found < len(fragments) and fragments[found] == fragment:
+                    fragment_id = found
+                    next_id = found + 1
+                    self.starts[fragment_id] = position
+                else:
+                    fragment_id = None
+            position += len(line)
+            if fragment_id is not None:
+                self.ends[fragment_id] = position
+        # An empty file cannot be mapped.
+        self.mapping = mmap.mmap(self.file.fileno(), 0,
+                access=mmap.ACCESS_READ) if position else b""
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __str__(self):
+        return "<OccurrencesIndex of " + self.path + ">"
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self.mapping, mmap.mmap):
+            self.mapping.close()
+        self.file.close()
+
+    # Returns the lines of the table for the fragment with id
+    # fragment_id, without their line ends.
+    def lines(self, fragment_id):
+        text = self.mapping[self.starts[fragment_id] :
+                self.ends[fragment_id]].decode()
+        return [line for line in text.splitlines() if line.strip()]
+
+
+# Groups the sorted occurrence records by place and yields a line of
+# the table for each place.
+def OccurrenceLines(records):
+    place = None
+    trna_names = []
+    for fragment, chromosome, start, end, sign, trna_name in records:
+        if (fragment, chromosome, start, end, sign) != place:
+            if place is not None:
+                yield FormatOccurrence(place, trna_names)
+            place = (fragment, chromosome, start, end, sign)
+            trna_names = []
+        if trna_name:
+            trna_names.append(trna_name)
+    if place is not None:
+        yield FormatOccurrence(place, trna_names)
+
+
+def FormatOccurrence(place, trna_names):
+    fragment, chromosome, start, end, sign = place
+    return "\t".join([fragment, chromosome,
+        str(start) + "-" + str(end), sign,
+        ",".join(trna_names) if trna_names else "-"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description="Lists the genomic occurrences of each fragment.")
+    parser.add_argument("matches_files", nargs="*")
+    parser.add_argument("-o", "--output")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--buffer-size", type=int,
+            default=extsort.DEFAULT_BUFFER_SIZE)
+    parser.add_argument("--temp-dir")
+    parser.add_argument("--names")
+    parser.add_argument("--sources")
+    args = parser.parse_args()
+    if (args.names is None) != (args.sources is None):
+        parser.error("--names and --sources must be given together")
+
+    fragments = None
+    sources = None
+    if args.sources is not None:
+        try:
+            fragments = trnapy.NamesFile(args.names)
+        except ValueError as error:
+            parser.error(str(error))
+        sources = fragment_sources.FragmentSources(args.sources)
+
+    with extsort.ExternalSorter(args.buffer_size, args.temp_dir) as sorter:
+        for matches_filename in args.matches_files:
+            with open(matches_filename, 'r') as matches_file:
+                for chromosome, match_lines in \
+                        reduced_postprocess.ReadMatchesRecords(
+                                matches_file):
+                    sorter.extend(ReadOccurrences(match_lines, chromosome,
+                        fragments, sources))
+
+        with output.OutputWriter(args.output, args.gzip) as output_file:
+            output_file.WriteLines(
+                    OccurrenceLines(sorter.Merge(unique=True)))
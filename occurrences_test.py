@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+
+import io
+import os
+import tempfile
+
+import fragment_sources
+import occurrences
+import reduced_postprocess
+import testing
+import trnapy
+
+ut = testing.UnitTestCollection()
+
+# AACGCGTT is its own inverse complement; the inverse complement of
+# GGGAAACC is GGTTTCCC.
+matches_file = """>chr1
+GGGAAACC 5 0 0-7
+GGTTTCCC 40 0 !0-7
+AACGCGTT 12 3 2-9
+AACGCGTT 12 3 !2-9
+>chr2
+GGGAAACCT 0 0 0-8
+"""
+
+names_file = "AACGCGTT\ti-tRF\nGGGAAACC\t5'-tRF\n"
+
+
+@ut()
+def ReadOccurrences_test():
+    records = []
+    for chromosome, lines in reduced_postprocess.ReadMatchesRecords(
+            io.StringIO(matches_file)):
+        records.extend(occurrences.ReadOccurrences(lines, chromosome))
+    ut.ExpectEq(records, [
+        ("GGGAAACC", "chr1", 5, 12, "+", ""),
+        # The fragment of a virtual pattern is read on the strand of its
+        # tRNA, but its place is given on the forward strand.
+        ("GGGAAACC", "chr1", 40, 47, "-", ""),
+        ("AACGCGTT", "chr1", 12, 19, "+", ""),
+        ("AACGCGTT", "chr1", 12, 19, "-", ""),
+        ("GGGAAACCT", "chr2", 0, 8, "+", "")])
+
+    # Outside reduced mode, the tRNA is named by the pattern.
+    ut.ExpectEq(list(occurrences.ReadOccurrences(
+        ["GGTTTCCC 7 2 !chr1.trna5_A\n", "\n",
+            "GGGAAACC 9 0 +chrM.trna17\n"], "chr3")), [
+        ("GGGAAACC", "chr3", 7, 14, "-", "chr1.trna5"),
+        ("GGGAAACC", "chr3", 9, 16, "+", "chrM.trna17")])
+
+
+@ut()
+def ReadOccurrences_sources_test():
+    trna_names = ["chr1.trna1", "chr1.trna1_A", "chr2.trna5"]
+    sources = [[(0, 3, 8, trnapy.MatchType.I_TRF),
+        (2, 0, 8, trnapy.MatchType.I_TRF)],
+        [(1, 0, 8, trnapy.MatchType.FIVE_PRIME_TRF)]]
+    with tempfile.TemporaryDirectory() as directory:
+        names_path = os.path.join(directory, "test.names")
+        with open(names_path, "w") as names:
+            names.write(names_file)
+        sources_path = os.path.join(directory, "test.sources")
+        fragment_sources.WriteFragmentSources(sources_path, sources,
+                trna_names)
+        with trnapy.NamesFile(names_path) as fragments, \
+                fragment_sources.FragmentSources(sources_path) as index:
+            records = []
+            for chromosome, lines in reduced_postprocess.ReadMatchesRecords(
+                    io.StringIO(matches_file)):
+                records.extend(occurrences.ReadOccurrences(lines,
+                    chromosome, fragments, index))
+    # Each tRNA is listed once, without its expansion, and fragments
+    # which are not in the .names file have no tRNA.
+    ut.ExpectEq(sorted(records), [
+        ("AACGCGTT", "chr1", 12, 19, "+", "chr1.trna1"),
+        ("AACGCGTT", "chr1", 12, 19, "+", "chr2.trna5"),
+        ("AACGCGTT", "chr1", 12, 19, "-", "chr1.trna1"),
+        ("AACGCGTT", "chr1", 12, 19, "-", "chr2.trna5"),
+        ("GGGAAACC", "chr1", 5, 12, "+", "chr1.trna1"),
+        ("GGGAAACC", "chr1", 40, 47, "-", "chr1.trna1"),
+        ("GGGAAACCT", "chr2", 0, 8, "+", "")])
+
+
+@ut()
+def OccurrenceLines_test():
+    records = [
+        ("AACGCGTT", "chr1", 12, 19, "+", "chr1.trna1"),
+        ("AACGCGTT", "chr1", 12, 19, "+", "chr2.trna5"),
+        ("AACGCGTT", "chr1", 12, 19, "-", "chr1.trna1"),
+        ("GGGAAACC", "chr1", 40, 47, "-", ""),
+        ("GGGAAACC", "chr2", 5, 12, "+", "")]
+    ut.ExpectEq(list(occurrences.OccurrenceLines(records)), [
+        "AACGCGTT\tchr1\t12-19\t+\tchr1.trna1,chr2.trna5",
+        "AACGCGTT\tchr1\t12-19\t-\tchr1.trna1",
+        "GGGAAACC\tchr1\t40-47\t-\t-",
+        "GGGAAACC\tchr2\t5-12\t+\t-"])
+    ut.ExpectEq(list(occurrences.OccurrenceLines([])), [])
+
+
+if __name__ == "__main__":
+    ut.RunTests()
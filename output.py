@@ -0,0 +1,145 @@
+# This module provides a buffered writer for the tables produced by
+# the scripts, which run to tens of millions of lines.
+#
+# Lines are collected in a list and written batch_size at a time,
+# joined by newlines, so the cost of a write is paid once per batch
+# rather than once per line, as it is with print().
+#
+# Output goes to stdout, or to a file. A file is written under a
+# temporary name in the same directory, and renamed into place when
+# the writer is closed, so that a table is never left half written
+# under its real name; if the writer is left by an exception, the
+# temporary file is deleted instead. If the name of the file ends in
+# .gz, or if compress is set, the output is compressed with gzip.
+#
+# Sample usage:
+#
+#   with output.OutputWriter(path) as output_file:
+#       for fragment in fragments:
+#           output_file.WriteLine(fragment)
+
+import gzip
+import io
+import os
+import sys
+import tempfile
+
+
+# Number of lines joined into a single write.
+DEFAULT_BATCH_SIZE = 1 << 16
+
+# Size of the buffer between the writer and the file.
+BUFFER_SIZE = 1 << 20
+
+# Compression level used for gzip output. Higher levels are several
+# times slower, for little gain on these tables.
+COMPRESS_LEVEL = 6
+
+
+# Writes lines of text to stdout, if path is None, or to the file at
+# path.
+class OutputWriter:
+    def __init__(self, path=None, compress=False,
+            batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.compress = compress or \
+                (path is not None and path.endswith(".gz"))
+        self.batch_size = batch_size
+        self.lines = []
+        self.closed = False
+
+        if path is None:
+            self.raw_file = None
+            binary_file = sys.stdout.buffer
+        else:
+            directory = os.path.dirname(os.path.abspath(path))
+            self.raw_file = tempfile.NamedTemporaryFile(dir=directory,
+                    prefix="." + os.path.basename(path) + ".",
+                    delete=False, buffering=BUFFER_SIZE)
+            binary_file = self.raw_file
+        if self.compress:
+            self.gzip_file = gzip.GzipFile(fileobj=binary_file, mode="wb",
+                    compresslevel=COMPRESS_LEVEL)
+            binary_file = self.gzip_file
+        else:
+            self.gzip_file = None
+        if path is None and not self.compress:
+            self.text_file = sys.stdout
+        else:
+            self.text_file = io.TextIOWrapper(binary_file,
+                    write_through=True)
+
+    def __str__(self):
+        return "<OutputWriter to " + \
+                ("stdout" if self.path is None else self.path) + ">"
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # Writes line, which should not end in a newline.
+    def WriteLine(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.batch_size:
+            self._WriteBatch()
+
+    def WriteLines(self, lines):
+        for line in lines:
+            self.WriteLine(line)
+
+    # Writes text as it is. Lines passed to WriteLine() before are
+    # written first.
+    def write(self, text):
+        self._WriteBatch()
+        self.text_file.write(text)
+
+    def flush(self):
+        self._WriteBatch()
+        self.text_file.flush()
+
+    # Writes out what is left, and moves the file into place.
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self._CloseFiles()
+        if self.raw_file is not None:
+            # Temporary files are only readable by their owner.
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(self.raw_file.name, 0o666 & ~umask)
+            os.replace(self.raw_file.name, self.path)
+
+    # Closes the writer, deleting the temporary file rather than moving
+    # it into place. Output to stdout is flushed as it is.
+    def abort(self):
+        if self.closed:
+            return
+        if self.raw_file is None:
+            self.flush()
+        self._CloseFiles()
+        if self.raw_file is not None:
+            os.unlink(self.raw_file.name)
+
+    def _WriteBatch(self):
+        if self.lines:
+            self.text_file.write("\n".join(self.lines) + "\n")
+            self.lines = []
+
+    def _CloseFiles(self):
+        self.closed = True
+        if self.text_file is not sys.stdout:
+            self.text_file.flush()
+            self.text_file.detach()
+        if self.gzip_file is not None:
+            self.gzip_file.close()
+        if self.raw_file is not None:
+            self.raw_file.close()
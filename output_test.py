@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+
+import gzip
+import os
+import tempfile
+
+import output
+import testing
+
+ut = testing.UnitTestCollection()
+
+
+@ut()
+def OutputWriter_test():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "table")
+        with output.OutputWriter(path, batch_size=3) as output_file:
+            output_file.WriteLines(str(i) for i in range(10))
+            output_file.write("text\n")
+            output_file.WriteLine("last")
+            # Nothing is visible under the real name until it is closed.
+            ut.ExpectEq(os.path.exists(path), False)
+        with open(path, "r") as table_file:
+            ut.ExpectEq(table_file.read(),
+                    "".join(str(i) + "\n" for i in range(10)) +
+                    "text\nlast\n")
+        ut.ExpectEq(os.listdir(directory), ["table"])
+
+
+@ut()
+def OutputWriter_gzip_test():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "table.gz")
+        with output.OutputWriter(path) as output_file:
+            output_file.WriteLines(["a", "b"])
+        with gzip.open(path, "rt") as table_file:
+            ut.ExpectEq(table_file.read(), "a\nb\n")
+
+
+@ut()
+def OutputWriter_abort_test():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "table")
+        try:
+            with output.OutputWriter(path) as output_file:
+                output_file.WriteLine("a")
+                raise ValueError()
+        except ValueError:
+            pass
+        ut.ExpectEq(os.listdir(directory), [])
+
+
+if __name__ == "__main__":
+    ut.RunTests()
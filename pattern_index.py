@@ -0,0 +1,438 @@
+# This module provides the pattern index used by the Python
+# scanning engine (scanner.py). The index plays the part of the trie
+# built by find_patterns: it holds every substring of every pattern
+# whose length lies between range_lower and range_upper.
+#
+# Instead of one trie node per substring, the index is keyed by the
+# range_lower-long prefix (the "seed") of each substring. Under each
+# seed, the pattern windows (the up to range_upper characters
+# starting at the seed) are grouped by their text, so that a
+# haystack position sharing its seed with many patterns is verified
+# once per distinct window rather than once per pattern.
+
+import collections
+import itertools
+import re
+import zlib
+
+from trnapy import InverseComplement
+
+
+# By default a match may contain at most this many wildcards.
+DEFAULT_MAX_WILDCARDS = 3
+
+
+# Reads the patterns from patterns_file. Each line should have the
+# following format, as for find_patterns.
+#
+#   <pattern name> <pattern>
+#
+# Returns a list of (name, pattern) pairs.
+def ReadPatternsFile(patterns_file):
+    patterns = []
+    for line in patterns_file:
+        fields = line.split()
+        if not fields:
+            continue
+        if len(fields) != 2:
+            raise ValueError("Invalid pattern file format")
+        patterns.append((fields[0], fields[1]))
+    return patterns
+
+
+# Returns the name find_patterns would report for a match against the
+# virtual (inverse complement) version of the pattern called name,
+# which has length pattern_length. See patterns_and_intervals.py.
+#
+# In reduced mode, name is a range of original indices, such as
+# "1-72". The virtual name is the mirrored range preceded by a '!',
+# e.g. "!3-74" for a pattern of length 76. Otherwise the leading
+# sign of the name, if any, is replaced with a '!'.
+def VirtualPatternName(name, pattern_length):
+    m = re.fullmatch(r"(\d+)-(\d+)", name)
+    if m:
+        return "!{}-{}".format(pattern_length - 1 - int(m.group(2)),
+                pattern_length - 1 - int(m.group(1)))
+    if name[0] in "+-":
+        return "!" + name[1:]
+    return "!" + name
+
+
+# Returns a list of all the strings obtained from s by replacing
+# each occurrence of wildcard with one of A, C, G or T.
+# Returns an empty list if s contains more than limit wildcards,
+# which keeps the expansion bounded by 4 ** limit strings.
+def ExpandWildcards(s, wildcard, limit):
+    positions = [i for i, c in enumerate(s) if c == wildcard]
+    if not positions:
+        return [s]
+    if len(positions) > limit:
+        return []
+
+    expansions = []
+    chars = list(s)
+    for bases in itertools.product("ACGT", repeat=len(positions)):
+        for position, base in zip(positions, bases):
+            chars[position] = base
+        expansions.append("".join(chars))
+    return expansions
+
+
+# Holds all substrings of the patterns having lengths between
+# range_lower and range_upper, keyed by seed.
+#
+# Each value in the seeds dictionary is a list of windows. A window
+# is a pair (window_text, entries): window_text holds the (up to)
+# range_upper characters of a pattern starting at the seed, and
+# entries is a tuple of the distinct (pattern name, start index)
+# pairs at which window_text occurs.
+#
+# If pattern_wildcard is set, seeds containing the wildcard are
+# stored under each of their expansions (see ExpandWildcards()).
+#
+# If both_strands is set, the index is used to find matches on both
+# strands of the haystack in a single pass, so that the patterns
+# need not be accompanied by their virtual (inverse complement)
+# versions. Seeds are then stored under their canonical form (see
+# CanonicalSeed()), and each value in the seeds dictionary is a list
+# of (window, orientation) pairs, where orientation is
+#   1 if the seed of the window is its own canonical form,
+#   -1 if the inverse complement of the seed is, and
+#   0 if the seed is its own inverse complement.
+# pattern_lengths then maps each pattern name to the length of the
+# pattern, which is needed to name matches on the negative strand.
+class PatternIndex:
+    def __init__(self, patterns, range_lower, range_upper,
+            pattern_wildcard=None,
+            max_wildcards=DEFAULT_MAX_WILDCARDS,
+            both_strands=False):
+        if not 0 < range_lower <= range_upper:
+            raise ValueError("Invalid range arguments.")
+        self.range_lower = range_lower
+        self.range_upper = range_upper
+        self.pattern_wildcard = pattern_wildcard
+        self.max_wildcards = max_wildcards
+        self.both_strands = both_strands
+        self.seeds = {}
+        self.pattern_lengths = {}
+
+        windows = {}
+        for name, pattern in patterns:
+            if both_strands:
+                if self.pattern_lengths.get(name, len(pattern)) != \
+                        len(pattern):
+                    raise ValueError("Patterns named " + name +
+                            " have different lengths")
+                self.pattern_lengths[name] = len(pattern)
+            for start in range(len(pattern) - range_lower + 1):
+                window_text = pattern[start : start + range_upper]
+                if window_text not in windows:
+                    windows[window_text] = set()
+                windows[window_text].add((name, start))
+
+        for window_text, entries in windows.items():
+            window = (window_text, tuple(sorted(entries)))
+            seed = window_text[:range_lower]
+            if pattern_wildcard is None:
+                seed_expansions = [seed]
+            else:
+                seed_expansions = ExpandWildcards(
+                        seed, pattern_wildcard, max_wildcards)
+            for expanded_seed in seed_expansions:
+                if both_strands:
+                    key, orientation = CanonicalSeed(expanded_seed)
+                    value = (window, orientation)
+                else:
+                    key = expanded_seed
+                    value = window
+                if key not in self.seeds:
+                    self.seeds[key] = []
+                self.seeds[key].append(value)
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def __str__(self):
+        return "<PatternIndex with " + str(len(self)) + " seeds>"
+
+    def __repr__(self):
+        return str(self)
+
+    def __contains__(self, seed):
+        return seed in self.seeds
+
+    # Returns the sorted list of the pattern names matches may carry.
+    def MatchNames(self):
+        names = set()
+        for windows in self.seeds.values():
+            for window in windows:
+                if self.both_strands:
+                    window = window[0]
+                for name, start in window[1]:
+                    names.add(name)
+        if self.both_strands:
+            names.update([VirtualPatternName(name, length)
+                for name, length in self.pattern_lengths.items()])
+        return sorted(names)
+
+    # Returns the list of windows stored under seed, or an empty
+    # tuple if there are none. If both_strands is set, seed should be
+    # canonical, and a list of (window, orientation) pairs is
+    # returned.
+    def lookup(self, seed):
+        return self.seeds.get(seed, ())
+
+
+# Returns a pair (canonical_seed, orientation). canonical_seed is the
+# lesser of seed and its inverse complement; orientation is 1 if that
+# is seed itself, -1 if it is the inverse complement, and 0 if the
+# two are equal.
+def CanonicalSeed(seed):
+    inverse_complement = InverseComplement(seed)
+    if seed < inverse_complement:
+        return (seed, 1)
+    elif seed > inverse_complement:
+        return (inverse_complement, -1)
+    return (seed, 0)
+
+
+# Translation tables used to encode nucleotide strings as integers
+# holding two bits per base. Characters other than A, C, G and T
+# are encoded as A, and are recorded separately in an "invalid" mask
+# so that they never compare equal to anything.
+_BASE_DIGITS = {ord(c): '0' for c in map(chr, range(128))}
+_BASE_DIGITS.update({ord('A'): '0', ord('C'): '1', ord('G'): '2',
+    ord('T'): '3'})
+_INVALID_DIGITS = {ord(c): '1' for c in map(chr, range(128))}
+_INVALID_DIGITS.update({ord(c): '0' for c in "ACGT"})
+
+
+# Returns a pair (code, invalid) of integers encoding the nucleotide
+# string s. Position i of s is held in bits 2 * (len(s) - 1 - i) and
+# 2 * (len(s) - 1 - i) + 1 of code. The low bit of the same pair is
+# set in invalid iff s[i] is not one of A, C, G or T.
+def EncodeBases(s):
+    if not s:
+        return (0, 0)
+    return (int(s.translate(_BASE_DIGITS), 4),
+            int(s.translate(_INVALID_DIGITS), 4))
+
+
+# Compares two nucleotide strings of the same length bit-parallelly.
+# Returns a string of '0's and '1's holding a '1' at each position
+# where the strings differ. Positions holding characters other than
+# A, C, G and T always count as differing.
+def MismatchString(s, t, s_code=None):
+    if s_code is None:
+        s_code = EncodeBases(s)
+    t_code = EncodeBases(t)
+    x = s_code[0] ^ t_code[0]
+    mask = ((x | (x >> 1)) & _LowBitsMask(len(s))) | \
+            s_code[1] | t_code[1]
+    return format(mask, "0" + str(2 * len(s)) + "b")[1::2]
+
+
+_low_bits_masks = {}
+
+# Returns an integer with the low bit of each of n pairs of bits set.
+def _LowBitsMask(n):
+    if n not in _low_bits_masks:
+        _low_bits_masks[n] = int("01" * n, 2) if n else 0
+    return _low_bits_masks[n]
+
+
+# Shortest seed a MismatchIndex may use.
+MIN_SEED_LENGTH = 8
+
+
+# Holds the exact seeds used to find matches with up to a given
+# number of mismatches by pigeonhole seeding. The first range_lower
+# bases of a fragment which matches the haystack with at most k =
+# mismatches mismatches are cut into k + s blocks of
+# range_lower // (k + s) bases, at least s of which match exactly.
+# Each choice of s blocks makes a spaced seed, the "shape" of which
+# lists the offsets of its blocks; shapes which are translations of
+# one another are kept once. With s = 1 there is a single shape, a
+# plain seed of range_lower // (k + 1) bases.
+#
+# The seeds of every shape at every offset of the patterns are
+# indexed, so that at least one seed of a matching fragment is found
+# in the haystack, and candidate alignments are then verified with
+# MismatchString().
+#
+# Shorter seeds hit more of the haystack by chance: a seed of 5 bases
+# is found at nearly every position of a genome, so that every
+# position has to be verified. s is therefore the smallest number of
+# exact blocks which weigh at least MIN_SEED_LENGTH bases together:
+# with the usual range_lower of 16, one mismatch takes a plain seed of
+# 8 bases, and two mismatches take three shapes of two blocks of 4
+# bases. seed_length is the weight of the seeds.
+#
+# Patterns with identical sequences are stored once. texts[i] holds
+# the i-th distinct pattern sequence, codes[i] its EncodeBases()
+# value and names[i] the sorted names of the patterns having that
+# sequence. Each value in the seeds dictionary is a list of
+# (text id, offset) pairs, where offset is the position of the first
+# block of the seed in the text.
+class MismatchIndex:
+    def __init__(self, patterns, range_lower, range_upper, mismatches):
+        if not 0 < range_lower <= range_upper:
+            raise ValueError("Invalid range arguments.")
+        if not 0 <= mismatches < range_lower:
+            raise ValueError("Invalid number of mismatches.")
+        self.range_lower = range_lower
+        self.range_upper = range_upper
+        self.mismatches = mismatches
+
+        exact_blocks = 1
+        while (range_lower // (mismatches + exact_blocks)) * \
+                exact_blocks < MIN_SEED_LENGTH:
+            exact_blocks += 1
+            if mismatches + exact_blocks > range_lower:
+                raise ValueError("Too many mismatches: seeds of fewer "
+                        "than " + str(MIN_SEED_LENGTH) + " bases would "
+                        "hit most of the haystack.")
+        block_length = range_lower // (mismatches + exact_blocks)
+        self.seed_length = block_length * exact_blocks
+        # The offsets of the blocks of each shape, the first being 0.
+        self.shapes = sorted(set(
+            tuple(block_length * (block - blocks[0]) for block in blocks)
+            for blocks in itertools.combinations(
+                range(mismatches + exact_blocks), exact_blocks)))
+        self.block_length = block_length
+
+        self._AddTexts(patterns, lambda text: (
+            (offset, seed)
+            for offset in range(len(text) - self.seed_length + 1)
+            for seed in self.SeedsAt(text, offset)))
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def __str__(self):
+        return "<MismatchIndex with " + str(len(self)) + " seeds>"
+
+    def __repr__(self):
+        return str(self)
+
+    # Returns the sorted list of the pattern names matches may carry.
+    def MatchNames(self):
+        return sorted(set(name for names in self.names for name in names))
+
+    # Returns the list of (text id, offset) pairs stored under seed,
+    # or an empty tuple if there are none.
+    def lookup(self, seed):
+        return self.seeds.get(seed, ())
+
+    # Returns the seeds of each shape whose first block starts at
+    # position j of text, and which fit in text. With several shapes,
+    # each seed is preceded by the number of its shape.
+    def SeedsAt(self, text, j):
+        if len(self.shapes) == 1:
+            seed = text[j : j + self.seed_length]
+            return [seed] if len(seed) == self.seed_length else []
+        seeds = []
+        for shape_id, shape in enumerate(self.shapes):
+            if j + shape[-1] + self.block_length > len(text):
+                continue
+            seeds.append(chr(ord("0") + shape_id) + "".join(
+                text[j + offset : j + offset + self.block_length]
+                for offset in shape))
+        return seeds
+
+    # Stores the distinct pattern sequences, and the seeds which
+    # seeds(text) yields for each, as (offset, seed) pairs.
+    def _AddTexts(self, patterns, seeds):
+        names_by_text = {}
+        for name, pattern in patterns:
+            if pattern not in names_by_text:
+                names_by_text[pattern] = set()
+            names_by_text[pattern].add(name)
+
+        self.texts = []
+        self.codes = []
+        self.names = []
+        self.seeds = {}
+        for text_id, (text, names) in enumerate(names_by_text.items()):
+            self.texts.append(text)
+            self.codes.append(EncodeBases(text))
+            self.names.append(sorted(names))
+            for offset, seed in seeds(text):
+                if seed not in self.seeds:
+                    self.seeds[seed] = []
+                self.seeds[seed].append((text_id, offset))
+
+        self.max_text_length = max(map(len, self.texts), default=0)
+
+
+# By default minimizers are this long.
+DEFAULT_MINIMIZER_LENGTH = 12
+
+
+# Yields a pair (position, k-mer) for each (w,k)-minimizer of s: the
+# k-mer whose hash is least among w consecutive k-mers of s, the
+# leftmost one on ties. A k-mer which is the minimizer of several
+# windows is yielded once, and the k-mers are yielded in order of
+# position. Strings shorter than a window have none.
+#
+# The hash depends only on the k-mer, so that two strings sharing a
+# window of w k-mers share its minimizer.
+def Minimizers(s, k, w):
+    data = s.encode()
+    window = collections.deque()
+    hashes = collections.deque()
+    last = -1
+    for i in range(len(data) - k + 1):
+        h = zlib.crc32(data[i : i + k])
+        while hashes and hashes[-1] > h:
+            window.pop()
+            hashes.pop()
+        window.append(i)
+        hashes.append(h)
+        if window[0] <= i - w:
+            window.popleft()
+            hashes.popleft()
+        if i >= w - 1 and window[0] != last:
+            last = window[0]
+            yield last, s[last : last + k]
+
+
+# Holds the (w,k)-minimizers of the patterns, to find their exact
+# matches with a smaller index than PatternIndex, at the cost of more
+# verification.
+#
+# Any window of w consecutive k-mers (w + k - 1 bases) of a pattern
+# has one of them as its minimizer (see Minimizers()). A fragment of
+# at least range_lower bases contains such a window if
+# w + k - 1 <= range_lower, and the window holds the same minimizer
+# at the same place in the haystack. Only the minimizers of the
+# patterns are therefore indexed, and each minimizer of the haystack
+# found in the index gives a candidate alignment of a whole pattern,
+# which is verified as MismatchIndex alignments are, with no
+# mismatches allowed. About 2 / (w + 1) of the k-mers of the patterns
+# are minimizers, so a larger w makes a smaller index.
+#
+# The attributes are those of MismatchIndex, with mismatches set to
+# 0, seed_length to k and window to w.
+class MinimizerIndex(MismatchIndex):
+    def __init__(self, patterns, range_lower, range_upper,
+            minimizer_length=DEFAULT_MINIMIZER_LENGTH, window=None):
+        if not 0 < range_lower <= range_upper:
+            raise ValueError("Invalid range arguments.")
+        if window is None:
+            window = range_lower - minimizer_length + 1
+        if minimizer_length < 1 or window < 1 or \
+                window + minimizer_length - 1 > range_lower:
+            raise ValueError("Invalid minimizer arguments: a window of "
+                    "minimizers must fit in range_lower bases.")
+        self.range_lower = range_lower
+        self.range_upper = range_upper
+        self.mismatches = 0
+        self.seed_length = minimizer_length
+        self.window = window
+
+        self._AddTexts(patterns,
+                lambda text: Minimizers(text, minimizer_length, window))
+
+    def __str__(self):
+        return "<MinimizerIndex with " + str(len(self)) + " minimizers>"
@@ -10,13 +10,69 @@
 #        data/hg19/tRNAspace.Spliced.Sequences.MINTmap_v1.fa
 #
 # By default the script assumes a .ss file is being passed.
+#
+# If --single-strand is given, the virtual (inverse complement)
+# records are left out. The resulting file is meant to be searched
+# with scanner.py --both-strands, which finds the matches on the
+# negative strand itself.
+#
+# The records are written to stdout, or with --output <file>, to
+# <file> (see output.py).
 
 import sys
+import output
 import trnapy
 from trnapy import FileFormat
 
+
+# Returns the line of the .patterns file for trna, whose CCA has been
+# added.
+def PatternRecord(trna):
+    record_to_print = ""
+    if trna.is_virtual:
+        record_to_print += "!"
+    #record_to_print += trna.sign
+    if not trna.is_virtual:
+        if trna.expanded:
+            record_to_print += "1-"
+        else:
+            record_to_print += "0-"
+        record_to_print += str(len(trna) - 4)
+    else:
+        record_to_print += "3-"
+        if trna.expanded:
+            record_to_print += str(len(trna) - 2)
+        else:
+            record_to_print += str(len(trna) - 1)
+
+    record_to_print += " " + trna.sequence()
+    return record_to_print
+
+
+# Yields the lines of the .patterns file for the tRNAs, and unless
+# single_strand is set, for their inverse complements.
+def PatternRecords(trna_records, single_strand=False):
+    for trna in trna_records:
+        yield PatternRecord(trna)
+        if not single_strand:
+            yield PatternRecord(trna.inverse_complement())
+
+
 if __name__ == "__main__":
     usage_message = ".ss file or .fa must be provided"
+
+    single_strand = "--single-strand" in sys.argv
+    if single_strand:
+        sys.argv.remove("--single-strand")
+
+    output_path = None
+    if "--output" in sys.argv:
+        i = sys.argv.index("--output")
+        if i + 1 >= len(sys.argv):
+            raise Exception(usage_message)
+        output_path = sys.argv[i + 1]
+        del sys.argv[i : i + 2]
+
     if len(sys.argv) < 2:
         raise Exception(usage_message)
 
@@ -43,28 +99,6 @@ if __name__ == "__main__":
     trna_records.AddCCAToAll()
     trna_records.ExpandAll()
 
-    def PrintPatternRecord(trna):
-        record_to_print = ""
-        if trna.is_virtual:
-            record_to_print += "!"
-        #record_to_print += trna.sign
-        if not trna.is_virtual:
-            if trna.expanded:
-                record_to_print += "1-"
-            else:
-                record_to_print += "0-"
-            record_to_print += str(len(trna) - 4)
-        else:
-            record_to_print += "3-"
-            if trna.expanded:
-                record_to_print += str(len(trna) - 2)
-            else:
-                record_to_print += str(len(trna) - 1)
-
-        record_to_print += " " + trna.sequence()
-        print(record_to_print)
-
-    for trna in trna_records:
-        PrintPatternRecord(trna)
-        PrintPatternRecord(trna.inverse_complement())
+    with output.OutputWriter(output_path) as output_file:
+        output_file.WriteLines(PatternRecords(trna_records, single_strand))
 
@@ -0,0 +1,450 @@
+#!/usr/bin/python3
+# Runs the scanning and postprocessing stages of the pipeline (see
+# rn6_run_all.sh) concurrently, and prints the lookup table, as
+# reduced_postprocess.py would.
+#
+# A scanner process (find_patterns, or scanner.py with --scanner=python)
+# is started for each haystack file, with at most --jobs of them
+# running at once. Their output is read as it is produced and passed,
+# in batches, through a bounded queue to --workers containment worker
+# processes, so that postprocessing overlaps with scanning. When the
+# queue is full, the scanners' output is no longer read, which in turn
+# holds the scanners back until the workers catch up.
+#
+# Progress is reported on stderr every --progress-interval seconds.
+#
+# With --shared-index (and --scanner=python), the pattern index is
+# built once, in shared memory, and attached to by every scanner
+# rather than being rebuilt by each of them.
+#
+# If --matches-dir is given, the output of each scanner is also saved
+# there as <chromosome>.matches, as in rn6_run_all.sh.
+#
+# With --scanner=python, a haystack file may be a gzip-compressed
+# and/or multi-record FASTA file, such as a whole genome; the matches
+# of each record are classified against the chromosome it names (see
+# scanner.py). Its .matches file is then named after the haystack
+# file, and holds the matches of every record.
+#
+# Sample usage:
+#
+#   python3 pipeline.py -s \
+#       data/rn6/rn6-tRNAs-confidence-set.ss \
+#       gen/rn6/rn6-tRNAs.names \
+#       gen/rn6/rn6-tRNAs.patterns \
+#       gen/rn6/chr/*.fa.mint \
+#       --jobs=8 \
+#       >gen/rn6/rn6-tRNAs.lookup
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import sys
+import time
+
+import flat_index
+import haystack
+import pattern_index
+import reduced_postprocess
+import scanner
+import trnapy
+from trnapy import FileFormat
+
+
+# Path of the find_patterns executable.
+FIND_PATTERNS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        "find_patterns", "build", "find_patterns")
+
+# Path of the Python scanning engine.
+SCANNER_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        "scanner.py")
+
+# Number of bytes read from a scanner's output at a time.
+READ_SIZE = 1 << 16
+
+# Number of match lines passed to a containment worker at a time.
+DEFAULT_BATCH_SIZE = 1 << 14
+
+# Number of batches the queue between the scanners and the
+# containment workers holds before the scanners are held back.
+DEFAULT_QUEUE_SIZE = 16
+
+
+# Holds the counters reported while the pipeline runs.
+class Progress:
+    def __init__(self, total_scans):
+        self.total_scans = total_scans
+        self.running_scans = 0
+        self.finished_scans = 0
+        self.lines_read = 0
+        self.lines_classified = 0
+        self.start_time = time.monotonic()
+
+    def __str__(self):
+        elapsed = time.monotonic() - self.start_time
+        rate = self.lines_classified / elapsed if elapsed > 0 else 0
+        return "scans: {}/{} done, {} running; matches: {} read, " \
+                "{} classified ({:.0f}/s); {:.1f}s".format(
+                        self.finished_scans, self.total_scans,
+                        self.running_scans, self.lines_read,
+                        self.lines_classified, rate, elapsed)
+
+    def __repr__(self):
+        return str(self)
+
+
+# The tRNA spaces used by the containment workers, keyed as in
+# RunScans(). They are set once in each worker process by
+# _InitWorker(), rather than sent with every batch.
+_worker_trna_spaces = None
+
+
+def _InitWorker(trna_spaces):
+    global _worker_trna_spaces
+    _worker_trna_spaces = trna_spaces
+
+
+# Classifies a batch of match lines from the haystack of chromosome in
+# a containment worker, against the tRNA space with the given key.
+# Returns the fragments found outside tRNA space without mismatches,
+# and a dictionary mapping the fragments found outside tRNA space to
+# the fewest mismatches they were found with.
+def _ClassifyBatch(key, chromosome, lines, graded):
+    outside_trna_space = set()
+    closest_outside_trna_space = {} if graded else None
+    reduced_postprocess.ClassifyMatches(_worker_trna_spaces[key],
+            chromosome, lines, outside_trna_space,
+            closest_outside_trna_space)
+    return outside_trna_space, closest_outside_trna_space
+
+
+# Returns the command line running the chosen scanner on haystack_path.
+def ScannerCommand(args, haystack_path):
+    if args.scanner == "python":
+        command = [sys.executable, SCANNER_PY]
+    else:
+        command = [FIND_PATTERNS]
+    command += [args.patterns_file, haystack_path,
+            "--range-lower=" + str(args.range_lower),
+            "--range-upper=" + str(args.range_upper)] + args.scanner_arg
+    if args.shared_index_name is not None:
+        command.append("--shared-index=" + args.shared_index_name)
+    return command
+
+
+# Runs a scanner on haystack_path once the semaphore allows it, and
+# puts batches of (key, chromosome, lines) on the queue as they are
+# read.
+async def RunScan(args, key, haystack_path, semaphore, queue, progress):
+    async with semaphore:
+        process = await asyncio.create_subprocess_exec(
+                *ScannerCommand(args, haystack_path),
+                stdout=asyncio.subprocess.PIPE)
+        progress.running_scans += 1
+
+        matches_file = None
+        chromosome = None
+        if args.matches_dir is not None:
+            chromosome = reduced_postprocess.ParseMatchesHeader(
+                    haystack_path)
+            matches_file = open(os.path.join(args.matches_dir,
+                chromosome + ".matches"), "w")
+
+        try:
+            header = None
+            pending = ""
+            batch = []
+            while True:
+                data = await process.stdout.read(READ_SIZE)
+                if not data:
+                    break
+                text = data.decode()
+                if matches_file is not None:
+                    matches_file.write(text)
+                buffer = pending + text
+                lines = buffer.split("\n")
+                pending = lines.pop()
+                if header is None and lines:
+                    header = lines.pop(0)
+                    chromosome = reduced_postprocess.ParseMatchesHeader(
+                            header)
+                progress.lines_read += len(lines)
+                if ">" not in buffer:
+                    batch.extend(lines)
+                else:
+                    # The matches of each record of a FASTA haystack
+                    # follow a header naming its chromosome.
+                    for line in lines:
+                        if line.startswith(">"):
+                            if batch:
+                                await queue.put((key, chromosome, batch))
+                                batch = []
+                            chromosome = \
+                                    reduced_postprocess.ParseMatchesHeader(
+                                            line)
+                        else:
+                            batch.append(line)
+                if len(batch) >= args.batch_size:
+                    await queue.put((key, chromosome, batch))
+                    batch = []
+            if pending:
+                batch.append(pending)
+                progress.lines_read += 1
+            if batch:
+                await queue.put((key, chromosome, batch))
+
+            returncode = await process.wait()
+            if returncode != 0:
+                raise RuntimeError("Scanning " + haystack_path +
+                        " failed with exit status " + str(returncode))
+        finally:
+            if process.returncode is None:
+                process.kill()
+                # The process is only reaped once its output is read to
+                # the end.
+                await process.communicate()
+            if matches_file is not None:
+                matches_file.close()
+            progress.running_scans -= 1
+            progress.finished_scans += 1
+
+
+# Takes batches off the queue and classifies them in the process pool,
+# merging the results into the pair (outside_trna_space,
+# closest_outside_trna_space) held in results for the key of each
+# batch, until it takes off a None.
+async def RunContainmentWorker(queue, pool, graded, results, progress):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        key, chromosome, lines = item
+        outside, closest = await loop.run_in_executor(
+                pool, _ClassifyBatch, key, chromosome, lines, graded)
+        outside_trna_space, closest_outside_trna_space = results[key]
+        outside_trna_space.update(outside)
+        if graded:
+            for fragment, mismatches in closest.items():
+                if mismatches < closest_outside_trna_space.get(
+                        fragment, mismatches + 1):
+                    closest_outside_trna_space[fragment] = mismatches
+        progress.lines_classified += len(lines)
+
+
+# Puts a None on the queue for each of worker_count containment
+# workers, which stops them once the batches before it are classified.
+async def StopContainmentWorkers(queue, worker_count):
+    for _ in range(worker_count):
+        await queue.put(None)
+
+
+# Waits until every task of tasks is done. As soon as one of them, or
+# one of the tasks of watched, fails, raises its exception instead:
+# a containment worker which fails no longer takes batches off the
+# queue, and the scans would wait forever to put theirs on it.
+async def WaitForTasks(tasks, watched=()):
+    pending = set(tasks)
+    watched = set(watched)
+    while pending:
+        done, _ = await asyncio.wait(pending | watched,
+                return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        pending -= done
+        watched -= done
+
+
+async def ReportProgress(progress, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(progress, file=sys.stderr)
+
+
+# Runs the scans and the containment workers. haystack_scans is a
+# list of (scan_args, key, haystack_path) triples: scan_args holds the
+# arguments ScannerCommand() and RunScan() use for the scan, and key
+# selects the tRNA space in trna_spaces which its matches are
+# classified against. At most args.jobs scans run at once, and
+# args.workers containment workers are shared by all of them.
+#
+# Returns a dictionary mapping each key of trna_spaces to the pair
+# (outside_trna_space, closest_outside_trna_space) of its scans, the
+# latter being None unless args.graded is set.
+async def RunScans(args, haystack_scans, trna_spaces):
+    progress = Progress(len(haystack_scans))
+    semaphore = asyncio.Semaphore(args.jobs)
+    queue = asyncio.Queue(maxsize=args.queue_size)
+    results = {key: (set(), {} if args.graded else None)
+            for key in trna_spaces}
+
+    with concurrent.futures.ProcessPoolExecutor(args.workers,
+            initializer=_InitWorker, initargs=(trna_spaces,)) as pool:
+        workers = [asyncio.ensure_future(RunContainmentWorker(queue, pool,
+            args.graded, results, progress))
+            for _ in range(args.workers)]
+        scans = [asyncio.ensure_future(RunScan(scan_args, key,
+            haystack_path, semaphore, queue, progress))
+            for scan_args, key, haystack_path in haystack_scans]
+        reporter = asyncio.ensure_future(
+                ReportProgress(progress, args.progress_interval))
+        tasks = workers + scans + [reporter]
+        try:
+            await WaitForTasks(scans, workers)
+            stopper = asyncio.ensure_future(StopContainmentWorkers(queue,
+                len(workers)))
+            tasks.append(stopper)
+            await WaitForTasks([stopper] + workers)
+        finally:
+            # If a scan or a worker failed, the other scans and the
+            # workers are stopped too.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(progress, file=sys.stderr)
+    return results
+
+
+# Runs the scans of args.haystack_files and the containment workers.
+# Returns the pair (outside_trna_space, closest_outside_trna_space),
+# the latter being None unless args.graded is set.
+async def RunPipeline(args, trna_space):
+    results = await RunScans(args, [(args, None, haystack_path)
+        for haystack_path in args.haystack_files], {None: trna_space})
+    return results[None]
+
+
+# Adds the arguments controlling the scans and the containment workers
+# to parser.
+def AddScanArguments(parser):
+    parser.add_argument("--scanner", choices=["find_patterns", "python"],
+            default="find_patterns")
+    parser.add_argument("--scanner-arg", action="append", default=[],
+            help="An extra argument passed on to the scanner. May be "
+            "given more than once.")
+    parser.add_argument("--range-lower", type=int, default=16)
+    parser.add_argument("--range-upper", type=int, default=50)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--workers", type=int,
+            default=max(1, os.cpu_count() // 2))
+    parser.add_argument("--batch-size", type=int,
+            default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int,
+            default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--progress-interval", type=float, default=10)
+    parser.add_argument("--graded", action="store_true")
+    parser.add_argument("--shared-index", action="store_true",
+            help="Builds the pattern index once, in shared memory, for "
+            "all the scanners to use. Requires --scanner=python.")
+
+
+# Checks the arguments added by AddScanArguments(), and exits with an
+# error message from parser if they are invalid.
+def CheckScanArguments(parser, args):
+    if args.jobs < 1 or args.workers < 1 or args.batch_size < 1 or \
+            args.queue_size < 1:
+        parser.error("--jobs, --workers, --batch-size and --queue-size "
+                "must be positive")
+    if args.shared_index:
+        if args.scanner != "python":
+            parser.error("--shared-index requires --scanner=python")
+        scanner_args = ScannerArguments(args, "")
+        if scanner_args.mismatches > 0:
+            parser.error("--shared-index cannot be used with --mismatches")
+        if scanner_args.minimizer_window is not None:
+            parser.error("--shared-index cannot be used with "
+                    "--minimizer-window")
+    if args.scanner == "python":
+        scanner_args = ScannerArguments(args, "")
+        if scanner_args.output is not None or \
+                scanner_args.checkpoint_interval is not None:
+            parser.error("the scanners write to the pipeline, and cannot "
+                    "be given --output or --checkpoint-interval")
+        suppress_header = scanner_args.suppress_header
+    else:
+        suppress_header = "--suppress-header" in args.scanner_arg
+    # RunScan() takes the chromosome from the header the scanner
+    # prints first.
+    if suppress_header:
+        parser.error("--suppress-header cannot be passed to the scanners")
+
+
+# Returns the arguments scanner.py is run with on patterns_path, as
+# parsed by scanner.py.
+def ScannerArguments(args, patterns_path):
+    return scanner.ArgumentParser().parse_args([patterns_path,
+        "--range-lower=" + str(args.range_lower),
+        "--range-upper=" + str(args.range_upper)] + args.scanner_arg)
+
+
+# Exits with an error message from parser if one of the haystack files
+# at haystack_paths cannot be read by the chosen scanner:
+# find_patterns only reads preprocessed, uncompressed haystacks.
+def CheckHaystackFiles(parser, args, haystack_paths):
+    if args.scanner == "python":
+        return
+    for haystack_path in haystack_paths:
+        if haystack_path.endswith(".gz") or haystack.IsFasta(haystack_path):
+            parser.error(haystack_path + ": FASTA and gzip-compressed "
+                    "haystacks require --scanner=python")
+
+
+# Builds the pattern index of the patterns file at patterns_path in
+# shared memory, as scanner.py would build it, and returns the shared
+# memory block holding it.
+def CreateSharedIndex(args, patterns_path):
+    with open(patterns_path, 'r') as patterns_file:
+        patterns = pattern_index.ReadPatternsFile(patterns_file)
+    return flat_index.CreateSharedPatternIndex(scanner.MakePatternIndex(
+        ScannerArguments(args, patterns_path), patterns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scans the haystack "
+            "files and prints the lookup table, overlapping the "
+            "postprocessing with the scans.")
+    format_group = parser.add_mutually_exclusive_group()
+    format_group.add_argument("-f", dest="file_format",
+            action="store_const", const=FileFormat.FA)
+    format_group.add_argument("-s", dest="file_format",
+            action="store_const", const=FileFormat.SS)
+    format_group.add_argument("-t", dest="file_format",
+            action="store_const", const=FileFormat.TRNA)
+    parser.add_argument("records_file")
+    parser.add_argument("names_file")
+    parser.add_argument("patterns_file")
+    parser.add_argument("haystack_files", nargs="+")
+    parser.add_argument("--matches-dir")
+    AddScanArguments(parser)
+    args = parser.parse_args()
+    CheckScanArguments(parser, args)
+    CheckHaystackFiles(parser, args, args.haystack_files)
+
+    shared_index = None
+    args.shared_index_name = None
+    if args.shared_index:
+        shared_index = CreateSharedIndex(args, args.patterns_file)
+        args.shared_index_name = shared_index.name
+
+    with open(args.records_file, 'r') as records_file:
+        trna_records = trnapy.ReadTRNARecords(records_file,
+                args.file_format)
+
+    trna_records.AddCCAToAll()
+    trna_records.ExpandAll()
+    trna_space = trnapy.ConstructTRNASpace(trna_records)
+
+    try:
+        outside_trna_space, closest_outside_trna_space = asyncio.run(
+                RunPipeline(args, trna_space))
+    finally:
+        if shared_index is not None:
+            shared_index.close()
+            shared_index.unlink()
+
+    with open(args.names_file, 'r') as names_file:
+        reduced_postprocess.WriteLookupTable(names_file, sys.stdout,
+                outside_trna_space, closest_outside_trna_space)
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import tempfile
+
+import pipeline
+import reduced_postprocess
+import testing
+
+ut = testing.UnitTestCollection()
+
+patterns_file = "0-71 GCCCGGATAGCTCAGTCGGTAGAGCATCAGACTTTTAATCTGAGGGTCCCA\n" \
+        "!3-74 TGGGACCCTCAGATTAAAAGTCTGATGCTCTACCGACTGAGCTATCCGGGC\n"
+
+pattern = patterns_file.split()[1]
+
+# The pattern lies in tRNA space on chr1, and a part of it, with a
+# mismatch, outside tRNA space on chr2.
+haystacks = {
+        "chr1.fa.mint": "ACGT" * 25 + pattern + "ACGT" * 25,
+        "chr2.fa.mint": "TTGA" * 20 + pattern[5:20] + "T" +
+            pattern[21:45] + "TTGA" * 20 + pattern[30:] + "TTGA" * 5,
+}
+
+trna_space = {("chr1", "+"): [(100, 100 + len(pattern) - 1)]}
+
+
+# Returns the arguments of a pipeline run with the python scanner on
+# the patterns file at patterns_path.
+def Args(patterns_path, **kwargs):
+    parser = argparse.ArgumentParser()
+    pipeline.AddScanArguments(parser)
+    args = parser.parse_args(["--scanner=python", "--jobs=2",
+        "--workers=2", "--batch-size=4", "--queue-size=2",
+        "--progress-interval=3600"])
+    args.patterns_file = patterns_path
+    args.matches_dir = None
+    args.shared_index_name = None
+    for name, value in kwargs.items():
+        setattr(args, name, value)
+    return args
+
+
+# Writes the patterns file and the haystacks to directory, and returns
+# the path of the patterns file and the list of those of the
+# haystacks.
+def WriteInputs(directory):
+    patterns_path = os.path.join(directory, "test.patterns")
+    with open(patterns_path, "w") as output_file:
+        output_file.write(patterns_file)
+    haystack_paths = []
+    for name, text in sorted(haystacks.items()):
+        haystack_paths.append(os.path.join(directory, name))
+        with open(haystack_paths[-1], "w") as output_file:
+            output_file.write(text)
+    return patterns_path, haystack_paths
+
+
+# Returns what RunPipeline() should return for the haystacks, found by
+# running the scanner on each of them on its own and classifying its
+# output as reduced_postprocess.py does.
+def ExpectedResults(args, haystack_paths):
+    outside_trna_space = set()
+    closest_outside_trna_space = {} if args.graded else None
+    for haystack_path in haystack_paths:
+        output = subprocess.run(pipeline.ScannerCommand(args,
+            haystack_path), stdout=subprocess.PIPE, check=True).stdout
+        for chromosome, lines in reduced_postprocess.ReadMatchesRecords(
+                io.StringIO(output.decode())):
+            reduced_postprocess.ClassifyMatches(trna_space, chromosome,
+                    lines, outside_trna_space, closest_outside_trna_space)
+    return outside_trna_space, closest_outside_trna_space
+
+
+def RunPipeline(args, haystack_paths):
+    return asyncio.run(asyncio.wait_for(pipeline.RunScans(args,
+        [(args, None, haystack_path) for haystack_path in haystack_paths],
+        {None: trna_space}), 300))[None]
+
+
+@ut()
+def RunScans_test():
+    with tempfile.TemporaryDirectory() as directory:
+        patterns_path, haystack_paths = WriteInputs(directory)
+        for kwargs in [{}, {"graded": True,
+                "scanner_arg": ["--mismatches=1"]}]:
+            args = Args(patterns_path, **kwargs)
+            expected = ExpectedResults(args, haystack_paths)
+            ut.ExpectEq(len(expected[0]) > 0, True)
+            ut.ExpectEq(RunPipeline(args, haystack_paths), expected)
+
+
+@ut()
+def RunScans_matches_dir_test():
+    with tempfile.TemporaryDirectory() as directory:
+        patterns_path, haystack_paths = WriteInputs(directory)
+        matches_dir = os.path.join(directory, "matches")
+        os.mkdir(matches_dir)
+        args = Args(patterns_path, matches_dir=matches_dir)
+        RunPipeline(args, haystack_paths)
+        ut.ExpectEq(sorted(os.listdir(matches_dir)),
+                ["chr1.matches", "chr2.matches"])
+        with open(os.path.join(matches_dir, "chr2.matches"), "r") as \
+                matches_file:
+            ut.ExpectEq(matches_file.read().encode(),
+                    subprocess.run(pipeline.ScannerCommand(args,
+                        haystack_paths[1]), stdout=subprocess.PIPE,
+                        check=True).stdout)
+
+
+@ut()
+def RunScans_shared_index_test():
+    with tempfile.TemporaryDirectory() as directory:
+        patterns_path, haystack_paths = WriteInputs(directory)
+        args = Args(patterns_path, shared_index=True)
+        expected = ExpectedResults(args, haystack_paths)
+        shared_index = pipeline.CreateSharedIndex(args, patterns_path)
+        try:
+            args.shared_index_name = shared_index.name
+            ut.ExpectEq(RunPipeline(args, haystack_paths), expected)
+        finally:
+            shared_index.close()
+            shared_index.unlink()
+
+
+@ut()
+def RunScans_failure_test():
+    with tempfile.TemporaryDirectory() as directory:
+        patterns_path, haystack_paths = WriteInputs(directory)
+        # A scanner which fails stops the pipeline.
+        args = Args(os.path.join(directory, "missing.patterns"))
+        try:
+            RunPipeline(args, haystack_paths)
+            ut.ExpectEq("missing patterns file", "rejected")
+        except RuntimeError:
+            pass
+
+        # So does a containment worker which fails, here for want of
+        # the tRNA space of the scans, rather than hanging.
+        args = Args(patterns_path)
+        try:
+            asyncio.run(asyncio.wait_for(pipeline.RunScans(args,
+                [(args, "chrX", haystack_path)
+                    for haystack_path in haystack_paths],
+                {None: trna_space}), 300))
+            ut.ExpectEq("missing tRNA space", "rejected")
+        except KeyError:
+            pass
+
+
+if __name__ == "__main__":
+    ut.RunTests()
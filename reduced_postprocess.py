@@ -10,7 +10,9 @@
 #           <position in trna> [!]<original indices in trna>
 #
 #   In addition, the file should have a header indicating
-#   the name of the haystack file.
+#   the name of the haystack file. A .matches file produced from a
+#   FASTA haystack instead has a header line ><record name> before
+#   the matches of each record, which names the chromosome.
 #
 # For each <fragment> <name> line in the .names file, we 
 # print the following line.
@@ -19,26 +21,61 @@
 #
 # If the fragment is exclusive to tRNA space, the fragment
 # is followed by a 'Y'. Otherwise it is followed by an 'N'.
+#
+# Matches carrying an m=<count> field (see scanner.py --mismatches)
+# only count towards the Y/N column if they have no mismatches. If
+# the --graded switch is given, a third column is printed holding
+# the fewest mismatches with which the fragment was found outside
+# tRNA space, or a '-' if it never was.
+#
+# Fragments are identified by their line number in the .names file
+# (see trnapy.NamesFile), and the results are kept in an array
+# indexed by fragment id rather than in a set of sequences. The
+# .names file, which must be sorted, as naming.py writes it, is mapped
+# into memory, and ids are found by binary search over it rather than
+# held in a dictionary.
+#
+# The .matches files are read in large blocks cut at line ends, whose
+# columns are split out and converted in bulk (see
+# ClassifyMatchesFile()). With --jobs <n>, they are classified by a
+# pool of n processes, one file at a time per process; each returns
+# the ids of the fragments it found outside tRNA space, and their
+# union makes the table.
+#
+# The table is written to stdout, or with --output <file>, to <file>
+# (see output.py).
 
+import array
+import gc
+import multiprocessing
 import os.path
 import re
 import sys
+import output
 import trnapy
 
 from trnapy import FileFormat
 from trnapy import InverseComplement
 
 
-# Returns True iff interval is contained in the union
-# of the intervals listed in interval_list.
-def ContainedInIntervalList(interval_list, interval):
+# Returns the pair of indices (l, r) of the intervals in interval_list
+# around start, which ContainedInIntervalList() checks an interval
+# starting at start against.
+def _NeighbouringIntervals(interval_list, start):
     l = 0; r = len(interval_list) - 1
     while r - l > 1:
         m = (l + r) // 2
-        if interval_list[m][0] < interval[0]:
+        if interval_list[m][0] < start:
             l = m
-        elif interval_list[m][0] >= interval[0]:
+        elif interval_list[m][0] >= start:
             r = m
+    return l, r
+
+
+# Returns True iff interval is contained in the union
+# of the intervals listed in interval_list.
+def ContainedInIntervalList(interval_list, interval):
+    l, r = _NeighbouringIntervals(interval_list, interval[0])
 
     if interval_list[l][0] <= interval[0] < interval[1] <= \
             interval_list[l][1]:
@@ -54,6 +91,33 @@ def ContainedInIntervalList(interval_list, interval):
     return False
 
 
+# Returns the greatest end such that the interval (start, end) is
+# contained in the union of the intervals listed in interval_list, as
+# ContainedInIntervalList() decides it, or None if there is none.
+#
+# An interval (start, end) is then contained iff
+# start < end <= MaxContainedEnd(interval_list, start): each of the
+# cases checked by ContainedInIntervalList() accepts a range of ends
+# above start, and where they overlap or adjoin, their union is again
+# such a range.
+def MaxContainedEnd(interval_list, start):
+    l, r = _NeighbouringIntervals(interval_list, start)
+    left_start, left_end = interval_list[l]
+    right_start, right_end = interval_list[r]
+
+    max_end = None
+    if left_start <= start < left_end:
+        max_end = left_end
+    if right_start <= start < right_end and \
+            (max_end is None or right_end > max_end):
+        max_end = right_end
+    if left_start <= start <= left_end and right_start - 1 == left_end \
+            and right_start <= right_end and \
+            (max_end is None or right_end > max_end):
+        max_end = right_end
+    return max_end
+
+
 # Returns True iff the interval in match_dict_key is contained
 # in tRNA space, as described by trna_space.
 def ContainedInTRNASpace(trna_space, match_dict_key):
@@ -67,42 +131,452 @@ def ContainedInTRNASpace(trna_space, match_dict_key):
 
 # Parses a tRNA-unaware match line of the form:
 # GGGGTTGGGGATTTAG 31653 4 0-81
+# Any further fields (e.g. the w=<count> field printed by scanner.py
+# when wildcards are enabled) are ignored.
 # Returns the sign and the subinterval of original nucleotides
 # (i.e. CCA and possibly the leading extra nucleotide are not counted.
 # The returned value has the form
 # (fragement_sequence, sign, interval_start, interval_end), 
 def ParseTRNAUnawareMatch(match_line):
     seq, pos_in_genome, pos_in_trna, original_interval = \
-            match_line.strip().split(' ')
-    pos_in_genome = int(pos_in_genome)
-    pos_in_trna = int(pos_in_trna)
+            match_line.split()[:4]
+    return (seq,) + MatchInterval(len(seq), int(pos_in_genome),
+            int(pos_in_trna), original_interval)
 
-    if original_interval[0] == '!':
-        sign = '-'
-        original_interval = original_interval[1:]
-    else:
-        sign = '+'
-    original_interval_start, original_interval_end = \
-            original_interval.strip().split('-')
-    original_interval_start = int(original_interval_start)
-    original_interval_end = int(original_interval_end)
+
+# Returns the sign and the subinterval of original nucleotides of a
+# match of length seq_length at pos_in_genome in the haystack and at
+# pos_in_trna in the pattern named original_interval (e.g. 0-81 or
+# !3-84), as a tuple (sign, interval_start, interval_end).
+def MatchInterval(seq_length, pos_in_genome, pos_in_trna,
+        original_interval):
+    sign, original_interval_start, original_interval_end = \
+            ParseOriginalInterval(original_interval)
 
     interval_start = pos_in_genome
     start_diff = original_interval_start - pos_in_trna
     if start_diff > 0:
         interval_start += start_diff
 
-    interval_end = pos_in_genome + len(seq) - 1
-    end_diff = pos_in_trna + len(seq) - 1 - original_interval_end
+    interval_end = pos_in_genome + seq_length - 1
+    end_diff = pos_in_trna + seq_length - 1 - original_interval_end
     if end_diff > 0:
         interval_end -= end_diff
 
-    return (seq, sign, interval_start, interval_end)
+    return (sign, interval_start, interval_end)
+
+
+# Returns the sign of the pattern named original_interval (e.g. 0-81
+# or !3-84) and the bounds of its original nucleotides, as a tuple
+# (sign, start, end).
+def ParseOriginalInterval(original_interval):
+    if original_interval[0] == '!':
+        sign = '-'
+        original_interval = original_interval[1:]
+    else:
+        sign = '+'
+    start, end = original_interval.strip().split('-')
+    return (sign, int(start), int(end))
+
+
+# Returns the number of mismatches recorded in the m=<count> field
+# of a match line, or 0 if the line has no such field.
+def ParseMatchMismatches(match_line):
+    for field in match_line.split()[4:]:
+        if field.startswith("m="):
+            return int(field[2:])
+    return 0
+
+
+# Returns the name of the chromosome a .matches file was produced
+# from, given the header line of the file. The name is the part of
+# the haystack file name before the first '.'. A header of the form
+# ><record name>, which precedes the matches of each record of a
+# FASTA haystack (see scanner.py), names the chromosome directly.
+def ParseMatchesHeader(header_line):
+    if header_line.startswith(">"):
+        return header_line[1:].strip()
+    chromosome_filename = os.path.basename(header_line.strip())
+    m = re.search("^[^.]*", chromosome_filename)
+    return m.group(0)
+
+
+# Reads a .matches file, and yields a pair (chromosome, match lines)
+# for each header line of the file and the match lines following it.
+# A .matches file produced from a preprocessed haystack has a single
+# header; one produced from a FASTA haystack has one per record. The
+# match lines of a pair should be read before the next pair is taken.
+def ReadMatchesRecords(matches_file):
+    header = next(matches_file, None)
+    while header is not None:
+        next_header = []
+
+        def RecordLines():
+            for line in matches_file:
+                if line.startswith(">"):
+                    next_header.append(line)
+                    return
+                yield line
+
+        lines = RecordLines()
+        yield ParseMatchesHeader(header), lines
+        # Skips whatever the caller left unread.
+        for line in lines:
+            pass
+        header = next_header[0] if next_header else None
+
+
+# Decides which intervals of chromosome are contained in tRNA space,
+# just as ContainedInTRNASpace() does.
+#
+# Matches found at the same haystack position, one per length, are
+# checked one after the other and mostly share the start of their
+# interval. tRNA space is therefore searched once per (sign, start),
+# for the greatest end contained in it (see MaxContainedEnd()), and
+# each interval is then checked with a single comparison.
+class ChromosomeTRNASpace:
+    def __init__(self, trna_space, chromosome):
+        self.chromosome = chromosome
+        self.spaces = {sign: trna_space.get((chromosome, sign))
+                for sign in "+-"}
+        self.position = None
+        self.max_end = None
+
+    def __str__(self):
+        return "<ChromosomeTRNASpace of " + self.chromosome + ">"
+
+    def __repr__(self):
+        return str(self)
+
+    def contains(self, sign, interval_start, interval_end):
+        if (sign, interval_start) != self.position:
+            self.position = (sign, interval_start)
+            space = self.spaces[sign]
+            self.max_end = None if space is None else \
+                    MaxContainedEnd(space, interval_start)
+        return self.max_end is not None and \
+                interval_start < interval_end <= self.max_end
+
+
+# Yields a pair (fragment, mismatches) for each line of a .matches
+# file produced from the haystack of chromosome whose match lies
+# outside tRNA space. fragment is the matched sequence, read on the
+# positive strand of the tRNA.
+def MatchesOutsideTRNASpace(trna_space, chromosome, match_lines):
+    chromosome_trna_space = ChromosomeTRNASpace(trna_space, chromosome)
+    for line in match_lines:
+        seq, sign, interval_start, interval_end = \
+                ParseTRNAUnawareMatch(line)
+
+        if not chromosome_trna_space.contains(sign, interval_start,
+                interval_end):
+            fragment = seq if sign == "+" else InverseComplement(seq)
+            yield fragment, ParseMatchMismatches(line)
+
+
+# Classifies the lines of a .matches file produced from the haystack
+# of chromosome. Each fragment matched outside tRNA space without
+# mismatches is added to the set outside_trna_space. If
+# closest_outside_trna_space is not None, it maps each fragment
+# matched outside tRNA space to the fewest mismatches it was matched
+# with, and is updated accordingly.
+def ClassifyMatches(trna_space, chromosome, match_lines,
+        outside_trna_space, closest_outside_trna_space=None):
+    for fragment, mismatches in MatchesOutsideTRNASpace(
+            trna_space, chromosome, match_lines):
+        if mismatches == 0:
+            outside_trna_space.add(fragment)
+        if closest_outside_trna_space is not None and \
+                mismatches < closest_outside_trna_space.get(
+                    fragment, mismatches + 1):
+            closest_outside_trna_space[fragment] = mismatches
+
+
+# Marks the fewest mismatches with which each fragment was matched
+# outside tRNA space, as ClassifyMatches() does, but by fragment id
+# (see trnapy.NamesFile) rather than by sequence. fragments is the
+# sorted sequence of fragments, indexed by id, such as a NamesFile.
+# closest_outside_trna_space is a bytearray indexed by fragment id,
+# holding NOT_OUTSIDE_TRNA_SPACE for fragments not yet matched outside
+# tRNA space. Fragments not listed in fragments are ignored.
+def ClassifyMatchIds(trna_space, chromosome, match_lines, fragments,
+        closest_outside_trna_space):
+    for fragment, mismatches in MatchesOutsideTRNASpace(
+            trna_space, chromosome, match_lines):
+        fragment_id = trnapy.FindFragment(fragments, fragment)
+        if fragment_id is not None and \
+                mismatches < closest_outside_trna_space[fragment_id]:
+            closest_outside_trna_space[fragment_id] = mismatches
+
+
+# Value held in the bytearray passed to ClassifyMatchIds() for the
+# fragments not matched outside tRNA space.
+NOT_OUTSIDE_TRNA_SPACE = 255
+
+# Size of the blocks in which ClassifyMatchesFile() reads a .matches
+# file.
+MATCHES_CHUNK_SIZE = 1 << 22
+
+
+# Reads a .matches file opened in binary mode in blocks of about
+# chunk_size bytes, cut at line ends, and yields a pair (chromosome,
+# text) for each run of match lines of a block under the same header
+# (see ReadMatchesRecords()). text holds the lines, decoded.
+def ReadMatchesChunks(matches_file, chunk_size=MATCHES_CHUNK_SIZE):
+    chromosome = None
+    rest = b""
+    while True:
+        chunk = matches_file.read(chunk_size)
+        if chunk:
+            chunk = rest + chunk
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                rest = chunk
+                continue
+            chunk, rest = chunk[:end], chunk[end:]
+        elif rest:
+            # The last line has no line end.
+            chunk, rest = rest + b"\n", b""
+        else:
+            return
+
+        text = chunk.decode()
+        if chromosome is None:
+            header, text = text.split("\n", 1)
+            chromosome = ParseMatchesHeader(header)
+        start = 0
+        while start < len(text):
+            if text.startswith(">", start):
+                header_end = text.index("\n", start) + 1
+                chromosome = ParseMatchesHeader(text[start : header_end])
+                start = header_end
+                continue
+            header_start = text.find("\n>", start) + 1 or len(text)
+            yield chromosome, text[start : header_start]
+            start = header_start
+
+
+# Classifies the match lines in text, produced from the haystack of
+# the chromosome of chromosome_trna_space, as ClassifyMatchIds() does,
+# recording the fewest mismatches with which each fragment id was
+# matched outside tRNA space in the dict closest_outside_trna_space.
+# original_intervals caches the results of ParseOriginalInterval().
+#
+# When the lines hold the four usual fields only, the columns are
+# split out of text at once and converted with a single map() each.
+# The distinct fragments of the block are then looked up in fragments
+# in a single pass, in sorted order (see trnapy.FindSortedFragments()).
+def _ClassifyMatchText(chromosome_trna_space, text, fragments,
+        closest_outside_trna_space, original_intervals):
+    # The fewest mismatches of each fragment of the block matched
+    # outside tRNA space.
+    block_closest = {}
+    fields = text.split()
+    if "=" in text or len(fields) != 4 * text.count("\n"):
+        # The lines carry optional fields, such as m=<count>.
+        for line in text.splitlines():
+            seq, sign, interval_start, interval_end = \
+                    ParseTRNAUnawareMatch(line)
+            if chromosome_trna_space.contains(sign, interval_start,
+                    interval_end):
+                continue
+            fragment = seq if sign == "+" else InverseComplement(seq)
+            mismatches = ParseMatchMismatches(line)
+            if mismatches < block_closest.get(fragment,
+                    NOT_OUTSIDE_TRNA_SPACE):
+                block_closest[fragment] = mismatches
+    else:
+        contains = chromosome_trna_space.contains
+        for seq, pos_in_genome, pos_in_trna, original_interval in zip(
+                fields[0::4], map(int, fields[1::4]),
+                map(int, fields[2::4]), fields[3::4]):
+            interval = original_intervals.get(original_interval)
+            if interval is None:
+                interval = ParseOriginalInterval(original_interval)
+                original_intervals[original_interval] = interval
+            sign, original_start, original_end = interval
+            # As in MatchInterval().
+            interval_start = pos_in_genome
+            if original_start > pos_in_trna:
+                interval_start += original_start - pos_in_trna
+            last = len(seq) - 1
+            interval_end = pos_in_genome + last
+            end_diff = pos_in_trna + last - original_end
+            if end_diff > 0:
+                interval_end -= end_diff
+            if not contains(sign, interval_start, interval_end):
+                block_closest[seq if sign == "+" else
+                        InverseComplement(seq)] = 0
+
+    for fragment, fragment_id in trnapy.FindSortedFragments(fragments,
+            sorted(block_closest)):
+        mismatches = block_closest[fragment]
+        if mismatches < closest_outside_trna_space.get(fragment_id,
+                NOT_OUTSIDE_TRNA_SPACE):
+            closest_outside_trna_space[fragment_id] = mismatches
+
+
+# Classifies the match lines of the .matches file at matches_path, read
+# with ReadMatchesChunks(), and returns the fragments matched outside
+# tRNA space as a pair (fragment ids, mismatches): an array of their
+# ids among fragments (see trnapy.NamesFile) and the bytes of the
+# fewest mismatches each was matched with.
+def ClassifyMatchesFile(trna_space, matches_path, fragments,
+        chunk_size=MATCHES_CHUNK_SIZE):
+    closest_outside_trna_space = {}
+    original_intervals = {}
+    chromosome_trna_space = None
+    with open(matches_path, 'rb') as matches_file:
+        for chromosome, text in ReadMatchesChunks(matches_file,
+                chunk_size):
+            if chromosome_trna_space is None or \
+                    chromosome_trna_space.chromosome != chromosome:
+                chromosome_trna_space = ChromosomeTRNASpace(trna_space,
+                        chromosome)
+            _ClassifyMatchText(chromosome_trna_space, text,
+                    fragments, closest_outside_trna_space,
+                    original_intervals)
+    return (array.array("I", closest_outside_trna_space.keys()),
+            bytes(closest_outside_trna_space.values()))
+
+
+# The tRNA space and fragments used by _ClassifyMatchesFileJob().
+# Worker processes inherit them from the parent process. The
+# fragments are meant to be a trnapy.NamesFile, whose mapped file and
+# array of line offsets are only read, so that their pages stay
+# shared with the parent rather than being copied into each worker.
+_trna_space = None
+_fragments = None
+
+
+def _ClassifyMatchesFileJob(matches_path):
+    return ClassifyMatchesFile(_trna_space, matches_path, _fragments)
+
+
+# Classifies the .matches files at matches_paths, and lowers the
+# entries of the bytearray closest_outside_trna_space as
+# ClassifyMatchIds() does. With jobs > 1, the files are classified by
+# a pool of jobs processes, each returning the compact result of
+# ClassifyMatchesFile() for the union.
+def ClassifyMatchesFiles(trna_space, matches_paths, fragments,
+        closest_outside_trna_space, jobs=1):
+    global _trna_space, _fragments
+    _trna_space = trna_space
+    _fragments = fragments
+    parallel = jobs > 1 and len(matches_paths) > 1
+    pool = None
+    if parallel:
+        # Keeps the garbage collector of the workers from writing to
+        # the objects inherited from the parent, such as the tRNA
+        # space, which would copy the pages holding them.
+        gc.freeze()
+    try:
+        if parallel:
+            pool = multiprocessing.get_context("fork").Pool(
+                    min(jobs, len(matches_paths)))
+            results = pool.imap_unordered(_ClassifyMatchesFileJob,
+                    matches_paths)
+        else:
+            results = map(_ClassifyMatchesFileJob, matches_paths)
+
+        for matched_ids, mismatches in results:
+            for fragment_id, fragment_mismatches in zip(matched_ids,
+                    mismatches):
+                if fragment_mismatches < \
+                        closest_outside_trna_space[fragment_id]:
+                    closest_outside_trna_space[fragment_id] = \
+                            fragment_mismatches
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        # If a job failed, the workers still running are stopped.
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if parallel:
+            gc.unfreeze()
+        _trna_space = None
+        _fragments = None
+
+
+# Number of lines of the lookup table joined into a single write.
+LOOKUP_WRITE_SIZE = 1 << 16
+
+
+# Writes the lookup table for the fragments, listed by id, given the
+# bytearray filled by ClassifyMatchIds(). If graded is set, the graded
+# column is written as well.
+#
+# Each line is the fragment followed by one of a few precomputed
+# suffixes, chosen by the value held for it in
+# closest_outside_trna_space, so the lines are built with a single
+# map() per block.
+def WriteLookupTableFromIds(fragments, closest_outside_trna_space,
+        output_file, graded=False):
+    if graded:
+        suffixes = ["\tN\t" + str(m) + "\n" if m == 0 else
+                "\tY\t" + str(m) + "\n" for m in range(256)]
+        suffixes[NOT_OUTSIDE_TRNA_SPACE] = "\tY\t-\n"
+    else:
+        suffixes = ["\tY\n"] * 256
+        suffixes[0] = "\tN\n"
+
+    for i in range(0, len(fragments), LOOKUP_WRITE_SIZE):
+        output_file.write("".join(map(str.__add__,
+            fragments[i : i + LOOKUP_WRITE_SIZE],
+            map(suffixes.__getitem__,
+                closest_outside_trna_space[i : i + LOOKUP_WRITE_SIZE]))))
+
+
+# Prints a line of the lookup table to output_file for each line of
+# names_file. If closest_outside_trna_space is not None, the graded
+# column is printed as well. Lines are written LOOKUP_WRITE_SIZE at a
+# time.
+def WriteLookupTable(names_file, output_file, outside_trna_space,
+        closest_outside_trna_space=None):
+    lines = []
+    for line in names_file:
+        fields = line.strip().split()
+        exclusive = "N" if fields[0] in outside_trna_space else "Y"
+        if closest_outside_trna_space is not None:
+            lines.append(fields[0] + "\t" + exclusive + "\t" +
+                    str(closest_outside_trna_space.get(fields[0], "-")))
+        else:
+            lines.append(fields[0] + "\t" + exclusive)
+        if len(lines) >= LOOKUP_WRITE_SIZE:
+            output_file.write("\n".join(lines) + "\n")
+            lines = []
+    if lines:
+        output_file.write("\n".join(lines) + "\n")
 
 
 if __name__ == "__main__":
     usage_message = "Usage:\tpython3 reduced_postprocess.py [-fs] " +\
-            "[<.ss file>|<.fa file>|<.trna file>] <.names file> [.matches FILES]"
+            "[<.ss file>|<.fa file>|<.trna file>] <.names file> " +\
+            "[--graded] [--output <file>] [--jobs <n>] [.matches FILES]"
+
+    graded = "--graded" in sys.argv
+    if graded:
+        sys.argv.remove("--graded")
+
+    output_path = None
+    if "--output" in sys.argv:
+        i = sys.argv.index("--output")
+        if i + 1 >= len(sys.argv):
+            raise Exception(usage_message)
+        output_path = sys.argv[i + 1]
+        del sys.argv[i : i + 2]
+
+    jobs = 1
+    if "--jobs" in sys.argv:
+        i = sys.argv.index("--jobs")
+        if i + 1 >= len(sys.argv) or not sys.argv[i + 1].isdigit() or \
+                int(sys.argv[i + 1]) < 1:
+            raise Exception(usage_message)
+        jobs = int(sys.argv[i + 1])
+        del sys.argv[i : i + 2]
 
     if len(sys.argv) < 3:
         raise Exception(usage_message)
@@ -138,34 +612,17 @@ if __name__ == "__main__":
 
     trna_space = trnapy.ConstructTRNASpace(trna_records)
 
-    outside_trna_space = set()
-    for matches_filename in sys.argv[4:] if switch_provided else \
-            sys.argv[3:]:
-
-        with open(matches_filename, 'r') as matches_file:
-            # Parses out the chromosome name from the haystack
-            # file name.
-            chromosome_filename = next(matches_file).strip()
-            chromosome_filename = os.path.basename(chromosome_filename)
-            m = re.search("^[^.]*", chromosome_filename)
-            chromosome = m.group(0)
-
-            for line in matches_file:
-                seq, sign, interval_start, interval_end = \
-                        ParseTRNAUnawareMatch(line)
-
-                match_dict_key = (chromosome, sign,
-                    (interval_start, interval_end))
-
-                if not ContainedInTRNASpace(trna_space, match_dict_key):
-                    outside_trna_space.add(seq if sign == "+" else InverseComplement(seq))
+    fragments = trnapy.NamesFile(
+            sys.argv[3] if switch_provided else sys.argv[2])
 
-    with open(sys.argv[3] if switch_provided else sys.argv[2],
-            'r') as names_file:
-        for line in names_file:
-            fields = line.strip().split()
-            if fields[0] in outside_trna_space:
-                print(fields[0], "N", sep='\t')
-            else:
-                print(fields[0], "Y", sep='\t')
+    # Holds, for each fragment id, the fewest mismatches with which
+    # the fragment was found outside tRNA space.
+    closest_outside_trna_space = bytearray(
+            [NOT_OUTSIDE_TRNA_SPACE]) * len(fragments)
+    ClassifyMatchesFiles(trna_space,
+            sys.argv[4:] if switch_provided else sys.argv[3:],
+            fragments, closest_outside_trna_space, jobs)
 
+    with output.OutputWriter(output_path) as output_file:
+        WriteLookupTableFromIds(fragments, closest_outside_trna_space,
+                output_file, graded)
@@ -1,12 +1,128 @@
-# In theory, this should produce an identical file
-# to gen/mm10/mm10-tRNAs.lookup.
+#!/usr/bin/python3
 
-python reduced_postprocess.py \
-        data/mm10/mm10-tRNAs-confidence-set.ss \
-        gen/mm10-reduced/mm10-reduced-tRNAs.names \
-        gen/mm10-reduced/matches/*.matches \
-        >gen/mm10-reduced/mm10-reduced-tRNAs.lookup-1
+# The end-to-end check against gen/mm10/mm10-tRNAs.lookup is in
+# reduced_postprocess_test.sh.
 
-awk '{ print $1 " " $2 }' gen/mm10-reduced/mm10-reduced-tRNAs.lookup-1 \
-        >gen/mm10-reduced/mm10-reduced-tRNAs.lookup
+import gc
+import io
+import os
+import random
+import tempfile
 
+import reduced_postprocess
+import testing
+import trnapy
+
+ut = testing.UnitTestCollection()
+
+
+# Returns a random interval list as in tRNA space: sorted by start,
+# with intervals which may overlap, nest or adjoin one another.
+def RandomIntervalList(generator):
+    interval_list = []
+    for _ in range(generator.randint(1, 8)):
+        start = generator.randint(0, 40)
+        interval_list.append((start, start + generator.randint(0, 15)))
+    return sorted(interval_list)
+
+
+@ut()
+def MaxContainedEnd_test():
+    generator = random.Random(42)
+    for _ in range(500):
+        interval_list = RandomIntervalList(generator)
+        chromosome_trna_space = reduced_postprocess.ChromosomeTRNASpace(
+                {("chr1", "+"): interval_list}, "chr1")
+        for start in range(-2, 60):
+            max_end = reduced_postprocess.MaxContainedEnd(interval_list,
+                    start)
+            ends = list(range(start, 60))
+            # ChromosomeTRNASpace keeps the greatest end of the last
+            # start, so the ends are checked in no particular order.
+            generator.shuffle(ends)
+            for end in ends:
+                contained = reduced_postprocess.ContainedInIntervalList(
+                        interval_list, (start, end))
+                ut.AssertEq(max_end is not None and start < end <= max_end,
+                        contained)
+                ut.AssertEq(chromosome_trna_space.contains("+", start, end),
+                        contained)
+                ut.AssertEq(chromosome_trna_space.contains("-", start, end),
+                        False)
+
+
+@ut()
+def ReadMatchesChunks_test():
+    matches = b"gen/chr/chr4.fa.mint\nACGT 5 0 0-71\n>chr5\n" \
+            b"TTTT 1 2 0-71\nGGGG 3 2 0-71\n>chr6\nCCCC 7 0 0-71"
+    expected = [("chr4", "ACGT 5 0 0-71\n"),
+            ("chr5", "TTTT 1 2 0-71\nGGGG 3 2 0-71\n"),
+            ("chr6", "CCCC 7 0 0-71\n")]
+    for chunk_size in [1, 5, 20, 1 << 10]:
+        records = []
+        for chromosome, text in reduced_postprocess.ReadMatchesChunks(
+                io.BytesIO(matches), chunk_size):
+            if records and records[-1][0] == chromosome:
+                records[-1] = (chromosome, records[-1][1] + text)
+            else:
+                records.append((chromosome, text))
+        ut.ExpectEq(records, expected)
+
+
+@ut()
+def ClassifyMatchesFiles_test():
+    fragments = ["AAAACCCCGGGGTTTA", "ACGTACGTACGTACGT", "CCCCGGGGTTTTAAAA",
+            "GGGGTTTTAAAACCCC"]
+    trna_space = {("chr1", "+"): [(100, 171)], ("chr1", "-"): [(0, 1)]}
+    contents = [
+            # Inside tRNA space, outside it, and on the negative strand.
+            "chr1.fa.mint\nACGTACGTACGTACGT 100 0 0-71\n"
+            "AAAACCCCGGGGTTTA 500 0 0-71\n"
+            "TTTTAAAACCCCGGGG 600 3 !3-74\n",
+            # Outside tRNA space on chr2 only, and with mismatches.
+            ">chr1\nACGTACGTACGTACGT 100 0 0-71 m=1\n"
+            ">chr2\nGGGGTTTTAAAACCCC 100 0 0-71 m=2\n"
+            "GGGGTTTTAAAACCCC 120 0 0-71 m=1\n"]
+    with tempfile.TemporaryDirectory() as directory:
+        matches_paths = []
+        expected = bytearray([reduced_postprocess.NOT_OUTSIDE_TRNA_SPACE]) \
+                * len(fragments)
+        for i, content in enumerate(contents):
+            matches_paths.append(os.path.join(directory,
+                str(i) + ".matches"))
+            with open(matches_paths[-1], 'w') as matches_file:
+                matches_file.write(content)
+            for chromosome, lines in reduced_postprocess.ReadMatchesRecords(
+                    io.StringIO(content)):
+                reduced_postprocess.ClassifyMatchIds(trna_space, chromosome,
+                        lines, fragments, expected)
+        ut.ExpectEq(list(expected), [0, 255, 0, 1])
+
+        names_path = os.path.join(directory, "a.names")
+        with open(names_path, 'w') as names_file:
+            names_file.write("\n".join(fragments) + "\n")
+        names = trnapy.NamesFile(names_path)
+        for jobs in [1, 2]:
+            closest = bytearray(
+                    [reduced_postprocess.NOT_OUTSIDE_TRNA_SPACE]) * \
+                    len(fragments)
+            reduced_postprocess.ClassifyMatchesFiles(trna_space,
+                    matches_paths, names, closest, jobs)
+            ut.ExpectEq(closest, expected)
+
+        # A job which fails stops the others, and the state set up for
+        # them is undone.
+        for jobs in [1, 2]:
+            try:
+                reduced_postprocess.ClassifyMatchesFiles(trna_space,
+                        matches_paths + [os.path.join(directory,
+                            "missing.matches")], names, closest, jobs)
+                ut.ExpectEq("missing matches file", "rejected")
+            except FileNotFoundError:
+                pass
+            ut.ExpectEq(gc.get_freeze_count(), 0)
+            ut.ExpectEq(reduced_postprocess._fragments, None)
+
+
+if __name__ == "__main__":
+    ut.RunTests()
@@ -6,7 +6,8 @@
 #
 # 3. Runs many-string-search/build/find_patterns for each of the
 # chromosome .fa files in gen/chr. The matches found
-# in <filename>.fa.mint are saved in gen/<filename>.matches.
+# in <filename>.fa.mint are saved in gen/<filename>.matches, once
+# the scan is complete.
 #
 # 4. Runs the postprocessing script which produces the mint lookup
 # table and saves it in a .lookup file.
@@ -47,8 +48,7 @@ done
 
 # Prepares the .names file.
 if [ ! -e gen/${BASEDIR}/${NAMEROOT}-tRNAs.names ]; then
-    python3 naming.py ${SWITCHES} data/${BASEDIR}/${DATAFILE} |
-        sort -k1,1 \
+    python3 naming.py ${SWITCHES} data/${BASEDIR}/${DATAFILE} \
         >gen/${BASEDIR}/${NAMEROOT}-tRNAs.names
 fi
 
@@ -69,12 +69,17 @@ for f in $(ls gen/${BASEDIR}/chr/*fa.mint); do
     if [ -e gen/${BASEDIR}/matches/${filename}.matches ]; then
         continue
     fi  
-    find_patterns/build/find_patterns \
+    # The matches are written to a .incomplete file, which is only
+    # moved into place once find_patterns has finished, so that the
+    # chromosome is scanned again if it was stopped partway.
+    (find_patterns/build/find_patterns \
         gen/${BASEDIR}/${NAMEROOT}-tRNAs.patterns \
         ${f} \
         --range-lower=16 \
         --range-upper=50 \
-        >gen/${BASEDIR}/matches/${filename}.matches &
+        >gen/${BASEDIR}/matches/${filename}.matches.incomplete && \
+    mv gen/${BASEDIR}/matches/${filename}.matches.incomplete \
+        gen/${BASEDIR}/matches/${filename}.matches) &
 done
 
 wait
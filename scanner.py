@@ -0,0 +1,885 @@
+#!/usr/bin/python3
+# A Python scanning engine which reports the same set of matches as
+# find_patterns, in the same *.matches format, and additionally
+# supports wildcards in both the patterns and the haystack. Matches
+# are printed in order of their start in the haystack, but the order
+# of the matches starting at the same position differs from that of
+# find_patterns, so consumers of .matches files must not depend on
+# the order of their lines.
+#
+# With --haystack-wildcard, the sets of matches differ on haystacks
+# holding runs of the wildcard (such as the N runs of a genome).
+# find_patterns lets a haystack wildcard stand for any base, however
+# many there are. scanner.py only reports the matches holding at most
+# --max-wildcards wildcards, of which at most --wildcard-limit in a
+# row (3 and 3 by default), since each seed is expanded into every
+# string it may stand for; it then reports a subset of the matches of
+# find_patterns. The limits apply to the wildcards inside a match, so
+# a match may start or end in the last or first --wildcard-limit
+# positions of a longer run.
+#
+# Each line of the patterns file should have the format
+#
+#   <pattern name> <pattern>
+#
+# Each match is printed on a line of the form
+#
+#   <matched string> <start index of match in haystack>
+#       <start index of match in pattern> <name of pattern>
+#
+# With --both-strands, each pattern is also searched for on the
+# negative strand, so the virtual (inverse complement) patterns can be
+# left out of the patterns file (see patterns_and_intervals.py
+# --single-strand). Matches on the negative strand are printed just
+# as the matches against the virtual patterns would have been.
+#
+# When wildcards are enabled, each line is followed by a field of the
+# form w=<count>, giving the number of wildcard positions in the
+# match. When --mismatches=<k> is given, matches with up to k
+# mismatches are reported as well, and each line is followed by a
+# field of the form m=<count> giving the number of mismatches.
+# If the haystack file is provided on the command line, the file name
+# is printed before the matches, as with find_patterns.
+#
+# The haystack may also be a FASTA file holding several records, such
+# as a whole genome, and either kind of haystack file may be
+# gzip-compressed (see haystack.py). Each record of a FASTA haystack
+# is scanned on its own, and its matches are preceded by a header line
+# of the form ><record name>, which names the chromosome in place of
+# the file name (see reduced_postprocess.ReadMatchesRecords()).
+# Positions are then given within the record.
+#
+# With --minimizer-window=<w>, only the (w,k)-minimizers of the
+# patterns, k being --minimizer-length (12 by default), are indexed
+# rather than every substring, and the matches are found by verifying
+# the alignments given by the minimizers of the haystack (see
+# MinimizerIndex). The index is about (w + 1) / 2 times smaller than
+# one of every k-mer; w + k - 1 may be at most --range-lower. The
+# matches are the same.
+#
+# With --shard-size=<n>, the haystack is scanned in overlapping shards
+# of n characters whose matches are spilled to disk as sorted runs,
+# and then merged without repeats (see ShardedScan()).
+#
+# With --shared-index=<name>, the patterns file is not read; instead
+# the index is taken from the block of shared memory called name (see
+# flat_index.py), which lets many scanners share a single index. The
+# block must have been built with the same range and wildcard
+# arguments.
+#
+# With --index-file=<path>, the index is mapped into memory from the
+# index file at path (see build_index.py). If the file is missing, or
+# was built from another patterns file or with other arguments, it is
+# rebuilt first.
+#
+# With --suppress-trna-space=<tRNA records file>, matches lying
+# entirely inside tRNA space on their strand, which
+# reduced_postprocess.py would discard, are not printed (see
+# SuppressTRNASpaceMatches()). The records are read as a .ss file, or
+# in the format given by --records-format, and the chromosome is the
+# name of the FASTA record, or is taken from the haystack file name
+# unless --chromosome is given. The
+# matches of a fragment at its own tRNA loci are then left out, so
+# such .matches files are not suited to occurrences.py.
+#
+# The matches are written to stdout, or with --output=<file>, to
+# <file> (see output.py). With --checkpoint-interval=<seconds> as well,
+# a scan which is stopped partway, e.g. by the preemption of its node,
+# can be resumed by running the same command again (see
+# checkpoint.py). The matches are written to <file>.incomplete until
+# the scan is complete, and every <seconds> seconds the output is
+# flushed to disk and the position in the haystack up to which it is
+# complete recorded in <file>.checkpoint. A rerun of the command cuts
+# the output back to the last checkpoint and scans on from there; the
+# overlap of range_upper - 1 characters which Scanner.Scan() carries
+# between chunks is rescanned, so no match is lost or repeated.
+#
+# Sample usage:
+#
+#   python3 scanner.py \
+#       gen/mm10/mm10-tRNAs.patterns \
+#       gen/mm10/chr/chr1.fa.mint \
+#       --range-lower=16 --range-upper=50 \
+#       --haystack-wildcard=N \
+#       >gen/mm10/matches/chr1.matches
+
+import argparse
+import bisect
+import collections
+import hashlib
+import heapq
+import itertools
+import operator
+import os
+import re
+import sys
+
+import checkpoint
+import extsort
+import flat_index
+import haystack
+import output
+import pattern_index
+import reduced_postprocess
+import trnapy
+from haystack import WildcardRunTable
+from pattern_index import CanonicalSeed
+from pattern_index import ExpandWildcards
+from pattern_index import MinimizerIndex
+from pattern_index import MismatchIndex
+from pattern_index import PatternIndex
+from pattern_index import VirtualPatternName
+from trnapy import FileFormat
+from trnapy import InverseComplement
+
+
+# By default at most this many haystack wildcards may occur in a
+# row inside a match. find_patterns has no such limit (see above).
+DEFAULT_WILDCARD_LIMIT = 3
+
+# Number of output lines written at a time.
+OUTPUT_BATCH_SIZE = 1 << 16
+
+
+# Represents a match found by the Scanner.
+#
+# fragment: The matched substring of the pattern.
+# wildcards: The number of positions of the match at which either
+#   the pattern or the haystack holds a wildcard.
+# mismatches: The number of positions of the match at which the
+#   pattern and the haystack differ.
+# strand: The strand of the haystack on which the match was found.
+#   Only scans of both strands find matches on the '-' strand.
+ScanMatch = collections.namedtuple("ScanMatch",
+        ["fragment", "haystack_start", "pattern_start", "pattern_name",
+            "wildcards", "mismatches", "strand"],
+        defaults=(0, "+"))
+
+
+# Finds all the substrings of the patterns held in a PatternIndex in
+# a haystack.
+#
+# If haystack_wildcard is set, that character matches any character
+# of a pattern, but no match may contain more than wildcard_limit of
+# them in a row. Runs of haystack wildcards which are too long to be
+# matched are skipped in a single step. The total number of
+# wildcards in a match is bounded by index.max_wildcards.
+class Scanner:
+    def __init__(self, index, haystack_wildcard=None,
+            wildcard_limit=DEFAULT_WILDCARD_LIMIT):
+        self.index = index
+        self.haystack_wildcard = haystack_wildcard
+        self.wildcard_limit = wildcard_limit
+
+    def wildcards_enabled(self):
+        return self.haystack_wildcard is not None or \
+                self.index.pattern_wildcard is not None
+
+    # Scans the haystack, which is given as an iterable of chunks of
+    # text, and yields ScanMatch objects. Matches are yielded in
+    # order of their start position in the haystack. offset is the
+    # position of the first chunk in the haystack.
+    #
+    # Chunks are scanned one at a time; the last range_upper - 1
+    # characters of each chunk are carried over into the next one so
+    # that no match straddling two chunks is lost. The next chunk is
+    # only taken once every match starting more than range_upper - 1
+    # characters before its start has been yielded.
+    def Scan(self, chunks, offset=0):
+        overlap = self.index.range_upper - 1
+        carry = ""
+        carry_offset = offset
+        for chunk in chunks:
+            text = carry + chunk
+            scan_end = max(0, len(text) - overlap)
+            yield from self._ScanText(text, carry_offset, scan_end)
+            carry = text[scan_end:]
+            carry_offset += scan_end
+        yield from self._ScanText(carry, carry_offset, len(carry))
+
+    # Yields the matches starting at positions [0, scan_end) of text.
+    # text_offset is the position of text in the haystack.
+    def _ScanText(self, text, text_offset, scan_end):
+        if self.index.both_strands:
+            yield from self._ScanBothStrands(text, text_offset, scan_end)
+            return
+
+        range_lower = self.index.range_lower
+        lookup = self.index.lookup
+        if self.haystack_wildcard is None:
+            for i in range(scan_end):
+                windows = lookup(text[i : i + range_lower])
+                if windows:
+                    yield from self._MatchesAt(
+                            text, text_offset, i, windows)
+            return
+
+        for i, seeds in self._Seeds(text, scan_end):
+            windows = []
+            for seed in seeds:
+                for window in lookup(seed):
+                    if window not in windows:
+                        windows.append(window)
+            if windows:
+                yield from self._MatchesAt(text, text_offset, i, windows)
+
+    # Yields a pair (i, seeds) for each position i in [0, seeds_end)
+    # of text at which a match may start. seeds is the list of strings
+    # the seed at position i stands for: the seed itself, or its
+    # expansions if it contains haystack wildcards.
+    def _Seeds(self, text, seeds_end):
+        range_lower = self.index.range_lower
+        if self.haystack_wildcard is None:
+            for i in range(seeds_end):
+                yield (i, (text[i : i + range_lower],))
+            return
+
+        wildcard = self.haystack_wildcard
+        max_wildcards = self.index.max_wildcards
+        runs = WildcardRunTable(text, wildcard)
+        run_starts = runs.starts
+        run_ends = runs.ends
+        r = 0
+        i = 0
+        while i < seeds_end:
+            while r < len(runs) and run_ends[r] < i:
+                r += 1
+            seed_end = i + range_lower - 1
+            if r == len(runs) or run_starts[r] > seed_end:
+                yield (i, (text[i : i + range_lower],))
+                i += 1
+                continue
+
+            # The seed contains wildcards. If one of the runs it
+            # overlaps is too long, every start position up to the
+            # point where the run becomes short enough is skipped.
+            wildcard_count = 0
+            skip_to = None
+            k = r
+            while k < len(runs) and run_starts[k] <= seed_end:
+                covered = min(run_ends[k], seed_end) - \
+                        max(run_starts[k], i) + 1
+                if covered > self.wildcard_limit:
+                    skip_to = run_ends[k] - self.wildcard_limit + 1
+                    break
+                wildcard_count += covered
+                k += 1
+            if skip_to is not None:
+                i = skip_to
+                continue
+
+            if wildcard_count <= max_wildcards:
+                yield (i, ExpandWildcards(text[i : i + range_lower],
+                    wildcard, max_wildcards))
+            i += 1
+
+    # Yields the matches starting at positions [0, scan_end) of text on
+    # both strands, sorted by their start position.
+    #
+    # A match on the negative strand is one between a fragment and the
+    # inverse complement of the haystack. Its seed is found in the
+    # haystack as the inverse complement of the seed of the fragment,
+    # at the right-hand end of the match, and the match is verified
+    # against the inverse complement of the text. Such matches are
+    # reported exactly as find_patterns reports matches against the
+    # virtual version of the pattern: the fragment is inverse
+    # complemented, and the position in the pattern and the pattern
+    # name are mirrored (see VirtualPatternName()).
+    def _ScanBothStrands(self, text, text_offset, scan_end):
+        index = self.index
+        range_lower = index.range_lower
+        # Negative strand matches starting before scan_end have their
+        # seeds up to this far right.
+        seeds_end = min(len(text) - range_lower + 1,
+                scan_end + index.range_upper - range_lower)
+        inverse_text = InverseComplement(text)
+        # Matches found so far but not yet yielded, as a heap.
+        pending = []
+        for i, seeds in self._Seeds(text, seeds_end):
+            if len(seeds) == 1:
+                # Saves recomputing the inverse complement of the seed.
+                seed = seeds[0]
+                inverse_seed = inverse_text[len(text) - i - range_lower :
+                        len(text) - i]
+                if seed <= inverse_seed:
+                    key = seed
+                else:
+                    key = inverse_seed
+                if key not in index:
+                    continue
+
+            forward_windows = []
+            reverse_windows = []
+            for seed in seeds:
+                key, direction = CanonicalSeed(seed)
+                for window, orientation in index.lookup(key):
+                    if orientation == 0 or direction == 0 or \
+                            orientation == direction:
+                        if window not in forward_windows:
+                            forward_windows.append(window)
+                    if orientation == 0 or direction == 0 or \
+                            orientation != direction:
+                        if window not in reverse_windows:
+                            reverse_windows.append(window)
+
+            matches = set()
+            if i < scan_end:
+                for window_text, entries in forward_windows:
+                    for length, wildcards in self._MatchLengths(
+                            text, i, window_text):
+                        fragment = window_text[:length]
+                        for name, start in entries:
+                            matches.add((i, length, name, start, fragment,
+                                wildcards, "+"))
+
+            inverse_i = len(text) - i - range_lower
+            for window_text, entries in reverse_windows:
+                for length, wildcards in self._MatchLengths(
+                        inverse_text, inverse_i, window_text):
+                    haystack_start = i + range_lower - length
+                    if haystack_start >= scan_end:
+                        continue
+                    fragment = InverseComplement(window_text[:length])
+                    for name, start in entries:
+                        pattern_length = index.pattern_lengths[name]
+                        matches.add((haystack_start, length,
+                            VirtualPatternName(name, pattern_length),
+                            pattern_length - start - length, fragment,
+                            wildcards, "-"))
+
+            for match in matches:
+                heapq.heappush(pending, match)
+            # No match found further right starts this far left.
+            while pending and \
+                    pending[0][0] <= i + range_lower - index.range_upper:
+                yield self._PendingMatch(heapq.heappop(pending),
+                        text_offset)
+
+        while pending:
+            yield self._PendingMatch(heapq.heappop(pending), text_offset)
+
+    def _PendingMatch(self, pending_match, text_offset):
+        haystack_start, length, name, start, fragment, wildcards, \
+                strand = pending_match
+        return ScanMatch(fragment, text_offset + haystack_start, start,
+                name, wildcards, 0, strand)
+
+    # Verifies the windows found under the seed at position i of text,
+    # and yields the resulting matches, sorted and without repeats.
+    def _MatchesAt(self, text, text_offset, i, windows):
+        matches = set()
+        for window_text, entries in windows:
+            for length, wildcards in self._MatchLengths(
+                    text, i, window_text):
+                fragment = window_text[:length]
+                for name, start in entries:
+                    matches.add((length, name, start, fragment,
+                        wildcards))
+
+        for length, name, start, fragment, wildcards in sorted(matches):
+            yield ScanMatch(fragment, text_offset + i, start, name,
+                    wildcards)
+
+    # Compares window_text to the haystack text at position i.
+    # Returns a list of (length, wildcards) pairs, one for each
+    # length between range_lower and range_upper at which the window
+    # matches.
+    def _MatchLengths(self, text, i, window_text):
+        range_lower = self.index.range_lower
+        n = min(len(window_text), len(text) - i)
+        if n < range_lower:
+            return []
+
+        if not self.wildcards_enabled():
+            # The seed has already been matched exactly.
+            j = range_lower
+            while j < n and window_text[j] == text[i + j]:
+                j += 1
+            return [(length, 0) for length in range(range_lower, j + 1)]
+
+        pattern_wildcard = self.index.pattern_wildcard
+        haystack_wildcard = self.haystack_wildcard
+        max_wildcards = self.index.max_wildcards
+        lengths = []
+        wildcards = 0
+        run = 0
+        for j in range(n):
+            p = window_text[j]
+            h = text[i + j]
+            if h == haystack_wildcard:
+                run += 1
+                if run > self.wildcard_limit:
+                    break
+                wildcards += 1
+            else:
+                run = 0
+                if p == pattern_wildcard:
+                    wildcards += 1
+                elif p != h:
+                    break
+            if wildcards > max_wildcards:
+                break
+            if j + 1 >= range_lower:
+                lengths.append((j + 1, wildcards))
+        return lengths
+
+
+# Finds all the substrings of the patterns held in a MismatchIndex
+# which match the haystack with at most index.mismatches mismatches.
+#
+# Every seed found in the haystack yields a candidate alignment
+# (a "diagonal") of a whole pattern against the haystack. Each
+# diagonal is compared bit-parallelly once, and all the fragments
+# of the pattern along it having few enough mismatches are reported.
+class MismatchScanner(Scanner):
+    def __init__(self, index):
+        super().__init__(index)
+
+    def wildcards_enabled(self):
+        return False
+
+    # Yields the matches starting at positions [0, scan_end) of text,
+    # sorted by their start position.
+    def _ScanText(self, text, text_offset, scan_end):
+        index = self.index
+        seed_length = index.seed_length
+        # Seeds further right than this belong to fragments starting
+        # at or after scan_end.
+        seeds_end = min(len(text) - seed_length + 1,
+                scan_end + index.range_upper - seed_length)
+
+        matches = set()
+        verified = {}
+        next_pruning = 0
+        for j, hits in self._SeedHits(text, seeds_end):
+            if j >= next_pruning:
+                verified = {d: text_ids for d, text_ids in verified.items()
+                        if d > j - index.max_text_length}
+                next_pruning = j + 4096
+            for text_id, offset in hits:
+                diagonal = j - offset
+                if diagonal >= scan_end:
+                    continue
+                if diagonal not in verified:
+                    verified[diagonal] = set()
+                elif text_id in verified[diagonal]:
+                    continue
+                verified[diagonal].add(text_id)
+                self._VerifyDiagonal(text, scan_end, text_id, diagonal,
+                        matches)
+
+        for haystack_start, length, name, start, fragment, mismatches in \
+                sorted(matches):
+            yield ScanMatch(fragment, text_offset + haystack_start,
+                    start, name, 0, mismatches)
+
+    # Yields a pair (j, hits) for each position j in [0, seeds_end) of
+    # text at which a seed of the index starts, where hits is the list
+    # of its (text id, offset) pairs, or of those of every shape of
+    # seed found there (see MismatchIndex.SeedsAt()).
+    def _SeedHits(self, text, seeds_end):
+        index = self.index
+        seed_length = index.seed_length
+        lookup = index.lookup
+        if len(index.shapes) == 1:
+            for j in range(seeds_end):
+                hits = lookup(text[j : j + seed_length])
+                if hits:
+                    yield j, hits
+            return
+        for j in range(seeds_end):
+            hits = [hit for seed in index.SeedsAt(text, j)
+                    for hit in lookup(seed)]
+            if hits:
+                yield j, hits
+
+    # Aligns pattern text_id so that it starts at position diagonal of
+    # text, and adds to matches each fragment along the alignment
+    # having at most index.mismatches mismatches and starting before
+    # scan_end.
+    def _VerifyDiagonal(self, text, scan_end, text_id, diagonal, matches):
+        index = self.index
+        pattern = index.texts[text_id]
+        lo = max(0, -diagonal)
+        hi = min(len(pattern), len(text) - diagonal)
+        if hi - lo < index.range_lower:
+            return
+
+        code, invalid = index.codes[text_id]
+        shift = 2 * (len(pattern) - hi)
+        mask = (1 << 2 * (hi - lo)) - 1
+        mismatch_string = pattern_index.MismatchString(
+                pattern[lo:hi], text[diagonal + lo : diagonal + hi],
+                ((code >> shift) & mask, (invalid >> shift) & mask))
+        mismatch_positions = [lo + i for i, c in enumerate(mismatch_string)
+                if c == '1']
+
+        # Most diagonals hold no fragment at all; they are rejected by
+        # looking for k + 1 consecutive mismatches far enough apart.
+        # A diagonal with at most k mismatches always holds one.
+        k = index.mismatches
+        bounds = [lo - 1] + mismatch_positions + [hi]
+        if len(mismatch_positions) > k and \
+                all(bounds[i + k + 1] - bounds[i] - 1 < index.range_lower
+                    for i in range(len(bounds) - k - 1)):
+            return
+
+        for start in range(lo, hi - index.range_lower + 1):
+            if diagonal + start >= scan_end:
+                break
+            first = bisect.bisect_left(mismatch_positions, start)
+            if first + k < len(mismatch_positions):
+                end = min(hi, mismatch_positions[first + k])
+            else:
+                end = hi
+            end = min(end, start + index.range_upper)
+            for length in range(index.range_lower, end - start + 1):
+                mismatches = bisect.bisect_left(mismatch_positions,
+                        start + length, first) - first
+                fragment = pattern[start : start + length]
+                for name in index.names[text_id]:
+                    matches.add((diagonal + start, length, name, start,
+                        fragment, mismatches))
+
+
+# Finds the exact matches of the substrings of the patterns held in a
+# MinimizerIndex. The minimizers of the haystack are looked up in the
+# index, and the alignments they give are verified as MismatchScanner
+# verifies them.
+class MinimizerScanner(MismatchScanner):
+    def _SeedHits(self, text, seeds_end):
+        index = self.index
+        lookup = index.lookup
+        # The windows of the k-mers starting before seeds_end.
+        for j, minimizer in pattern_index.Minimizers(
+                text[:seeds_end + index.seed_length - 1],
+                index.seed_length, index.window):
+            hits = lookup(minimizer)
+            if hits:
+                yield j, hits
+
+
+# Scans the haystack, given as an iterable of chunks, in shards of
+# shard_size characters, and yields the ScanMatch objects found in
+# order of their start position, without repeats.
+#
+# Consecutive shards overlap by range_upper - 1 characters, so that
+# each shard can be scanned on its own. The matches of each shard are
+# sorted into a run of compact records, holding the position of the
+# match, the id of the pattern name and the position in the pattern,
+# and the run is spilled to disk by an ExternalSorter. Matches found
+# twice, in the overlap of two shards, are dropped while the runs are
+# merged, so memory use depends on shard_size but not on the size of
+# the haystack.
+def ShardedScan(scanner, chunks, shard_size, temp_dir=None):
+    overlap = scanner.index.range_upper - 1
+    names = scanner.index.MatchNames()
+    name_ids = {name: name_id for name_id, name in enumerate(names)}
+    strands = ["+", "-"]
+
+    def ScanShard(shard, shard_offset, sorter):
+        sorter.AddRun(sorted(
+            (shard_offset + match.haystack_start, len(match.fragment),
+                name_ids[match.pattern_name], match.pattern_start,
+                match.fragment, match.wildcards, match.mismatches,
+                strands.index(match.strand))
+            for match in scanner.Scan([shard])))
+
+    with extsort.ExternalSorter(temp_dir=temp_dir) as sorter:
+        shard = ""
+        shard_offset = 0
+        for chunk in chunks:
+            shard += chunk
+            while len(shard) >= shard_size + overlap:
+                ScanShard(shard[:shard_size + overlap], shard_offset,
+                        sorter)
+                shard = shard[shard_size:]
+                shard_offset += shard_size
+        if shard or shard_offset == 0:
+            ScanShard(shard, shard_offset, sorter)
+
+        for haystack_start, length, name_id, start, fragment, wildcards, \
+                mismatches, strand in sorter.Merge(unique=True):
+            yield ScanMatch(fragment, haystack_start, start, names[name_id],
+                    wildcards, mismatches, strands[strand])
+
+
+# Yields the matches, found in the haystack of chromosome, which do
+# not lie entirely inside tRNA space on their strand, as
+# reduced_postprocess.py decides it; the others would be dropped by it
+# anyway. Matches spanning the boundary of tRNA space are yielded.
+# Matches of patterns not named by their interval (e.g. 0-81) cannot
+# be placed, and are always yielded.
+def SuppressTRNASpaceMatches(matches, trna_space, chromosome):
+    chromosome_trna_space = reduced_postprocess.ChromosomeTRNASpace(
+            trna_space, chromosome)
+    interval_names = {}
+    for match in matches:
+        name = match.pattern_name
+        if name not in interval_names:
+            interval_names[name] = \
+                    re.fullmatch(r"!?\d+-\d+", name) is not None
+        if interval_names[name] and chromosome_trna_space.contains(
+                *reduced_postprocess.MatchInterval(len(match.fragment),
+                    match.haystack_start, match.pattern_start, name)):
+            continue
+        yield match
+
+
+# Formats a ScanMatch as a line of a .matches file.
+def FormatMatch(match, include_debug=True, include_wildcards=False,
+        include_mismatches=False):
+    line = match.fragment + " " + str(match.haystack_start)
+    if include_debug:
+        line += " " + str(match.pattern_start) + " " + match.pattern_name
+    if include_wildcards:
+        line += " w=" + str(match.wildcards)
+    if include_mismatches:
+        line += " m=" + str(match.mismatches)
+    return line
+
+
+# Returns the parser of the command line arguments of scanner.py.
+def ArgumentParser():
+    parser = argparse.ArgumentParser(
+            description="Finds substrings of the patterns in a haystack.")
+    parser.add_argument("patterns_file")
+    parser.add_argument("haystack_file", nargs="?")
+    parser.add_argument("--range-lower", type=int, default=16)
+    parser.add_argument("--range-upper", type=int, default=50)
+    parser.add_argument("-p", "--pattern-wildcard")
+    parser.add_argument("--haystack-wildcard")
+    parser.add_argument("--wildcard-limit", type=int,
+            default=DEFAULT_WILDCARD_LIMIT)
+    parser.add_argument("--max-wildcards", type=int,
+            default=pattern_index.DEFAULT_MAX_WILDCARDS)
+    parser.add_argument("-k", "--mismatches", type=int, default=0)
+    parser.add_argument("--both-strands", action="store_true")
+    parser.add_argument("--minimizer-window", type=int)
+    parser.add_argument("--minimizer-length", type=int,
+            default=pattern_index.DEFAULT_MINIMIZER_LENGTH)
+    parser.add_argument("--shard-size", type=int)
+    parser.add_argument("--temp-dir")
+    parser.add_argument("--suppress-header", action="store_true")
+    parser.add_argument("--no-debug", action="store_true")
+    parser.add_argument("--shared-index")
+    parser.add_argument("--index-file")
+    parser.add_argument("--suppress-trna-space")
+    parser.add_argument("--records-format", choices=["ss", "fa", "trna"],
+            default="ss")
+    parser.add_argument("--chromosome")
+    parser.add_argument("-o", "--output")
+    parser.add_argument("--checkpoint-interval", type=float)
+    return parser
+
+
+# Returns the digest identifying a scan with the command line
+# arguments args, recorded in its checkpoints (see checkpoint.py). It
+# covers the patterns file and the size of the haystack file as well.
+def CheckpointDigest(args):
+    digest = hashlib.sha256()
+    for path in (args.patterns_file, args.suppress_trna_space):
+        if path is not None and os.path.isfile(path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    digest.update(repr(sorted((key, value)
+        for key, value in vars(args).items()
+        if key not in ("output", "checkpoint_interval"))).encode())
+    digest.update(str(os.path.getsize(args.haystack_file)).encode())
+    return digest.hexdigest()
+
+
+# Yields the chunks of text of a haystack record, given as (record
+# name, chunk, offset) triples, from position start onward. If
+# output_file is a checkpoint.ResumableWriter, a checkpoint is saved
+# when one is due, as the scanner asks for the next chunk: every match
+# starting overlap characters or more before it has then been written
+# (see Scanner.Scan()).
+def CheckpointedChunks(record_chunks, start, output_file, record_index,
+        overlap):
+    position = start
+    for name, chunk, offset in record_chunks:
+        end = offset + len(chunk)
+        if end <= start:
+            continue
+        yield chunk[max(0, start - offset):]
+        position = max(position, end - overlap)
+        if output_file.CheckpointDue():
+            output_file.SaveCheckpoint(record_index, position)
+
+
+# Returns the PatternIndex of the patterns described by args, the
+# parsed command line arguments.
+def MakePatternIndex(args, patterns):
+    return PatternIndex(patterns, args.range_lower, args.range_upper,
+            pattern_wildcard=args.pattern_wildcard,
+            max_wildcards=args.max_wildcards,
+            both_strands=args.both_strands)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    args = parser.parse_args()
+
+    for wildcard in (args.pattern_wildcard, args.haystack_wildcard):
+        if wildcard is not None and len(wildcard) != 1:
+            parser.error("wildcards must be single characters")
+
+    if args.shared_index is not None and args.index_file is not None:
+        parser.error("--shared-index cannot be used with --index-file")
+    if args.shared_index is not None or args.index_file is not None:
+        if args.mismatches > 0:
+            parser.error("--shared-index and --index-file cannot be used "
+                    "with --mismatches")
+        if args.minimizer_window is not None:
+            parser.error("--shared-index and --index-file cannot be used "
+                    "with --minimizer-window")
+    if args.shared_index is not None:
+        index = flat_index.AttachSharedPatternIndex(args.shared_index)
+        if (index.range_lower, index.range_upper, index.pattern_wildcard,
+                index.max_wildcards, index.both_strands) != \
+                (args.range_lower, args.range_upper, args.pattern_wildcard,
+                        args.max_wildcards, args.both_strands):
+            parser.error("the shared index was built with different "
+                    "arguments")
+        scanner = Scanner(index,
+                haystack_wildcard=args.haystack_wildcard,
+                wildcard_limit=args.wildcard_limit)
+    elif args.index_file is not None:
+        index = flat_index.LoadIndexFile(args.index_file,
+                args.patterns_file, args.range_lower, args.range_upper,
+                pattern_wildcard=args.pattern_wildcard,
+                max_wildcards=args.max_wildcards,
+                both_strands=args.both_strands)
+        scanner = Scanner(index,
+                haystack_wildcard=args.haystack_wildcard,
+                wildcard_limit=args.wildcard_limit)
+    elif args.mismatches > 0:
+        with open(args.patterns_file, 'r') as patterns_file:
+            patterns = pattern_index.ReadPatternsFile(patterns_file)
+        if args.pattern_wildcard is not None or \
+                args.haystack_wildcard is not None:
+            parser.error("wildcards cannot be used with --mismatches")
+        if args.both_strands:
+            parser.error("--both-strands cannot be used with --mismatches")
+        if args.minimizer_window is not None:
+            parser.error("--minimizer-window cannot be used with "
+                    "--mismatches")
+        try:
+            index = MismatchIndex(patterns, args.range_lower,
+                    args.range_upper, args.mismatches)
+        except ValueError as error:
+            parser.error(str(error))
+        scanner = MismatchScanner(index)
+    elif args.minimizer_window is not None:
+        with open(args.patterns_file, 'r') as patterns_file:
+            patterns = pattern_index.ReadPatternsFile(patterns_file)
+        if args.pattern_wildcard is not None or \
+                args.haystack_wildcard is not None:
+            parser.error("wildcards cannot be used with --minimizer-window")
+        if args.both_strands:
+            parser.error("--both-strands cannot be used with "
+                    "--minimizer-window")
+        try:
+            index = MinimizerIndex(patterns, args.range_lower,
+                    args.range_upper, args.minimizer_length,
+                    args.minimizer_window)
+        except ValueError as error:
+            parser.error(str(error))
+        scanner = MinimizerScanner(index)
+    else:
+        with open(args.patterns_file, 'r') as patterns_file:
+            patterns = pattern_index.ReadPatternsFile(patterns_file)
+        index = MakePatternIndex(args, patterns)
+        scanner = Scanner(index,
+                haystack_wildcard=args.haystack_wildcard,
+                wildcard_limit=args.wildcard_limit)
+
+    if args.checkpoint_interval is not None:
+        if args.output is None or args.haystack_file is None:
+            parser.error("--checkpoint-interval requires --output and a "
+                    "haystack file")
+        if args.output.endswith(".gz") or args.shard_size is not None:
+            parser.error("--checkpoint-interval cannot be used with "
+                    "--shard-size or gzip-compressed output")
+        if args.checkpoint_interval < 0:
+            parser.error("--checkpoint-interval must not be negative")
+
+    if args.suppress_trna_space is not None:
+        with open(args.suppress_trna_space, 'r') as records_file:
+            trna_records = trnapy.ReadTRNARecords(records_file, {
+                "ss": FileFormat.SS, "fa": FileFormat.FA,
+                "trna": FileFormat.TRNA}[args.records_format])
+        trna_records.AddCCAToAll()
+        trna_records.ExpandAll()
+        trna_space = trnapy.ConstructTRNASpace(trna_records)
+
+    # The chromosome of a preprocessed haystack.
+    chromosome = args.chromosome
+    if args.haystack_file is not None:
+        if chromosome is None:
+            chromosome = reduced_postprocess.ParseMatchesHeader(
+                    args.haystack_file)
+        haystack_file = haystack.OpenHaystack(args.haystack_file)
+    else:
+        haystack_file = sys.stdin
+
+    # The record and position at which an interrupted scan resumes.
+    resume_index, resume_position = None, 0
+    if args.checkpoint_interval is not None:
+        try:
+            output_file = checkpoint.ResumableWriter(args.output,
+                    CheckpointDigest(args), args.checkpoint_interval,
+                    OUTPUT_BATCH_SIZE)
+        except ValueError as error:
+            parser.error(str(error))
+        if output_file.resume_point is not None:
+            resume_index, resume_position = output_file.resume_point
+    else:
+        output_file = output.OutputWriter(args.output,
+                batch_size=OUTPUT_BATCH_SIZE)
+
+    with output_file:
+        if args.haystack_file is not None and not args.suppress_header \
+                and not haystack.IsFasta(args.haystack_file) and \
+                resume_index is None:
+            output_file.WriteLine(args.haystack_file)
+
+        include_wildcards = scanner.wildcards_enabled()
+        for record_index, (record_name, record_chunks) in enumerate(
+                itertools.groupby(haystack.ReadHaystackRecords(
+                    haystack_file), key=operator.itemgetter(0))):
+            start = 0
+            if resume_index is not None:
+                if record_index < resume_index:
+                    continue
+                if record_index == resume_index:
+                    start = resume_position
+            if record_name is not None and record_index != resume_index:
+                output_file.WriteLine(">" + record_name)
+            if args.checkpoint_interval is not None:
+                chunks = CheckpointedChunks(record_chunks, start,
+                        output_file, record_index,
+                        scanner.index.range_upper - 1)
+            else:
+                chunks = (chunk for name, chunk, offset in record_chunks)
+            if args.shard_size is not None:
+                matches = ShardedScan(scanner, chunks, args.shard_size,
+                        temp_dir=args.temp_dir)
+            else:
+                matches = scanner.Scan(chunks, start)
+            if args.suppress_trna_space is not None:
+                if record_name is None and chromosome is None:
+                    parser.error("--suppress-trna-space requires "
+                            "--chromosome when the haystack is read from "
+                            "stdin")
+                matches = SuppressTRNASpaceMatches(matches, trna_space,
+                        chromosome if record_name is None else record_name)
+            output_file.WriteLines(FormatMatch(match, not args.no_debug,
+                include_wildcards, args.mismatches > 0)
+                for match in matches)
+
+    haystack_file.close()
+    if args.shared_index is not None or args.index_file is not None:
+        index.close()
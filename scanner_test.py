@@ -0,0 +1,462 @@
+#!/usr/bin/python3
+
+import io
+import os
+import random
+import subprocess
+import tempfile
+
+import haystack
+import pattern_index
+import reduced_postprocess
+import scanner
+import testing
+import trnapy
+
+ut = testing.UnitTestCollection()
+
+# The find_patterns binary, as built by its Makefile.
+FIND_PATTERNS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        "find_patterns", "build", "find_patterns")
+
+patterns = [
+        ("0-71", "GCCCGGATAGCTCAGTCGGTAGAGCATCAGACTTTTAATCTGAGGGTCCCA"),
+        ("!3-74", "TGGGACCCTCAGATTAAAAGTCTGATGCTCTACCGACTGAGCTATCCGGGC")]
+
+def Scan(index, haystack_text, **kwargs):
+    s = scanner.Scanner(index, **kwargs)
+    return list(s.Scan([haystack_text]))
+
+
+@ut(patterns)
+def ReadPatternsFile_test(patterns):
+    patterns_file = io.StringIO(
+            "".join(name + " " + p + "\n" for name, p in patterns))
+    ut.ExpectEq(pattern_index.ReadPatternsFile(patterns_file), patterns)
+
+
+@ut()
+def ExpandWildcards_test():
+    ut.ExpectEq(pattern_index.ExpandWildcards("ACGT", "N", 1), ["ACGT"])
+    ut.ExpectEq(len(pattern_index.ExpandWildcards("ANGN", "N", 2)), 16)
+    ut.ExpectEq(pattern_index.ExpandWildcards("ANGN", "N", 1), [])
+
+
+@ut()
+def WildcardRunTable_test():
+    runs = haystack.WildcardRunTable("NNACGTNACNNNN", "N")
+    ut.ExpectEq(list(runs), [(0, 1), (6, 6), (9, 12)])
+
+
+@ut()
+def ReadFastaChunks_test():
+    fasta_file = io.StringIO(">chr1 first\nacgt\nACGTA\n>empty\n"
+            ">chr2\nTTGCA\nNNA\n")
+    ut.ExpectEq(list(haystack.ReadFastaChunks(fasta_file, chunk_size=6)), [
+        ("chr1", "ACGTACGTA", 0), ("chr2", "TTGCANNA", 0)])
+    fasta_file.seek(0)
+    ut.ExpectEq(list(haystack.ReadFastaChunks(fasta_file, chunk_size=4)), [
+        ("chr1", "ACGT", 0), ("chr1", "ACGTA", 4),
+        ("chr2", "TTGCA", 0), ("chr2", "NNA", 5)])
+
+
+@ut()
+def ReadHaystackRecords_test():
+    ut.ExpectEq(list(haystack.ReadHaystackRecords(
+        io.StringIO(">chrM\nACGT\n"), "chr1")), [("chrM", "ACGT", 0)])
+    ut.ExpectEq(list(haystack.ReadHaystackRecords(
+        io.StringIO("ACGTTG"), "chr1", chunk_size=4)),
+        [("chr1", "A", 0), ("chr1", "CGTT", 1), ("chr1", "G", 5)])
+    ut.ExpectEq(list(haystack.ReadHaystackRecords(io.StringIO(""))), [])
+
+
+@ut()
+def ReadMatchesRecords_test():
+    matches_file = io.StringIO(">chr1\nACGT 5 0 0-71\n>chr2\n>chr3\n"
+            "TTTT 1 2 0-71\nGGGG 3 2 0-71\n")
+    records = []
+    for chromosome, lines in \
+            reduced_postprocess.ReadMatchesRecords(matches_file):
+        records.append((chromosome, list(lines)))
+    ut.ExpectEq(records, [("chr1", ["ACGT 5 0 0-71\n"]), ("chr2", []),
+        ("chr3", ["TTTT 1 2 0-71\n", "GGGG 3 2 0-71\n"])])
+    # Lines left unread are skipped.
+    matches_file = io.StringIO("gen/chr/chr4.fa.mint\nACGT 5 0 0-71\n"
+            ">chr5\nTTTT 1 2 0-71\n")
+    ut.ExpectEq([chromosome for chromosome, lines in
+        reduced_postprocess.ReadMatchesRecords(matches_file)],
+        ["chr4", "chr5"])
+
+
+@ut(patterns)
+def Scanner_exact_test(patterns):
+    index = pattern_index.PatternIndex(patterns, 16, 20)
+    fragment = patterns[0][1][5:23]
+    matches = Scan(index, "TTTT" + fragment + "TTTT")
+    # Lengths 16, 17 and 18 starting at 4, and lengths 16 and 17
+    # starting at 5, and length 16 starting at 6.
+    ut.ExpectEq(len(matches), 6)
+    ut.ExpectEq(matches[0],
+            scanner.ScanMatch(fragment[:16], 4, 5, "0-71", 0))
+    ut.ExpectEq(scanner.FormatMatch(matches[2]),
+            fragment + " 4 5 0-71")
+
+
+@ut(patterns)
+def Scanner_chunks_test(patterns):
+    index = pattern_index.PatternIndex(patterns, 16, 50)
+    haystack_text = "ACGT" * 40 + patterns[1][1] + "ACGT" * 40
+    s = scanner.Scanner(index)
+    whole = list(s.Scan([haystack_text]))
+    chunks = [haystack_text[i : i + 7]
+            for i in range(0, len(haystack_text), 7)]
+    ut.ExpectEq(list(s.Scan(chunks)), whole)
+    ut.ExpectEq(len(whole), 2 * 35 + sum(range(1, 35)))
+
+
+@ut(patterns)
+def Scanner_offset_test(patterns):
+    index = pattern_index.PatternIndex(patterns, 16, 50)
+    haystack_text = "ACGT" * 10 + patterns[0][1] + "ACGT" * 10
+    s = scanner.Scanner(index)
+    whole = list(s.Scan([haystack_text]))
+    # A scan resumed at a position finds the matches starting there or
+    # after it, as does the scan of the whole haystack.
+    for start in [0, 45, 60, len(haystack_text)]:
+        ut.ExpectEq(list(s.Scan([haystack_text[start:]], start)),
+                [match for match in whole if match.haystack_start >= start])
+
+@ut(patterns)
+def Scanner_haystack_wildcard_test(patterns):
+    index = pattern_index.PatternIndex(patterns, 16, 16)
+    fragment = patterns[0][1][:16]
+    ut.ExpectEq(Scan(index, fragment[:5] + "N" + fragment[6:]), [])
+
+    matches = Scan(index, fragment[:5] + "N" + fragment[6:],
+            haystack_wildcard="N")
+    ut.AssertEq(len(matches), 1)
+    ut.ExpectEq(matches[0].fragment, fragment)
+    ut.ExpectEq(matches[0].wildcards, 1)
+
+    # Only three wildcards are allowed in a row.
+    matches = Scan(index, "NNN" + fragment[3:], haystack_wildcard="N")
+    ut.ExpectEq(len(matches), 1)
+    matches = Scan(index, "NNNN" + fragment[4:], haystack_wildcard="N")
+    ut.ExpectEq(len(matches), 0)
+
+    # Long runs are skipped over, but matches overlapping their ends
+    # are found.
+    matches = Scan(index, "N" * 1000 + fragment[2:] + "N" * 1000,
+            haystack_wildcard="N")
+    ut.AssertEq(len(matches), 4)
+    ut.ExpectEq(matches[0].haystack_start, 998)
+    ut.ExpectEq(matches[0].wildcards, 2)
+    ut.ExpectEq(matches[3].haystack_start, 1001)
+    ut.ExpectEq(matches[3].wildcards, 3)
+
+
+# Returns the set of matches (haystack start, pattern start, pattern
+# name, fragment, wildcards) of the patterns in haystack_text, letting
+# the haystack wildcard stand for any base, found by comparing every
+# alignment base by base. If max_wildcards or wildcard_limit is None,
+# the number of wildcards in a match, or in a row, is unbounded, as it
+# is for find_patterns.
+def BruteForceWildcardMatches(patterns, haystack_text, range_lower,
+        range_upper, wildcard, max_wildcards, wildcard_limit):
+    matches = set()
+    for name, pattern in patterns:
+        for start in range(len(pattern)):
+            for haystack_start in range(len(haystack_text)):
+                wildcards = 0
+                run = 0
+                for length in range(1, 1 + min(range_upper,
+                        len(pattern) - start,
+                        len(haystack_text) - haystack_start)):
+                    base = haystack_text[haystack_start + length - 1]
+                    if base == wildcard:
+                        wildcards += 1
+                        run += 1
+                        if wildcard_limit is not None and \
+                                run > wildcard_limit:
+                            break
+                    else:
+                        run = 0
+                        if base != pattern[start + length - 1]:
+                            break
+                    if max_wildcards is not None and \
+                            wildcards > max_wildcards:
+                        break
+                    if length >= range_lower:
+                        matches.add((haystack_start, start, name,
+                            pattern[start : start + length], wildcards))
+    return matches
+
+
+# Returns a haystack made of pieces of the patterns, some of them
+# overwritten by runs of N, separated by runs of N and random bases.
+def WildcardHaystack(patterns, generator):
+    pieces = []
+    for _ in range(12):
+        pattern = generator.choice(patterns)[1]
+        start = generator.randrange(20)
+        piece = list(pattern[start : start + generator.randint(16, 30)])
+        for _ in range(generator.randint(0, 2)):
+            j = generator.randrange(len(piece))
+            piece[j : j + generator.randint(1, 6)] = \
+                    "N" * generator.randint(1, 6)
+        pieces.append("".join(piece))
+        pieces.append("N" * generator.randint(0, 8))
+        pieces.append("".join(generator.choice("ACGT")
+            for _ in range(generator.randint(0, 6))))
+    return "".join(pieces)
+
+
+@ut(patterns)
+def Scanner_wildcard_runs_test(patterns):
+    generator = random.Random(3)
+    for _ in range(3):
+        haystack_text = WildcardHaystack(patterns, generator)
+        # scanner.py finds those of the matches of find_patterns which
+        # hold at most max_wildcards wildcards, and at most
+        # wildcard_limit in a row, wherever they start.
+        for max_wildcards, wildcard_limit in [(3, 3), (5, 2), (6, 6)]:
+            index = pattern_index.PatternIndex(patterns, 16, 50,
+                    max_wildcards=max_wildcards)
+            expected = BruteForceWildcardMatches(patterns, haystack_text,
+                    16, 50, "N", max_wildcards, wildcard_limit)
+            for chunk_size in [7, len(haystack_text)]:
+                matches = list(scanner.Scanner(index, haystack_wildcard="N",
+                    wildcard_limit=wildcard_limit).Scan(
+                        haystack.ReadHaystackChunks(
+                            io.StringIO(haystack_text), chunk_size)))
+                ut.ExpectEq(set((match.haystack_start, match.pattern_start,
+                    match.pattern_name, match.fragment, match.wildcards)
+                    for match in matches), expected)
+                ut.ExpectEq(len(matches), len(expected))
+
+        # The model agrees with find_patterns itself, where it is built.
+        if os.path.exists(FIND_PATTERNS):
+            with tempfile.TemporaryDirectory() as directory:
+                patterns_path = os.path.join(directory, "test.patterns")
+                with open(patterns_path, 'w') as patterns_file:
+                    for name, pattern in patterns:
+                        patterns_file.write(name + " " + pattern + "\n")
+                haystack_path = os.path.join(directory, "test.fa.mint")
+                with open(haystack_path, 'w') as haystack_file:
+                    haystack_file.write(haystack_text)
+                output = subprocess.run([FIND_PATTERNS, patterns_path,
+                    haystack_path, "--range-lower=16", "--range-upper=50",
+                    "--haystack-wildcard=N", "--suppress-header"],
+                    stdout=subprocess.PIPE, check=True).stdout.decode()
+            ut.ExpectEq(set(output.splitlines()), set(
+                " ".join([fragment, str(haystack_start), str(start), name])
+                for haystack_start, start, name, fragment, _ in
+                BruteForceWildcardMatches(patterns, haystack_text, 16, 50,
+                    "N", None, None)))
+
+
+@ut(patterns)
+def Scanner_pattern_wildcard_test(patterns):
+    name, pattern = patterns[0]
+    index = pattern_index.PatternIndex(
+            [(name, pattern[:7] + "N" + pattern[8:])], 16, 16,
+            pattern_wildcard="N")
+    matches = Scan(index, pattern[:16])
+    ut.AssertEq(len(matches), 1)
+    ut.ExpectEq(matches[0].fragment, pattern[:7] + "N" + pattern[8:16])
+    ut.ExpectEq(scanner.FormatMatch(matches[0], include_wildcards=True),
+            pattern[:7] + "N" + pattern[8:16] + " 0 0 0-71 w=1")
+
+
+@ut()
+def VirtualPatternName_test():
+    ut.ExpectEq(pattern_index.VirtualPatternName("0-71", 75), "!3-74")
+    ut.ExpectEq(pattern_index.VirtualPatternName("1-72", 76), "!3-74")
+    ut.ExpectEq(pattern_index.VirtualPatternName("+chr1.trna7", 75),
+            "!chr1.trna7")
+
+
+@ut(patterns)
+def Scanner_both_strands_test(patterns):
+    name, pattern = "0-47", patterns[0][1]
+    virtual_pattern = trnapy.InverseComplement(pattern)
+    haystack_text = "ACGT" * 10 + pattern[3:40] + "TTTT" + \
+            virtual_pattern[:30] + "ACGT" * 10
+    index = pattern_index.PatternIndex(
+            [(name, pattern), ("!3-50", virtual_pattern)], 16, 50)
+    expected = sorted(Scan(index, haystack_text))
+
+    single_strand_index = pattern_index.PatternIndex(
+            [(name, pattern)], 16, 50, both_strands=True)
+    s = scanner.Scanner(single_strand_index)
+    matches = list(s.Scan([haystack_text[i : i + 20]
+        for i in range(0, len(haystack_text), 20)]))
+    ut.ExpectEq([m.haystack_start for m in matches],
+            sorted(m.haystack_start for m in matches))
+    ut.ExpectEq(sorted(m[:6] for m in matches),
+            sorted(m[:6] for m in expected))
+    ut.ExpectEq(set(m.strand for m in matches), {"+", "-"})
+    for m in matches:
+        ut.ExpectEq(m.strand, "-" if m.pattern_name[0] == "!" else "+")
+
+
+@ut(patterns)
+def ShardedScan_test(patterns):
+    haystack_text = "ACGT" * 40 + patterns[1][1] + "ACGT" * 40 + \
+            patterns[0][1][10:40] + "ACGT" * 40
+    index = pattern_index.PatternIndex(patterns, 16, 50)
+    s = scanner.Scanner(index)
+    whole = list(s.Scan([haystack_text]))
+    for shard_size in [1, 20, 100, len(haystack_text)]:
+        ut.ExpectEq(list(scanner.ShardedScan(s, [haystack_text],
+            shard_size)), whole)
+
+
+@ut(patterns)
+def SuppressTRNASpaceMatches_test(patterns):
+    haystack_text = "ACGT" * 25 + patterns[0][1] + "ACGT" * 10
+    index = pattern_index.PatternIndex(patterns, 16, 50)
+    whole = Scan(index, haystack_text)
+    trna_end = 100 + len(patterns[0][1]) - 1
+    trna_space = {("chr1", "+"): [(105, trna_end)]}
+    # Matches starting before the tRNA span its boundary, and are kept.
+    expected = [match for match in whole if match.haystack_start < 105 or
+            match.haystack_start + len(match.fragment) - 1 > trna_end]
+    ut.ExpectEq(list(scanner.SuppressTRNASpaceMatches(whole, trna_space,
+        "chr1")), expected)
+    ut.ExpectEq(len(expected) < len(whole), True)
+    ut.ExpectEq(list(scanner.SuppressTRNASpaceMatches(whole, trna_space,
+        "chr2")), whole)
+
+
+@ut()
+def MismatchString_test():
+    ut.ExpectEq(pattern_index.MismatchString("ACGTAC", "ACCTAC"), "001000")
+    ut.ExpectEq(pattern_index.MismatchString("ACGTAC", "NCGTAA"), "100001")
+
+
+@ut(patterns)
+def MismatchScanner_test(patterns):
+    index = pattern_index.MismatchIndex(patterns, 16, 18, 1)
+    ut.ExpectEq(index.seed_length, 8)
+    name, pattern = patterns[0]
+    fragment = pattern[10:28]
+    mutated = fragment[:9] + ("A" if fragment[9] != "A" else "C") + \
+            fragment[10:]
+    s = scanner.MismatchScanner(index)
+    matches = list(s.Scan(["TTTT" + mutated + "TTTT"]))
+    ut.ExpectIn(scanner.ScanMatch(fragment, 4, 10, name, 0, 1), matches)
+    for match in matches:
+        ut.ExpectEq(match.mismatches, 1)
+    ut.ExpectEq(scanner.FormatMatch(matches[0], include_mismatches=True),
+            fragment[:16] + " 4 10 " + name + " m=1")
+
+
+@ut(patterns)
+def MismatchScanner_embedded_test(patterns):
+    name, pattern = patterns[0]
+    index = pattern_index.MismatchIndex([(name, pattern)], 16, 18, 1)
+    s = scanner.MismatchScanner(index)
+    expected = Scan(pattern_index.PatternIndex([(name, pattern)], 16, 18),
+            "ACGT" * 5 + pattern + "ACGT" * 5)
+    ut.ExpectEq(len(expected), sum(len(pattern) - length + 1
+        for length in range(16, 19)))
+    # A pattern embedded exactly has at most k mismatches along its
+    # whole diagonal, and every one of its fragments is found.
+    matches = list(s.Scan(["ACGT" * 5 + pattern + "ACGT" * 5]))
+    ut.ExpectEq([match for match in matches if match.mismatches == 0],
+            expected)
+
+    mutated = pattern[:25] + ("A" if pattern[25] != "A" else "C") + \
+            pattern[26:]
+    matches = list(s.Scan(["ACGT" * 5 + mutated + "ACGT" * 5]))
+    ut.ExpectEq(sorted((match.haystack_start, len(match.fragment))
+        for match in matches), sorted((match.haystack_start,
+            len(match.fragment)) for match in expected))
+    for match in matches:
+        ut.ExpectEq(match.mismatches, int(match.pattern_start <= 25 <
+            match.pattern_start + len(match.fragment)))
+
+# Returns the set of (haystack start, length, pattern name, pattern
+# start, fragment, mismatches) tuples of the substrings of the
+# patterns matching haystack_text with at most k mismatches, found by
+# comparing every alignment base by base.
+def BruteForceMismatches(patterns, haystack_text, range_lower,
+        range_upper, k):
+    matches = set()
+    for name, pattern in patterns:
+        for start in range(len(pattern)):
+            for haystack_start in range(len(haystack_text)):
+                mismatches = 0
+                for length in range(1, 1 + min(range_upper,
+                        len(pattern) - start,
+                        len(haystack_text) - haystack_start)):
+                    base = pattern[start + length - 1]
+                    if base not in "ACGT" or base != \
+                            haystack_text[haystack_start + length - 1]:
+                        mismatches += 1
+                    if mismatches > k:
+                        break
+                    if length >= range_lower:
+                        matches.add((haystack_start, length, name, start,
+                            pattern[start : start + length], mismatches))
+    return matches
+
+
+@ut(patterns)
+def MismatchScanner_two_mismatches_test(patterns):
+    index = pattern_index.MismatchIndex(patterns, 16, 24, 2)
+    ut.ExpectEq(index.seed_length, 8)
+    ut.ExpectEq(len(index.shapes), 3)
+    filler = "ACGTTGCA" * 3
+    first = patterns[0][1]
+    second = patterns[1][1]
+    # Two mismatches far apart, two side by side, and a wildcard.
+    haystack_text = filler + first[:10] + "T" + first[11:20] + "A" + \
+            first[21:] + filler + second[:30] + "AA" + second[32:] + \
+            filler + first[5:17] + "N" + first[18:40] + filler
+    expected = BruteForceMismatches(patterns, haystack_text, 16, 24, 2)
+    ut.ExpectEq(any(match[5] == 2 for match in expected), True)
+    matches = list(scanner.MismatchScanner(index).Scan([haystack_text]))
+    ut.ExpectEq(set((match.haystack_start, len(match.fragment),
+        match.pattern_name, match.pattern_start, match.fragment,
+        match.mismatches) for match in matches), expected)
+    ut.ExpectEq(len(matches), len(expected))
+
+
+@ut()
+def Minimizers_test():
+    s = "GCCCGGATAGCTCAGTCGGTAGAGCATCAG"
+    minimizers = list(pattern_index.Minimizers(s, 5, 4))
+    for position, minimizer in minimizers:
+        ut.ExpectEq(s[position : position + 5], minimizer)
+    # Every window of 4 consecutive 5-mers holds a minimizer.
+    positions = [position for position, minimizer in minimizers]
+    for i in range(len(s) - 5 - 4 + 2):
+        ut.ExpectEq(any(i <= p < i + 4 for p in positions), True)
+    # A window shares its minimizer with any string containing it.
+    window_minimizers = list(pattern_index.Minimizers(s[7:15], 5, 4))
+    ut.ExpectEq(len(window_minimizers), 1)
+    position, minimizer = window_minimizers[0]
+    ut.ExpectIn((7 + position, minimizer), minimizers)
+
+
+@ut(patterns)
+def MinimizerScanner_test(patterns):
+    haystack_text = "ACGT" * 10 + patterns[0][1][3:40] + "TTGA" + \
+            patterns[1][1][:30] + "ACGT" * 10
+    expected = Scan(pattern_index.PatternIndex(patterns, 16, 30),
+            haystack_text)
+    ut.ExpectEq(len(expected) > 0, True)
+    for minimizer_length, window in ((12, 5), (8, 9), (16, 1)):
+        index = pattern_index.MinimizerIndex(patterns, 16, 30,
+                minimizer_length, window)
+        s = scanner.MinimizerScanner(index)
+        ut.ExpectEq(list(s.Scan([haystack_text])), expected)
+        chunks = [haystack_text[i : i + 11]
+                for i in range(0, len(haystack_text), 11)]
+        ut.ExpectEq(list(s.Scan(chunks)), expected)
+
+
+if __name__ == "__main__":
+    ut.RunTests()
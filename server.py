@@ -0,0 +1,360 @@
+#!/usr/bin/python3
+# A long-lived server which keeps the tRNA catalogue and the tables
+# built from it in memory, and answers queries over a Unix domain
+# socket, so that clients need not reload them for every query.
+#
+# Usage:
+#   python3 server.py [-s|-f|-t] <tRNA records file> <.names file>
+#       --socket=<path> [--lookup=<.lookup file>]
+#       [--occurrences=<occurrences file>] [--sources=<sources file>]
+#   python3 server.py --socket=<path> --connect
+#
+# The server reads and expands the tRNA records, builds tRNA space
+# from them (see trnapy.ConstructTRNASpace()), and maps the .names
+# file, which gives the fragment ids and types, into memory (see
+# trnapy.NamesFile). The .lookup file, the table written by
+# occurrences.py (the genomic occurrences of the fragments) and the
+# sources file written by naming.py --sources are loaded if given,
+# into compact tables indexed by fragment id (see ServerState).
+#
+# A request is a line of whitespace-separated words, the first of
+# which is the command. The response is either a line of the form
+#
+#   OK <n>
+#
+# followed by n lines, or a single line of the form ERROR <message>.
+# The commands are:
+#
+#   CLASSIFY <fragment> ...
+#       For each fragment, a line <fragment> <id> <types> <lookup
+#       fields>, separated by tabs. A field which is unknown is
+#       printed as a '-'.
+#   LOCATE <fragment>
+#       The lines of the occurrences table for the fragment.
+#   TRNAS <fragment>
+#       The tRNAs the fragment was cut from, one per line, taken from
+#       the sources file.
+#   CONTAINED <chromosome> <+|-> <start> <end>
+#       Y if the interval lies inside tRNA space, N otherwise.
+#   LOOKUP <first id> <count>
+#       The lines of the .lookup file for the fragments with ids
+#       first id to first id + count - 1.
+#   INFO
+#       The number of tRNAs and fragments held, and which tables are
+#       loaded.
+#
+# Requests are served by a thread per connection, and a connection may
+# carry any number of requests. With --connect, requests are read from
+# stdin, sent to the server listening on --socket, and the responses
+# printed.
+#
+# Sample usage:
+#
+#   python3 server.py data/mm10/mm10-tRNAs-confidence-set.ss \
+#       gen/mm10/mm10-tRNAs.names --lookup=gen/mm10/mm10-tRNAs.lookup \
+#       --socket=/tmp/mm10.sock &
+#   echo "CLASSIFY GCATTGGTGGTTCAGTGGTAGA" | \
+#       python3 server.py --socket=/tmp/mm10.sock --connect
+
+import argparse
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+
+import fragment_sources
+import occurrences
+import reduced_postprocess
+import trnapy
+from trnapy import FileFormat
+
+
+# The tables held by the server. fragments is the trnapy.NamesFile of
+# the .names file, which gives the fragment ids and types; lookup_file
+# is the .lookup file or None; occurrences is an
+# occurrences.OccurrencesIndex or None; and sources is a
+# FragmentSources object or None.
+#
+# The tables are mapped into memory or held in compact arrays indexed
+# by fragment id, so that a long-lived server holds little more than a
+# few bytes per fragment. The lookup fields of each fragment (the Y/N
+# column and, for a graded table, the fewest mismatches) are held in a
+# bytearray as indices into the list of the distinct fields found.
+class ServerState:
+    def __init__(self, trna_records, fragments, lookup_file=None,
+            occurrences=None, sources=None):
+        self.trna_records = trna_records
+        self.trna_space = trnapy.ConstructTRNASpace(trna_records)
+        self.fragments = fragments
+
+        self.lookup = None
+        if lookup_file is not None:
+            # Index 0 stands for a fragment missing from the file.
+            self.lookup_values = ["-"]
+            value_ids = {"-": 0}
+            self.lookup = bytearray(len(fragments))
+            next_id = 0
+            for line in lookup_file:
+                fields = line.rstrip("\n").split("\t", 1)
+                if len(fields) < 2:
+                    continue
+                # The .lookup file lists the fragments in the order of
+                # the .names file, so they are rarely searched for.
+                if next_id < len(fragments) and \
+                        fragments[next_id] == fields[0]:
+                    fragment_id = next_id
+                else:
+                    fragment_id = fragments.find(fields[0])
+                    if fragment_id is None:
+                        continue
+                next_id = fragment_id + 1
+                if fields[1] not in value_ids:
+                    if len(self.lookup_values) == 256:
+                        raise ValueError("too many distinct fields in "
+                                "the .lookup file")
+                    value_ids[fields[1]] = len(self.lookup_values)
+                    self.lookup_values.append(fields[1])
+                self.lookup[fragment_id] = value_ids[fields[1]]
+
+        self.occurrences = occurrences
+        self.sources = sources
+
+    def __str__(self):
+        return "<ServerState with " + str(len(self.fragments)) + \
+                " fragments>"
+
+    def __repr__(self):
+        return str(self)
+
+    # Returns the lines of the response to a request, without the OK
+    # line. Raises ValueError if the request is invalid.
+    def Respond(self, request):
+        words = request.split()
+        if not words:
+            raise ValueError("empty request")
+        command = words[0].upper()
+        arguments = words[1:]
+        if command == "CLASSIFY":
+            return [self.Classify(fragment) for fragment in arguments]
+        elif command == "LOCATE":
+            self._CheckArgumentCount(command, arguments, 1)
+            if self.occurrences is None:
+                raise ValueError("no occurrences table loaded")
+            fragment_id = self.fragments.find(arguments[0].upper())
+            if fragment_id is None:
+                return []
+            return self.occurrences.lines(fragment_id)
+        elif command == "TRNAS":
+            self._CheckArgumentCount(command, arguments, 1)
+            if self.sources is None:
+                raise ValueError("no sources file loaded")
+            fragment_id = self.fragments.find(arguments[0].upper())
+            if fragment_id is None:
+                return []
+            return self.sources.trnas(fragment_id)
+        elif command == "CONTAINED":
+            self._CheckArgumentCount(command, arguments, 4)
+            chromosome, sign, start, end = arguments
+            if sign not in ("+", "-"):
+                raise ValueError("the sign must be + or -")
+            contained = reduced_postprocess.ContainedInTRNASpace(
+                    self.trna_space,
+                    (chromosome, sign, (int(start), int(end))))
+            return ["Y" if contained else "N"]
+        elif command == "LOOKUP":
+            self._CheckArgumentCount(command, arguments, 2)
+            if self.lookup is None:
+                raise ValueError("no .lookup file loaded")
+            first, count = map(int, arguments)
+            if first < 0 or count < 0:
+                raise ValueError("ids and counts must not be negative")
+            return [fragment + "\t" + self.lookup_values[value_id]
+                for fragment, value_id in zip(
+                    self.fragments[first : first + count],
+                    self.lookup[first : first + count])]
+        elif command == "INFO":
+            return ["trnas\t" + str(len(self.trna_records)),
+                    "fragments\t" + str(len(self.fragments)),
+                    "lookup\t" + str(self.lookup is not None),
+                    "occurrences\t" + str(self.occurrences is not None),
+                    "sources\t" + str(self.sources is not None)]
+        raise ValueError("unknown command " + words[0])
+
+    # Returns the CLASSIFY line of fragment.
+    def Classify(self, fragment):
+        fragment = fragment.upper()
+        fragment_id = self.fragments.find(fragment)
+        if fragment_id is None:
+            return "\t".join([fragment, "-", "-", "-"])
+        fields = self.fragments.line(fragment_id).split("\t", 1)
+        types = fields[1].replace(" ", "") if len(fields) > 1 else ""
+        return "\t".join([fragment, str(fragment_id), types or "-",
+            "-" if self.lookup is None else
+            self.lookup_values[self.lookup[fragment_id]]])
+
+    def _CheckArgumentCount(self, command, arguments, count):
+        if len(arguments) != count:
+            raise ValueError(command + " takes " + str(count) +
+                    " argument" + ("s" if count != 1 else ""))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for request in self.rfile:
+            if request.isspace():
+                continue
+            try:
+                # A UnicodeDecodeError is a ValueError.
+                lines = self.server.state.Respond(request.decode())
+                response = "OK " + str(len(lines)) + "\n" + \
+                        "".join(line + "\n" for line in lines)
+            except ValueError as error:
+                response = "ERROR " + str(error) + "\n"
+            self.wfile.write(response.encode())
+            self.wfile.flush()
+
+
+# Removes the socket file at socket_path if it was left behind by a
+# server which was killed, as it would keep a new server from binding.
+# Raises ValueError if the path exists but is not a socket, or if a
+# server is still listening on it.
+def RemoveStaleSocket(socket_path):
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(socket_path + " exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise ValueError("a server is already listening on " + socket_path)
+
+
+# Serves the requests made to state on the Unix domain socket at
+# socket_path. Raises ValueError if socket_path cannot be taken over
+# (see RemoveStaleSocket()).
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, state):
+        self.state = state
+        RemoveStaleSocket(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path,
+                _RequestHandler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+# A connection to a server.
+class Client:
+    def __init__(self, socket_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile("rwb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    # Sends a request and returns the lines of the response. Raises
+    # ValueError if the server answers with an error.
+    def Request(self, request):
+        self.file.write(request.strip().encode() + b"\n")
+        self.file.flush()
+        status = self.file.readline().decode().rstrip("\n")
+        if status.startswith("ERROR "):
+            raise ValueError(status[len("ERROR "):])
+        if not status.startswith("OK "):
+            raise ValueError("malformed response: " + status)
+        return [self.file.readline().decode().rstrip("\n")
+                for _ in range(int(status[len("OK "):]))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves queries on the "
+            "tRNA catalogue and its tables over a Unix domain socket.")
+    format_group = parser.add_mutually_exclusive_group()
+    format_group.add_argument("-f", dest="file_format",
+            action="store_const", const=FileFormat.FA)
+    format_group.add_argument("-s", dest="file_format",
+            action="store_const", const=FileFormat.SS)
+    format_group.add_argument("-t", dest="file_format",
+            action="store_const", const=FileFormat.TRNA)
+    parser.add_argument("records_file", nargs="?")
+    parser.add_argument("names_file", nargs="?")
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--lookup")
+    parser.add_argument("--occurrences")
+    parser.add_argument("--sources")
+    parser.add_argument("--connect", action="store_true")
+    args = parser.parse_args()
+
+    if args.connect:
+        with Client(args.socket) as client:
+            for request in sys.stdin:
+                if not request.strip():
+                    continue
+                try:
+                    print("\n".join(client.Request(request)))
+                except ValueError as error:
+                    print("error: " + str(error), file=sys.stderr)
+        sys.exit(0)
+
+    if args.records_file is None or args.names_file is None:
+        parser.error("the tRNA records and .names files are required")
+
+    with open(args.records_file, 'r') as records_file:
+        trna_records = trnapy.ReadTRNARecords(records_file,
+                args.file_format)
+    trna_records.AddCCAToAll()
+    trna_records.ExpandAll()
+
+    occurrences_index = None
+    try:
+        fragments = trnapy.NamesFile(args.names_file)
+        if args.occurrences is not None:
+            occurrences_index = occurrences.OccurrencesIndex(
+                    args.occurrences, fragments)
+    except ValueError as error:
+        parser.error(str(error))
+    sources = None if args.sources is None else \
+            fragment_sources.FragmentSources(args.sources)
+    lookup_file = None if args.lookup is None else open(args.lookup, 'r')
+    state = ServerState(trna_records, fragments, lookup_file,
+            occurrences_index, sources)
+    if lookup_file is not None:
+        lookup_file.close()
+
+    try:
+        server = Server(args.socket, state)
+    except ValueError as error:
+        parser.error(str(error))
+    # Lets the socket file be removed when the server is killed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print("Serving " + str(state) + " on " + args.socket, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for table in (sources, occurrences_index, fragments):
+            if table is not None:
+                table.close()
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+
+import gzip
+import io
+import os
+import tempfile
+import threading
+
+import occurrences
+import server
+import testing
+import trnapy
+
+ut = testing.UnitTestCollection()
+
+fa_file = """>trna17_HisGTG_M_+_12138_12206
+GTAAATATAGTTTAACCAAAACATCAGATTGTGAATCTGACAACAGAGGCTTACGACCCCTTATTTACC
+>trna20_GluTTC_M_-_14674_14742
+GTTCTTGTAGTTGAAATACAACGATGGTTTTTCATATCATTGGTCGTGGTTGTAGTCCGTGCGAGAATA"""
+
+names_file = "AAAACATCAGATTGTG\ti-tRF\nGTAAATATAGTTTAAC\t5'-tRF\n"
+lookup_file = "AAAACATCAGATTGTG\tY\nGTAAATATAGTTTAAC\tN\n"
+occurrences_file = \
+        "AAAACATCAGATTGTG\tchr1\t10-25\t+\tchrM.trna17\n" \
+        "AAAACATCAGATTGTG\tchr2\t50-65\t-\tchrM.trna17\n" \
+        "ACGTACGTACGTACGT\tchr2\t70-85\t+\t-\n" \
+        "GTAAATATAGTTTAAC\tchr3\t5-20\t+\tchrM.trna17\n"
+
+
+# Returns a ServerState with the tables above, written to directory.
+def State(directory, occurrences_index=None):
+    trna_records = trnapy.ReadTRNARecordsFromFAFile(io.StringIO(fa_file))
+    trna_records.AddCCAToAll()
+    trna_records.ExpandAll()
+    names_path = os.path.join(directory, "test.names")
+    with open(names_path, "w") as names:
+        names.write(names_file)
+    return server.ServerState(trna_records, trnapy.NamesFile(names_path),
+            io.StringIO(lookup_file), occurrences_index)
+
+
+@ut()
+def ServerState_test():
+    with tempfile.TemporaryDirectory() as directory:
+        state = State(directory)
+        ut.ExpectEq(state.Respond("CLASSIFY GTAAATATAGTTTAAC acgt"),
+                ["GTAAATATAGTTTAAC\t1\t5'-tRF\tN", "ACGT\t-\t-\t-"])
+        ut.ExpectEq(state.Respond("LOOKUP 0 5"),
+                ["AAAACATCAGATTGTG\tY", "GTAAATATAGTTTAAC\tN"])
+        ut.ExpectEq(state.Respond("CONTAINED chrM + 12140 12160"), ["Y"])
+        ut.ExpectEq(state.Respond("CONTAINED chrM - 12140 12160"), ["N"])
+        for request in ["", "FOO", "LOOKUP 1", "LOCATE ACGT", "TRNAS ACGT"]:
+            try:
+                state.Respond(request)
+                ut.ExpectEq(request, "rejected")
+            except ValueError:
+                pass
+
+
+@ut()
+def ServerState_occurrences_test():
+    with tempfile.TemporaryDirectory() as directory:
+        state = State(directory)
+        for path in [os.path.join(directory, "test.occurrences"),
+                os.path.join(directory, "test.occurrences.gz")]:
+            with (gzip.open if path.endswith(".gz") else open)(path,
+                    "wt") as table_file:
+                table_file.write(occurrences_file)
+            with occurrences.OccurrencesIndex(path,
+                    state.fragments) as index:
+                state.occurrences = index
+                ut.ExpectEq(state.Respond("LOCATE aaaacatcagattgtg"),
+                        occurrences_file.splitlines()[:2])
+                ut.ExpectEq(state.Respond("LOCATE GTAAATATAGTTTAAC"),
+                        occurrences_file.splitlines()[3:])
+                # Fragments not in the .names file are not listed.
+                ut.ExpectEq(state.Respond("LOCATE ACGTACGTACGTACGT"), [])
+
+
+@ut()
+def Server_test():
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "server.sock")
+        trna_server = server.Server(socket_path, State(directory))
+        thread = threading.Thread(target=trna_server.serve_forever)
+        thread.start()
+        try:
+            with server.Client(socket_path) as client:
+                ut.ExpectEq(client.Request("INFO")[:2],
+                        ["trnas\t10", "fragments\t2"])
+                ut.ExpectEq(client.Request("CLASSIFY AAAACATCAGATTGTG"),
+                        ["AAAACATCAGATTGTG\t0\ti-tRF\tY"])
+                try:
+                    client.Request("LOOKUP x y")
+                    ut.ExpectEq("LOOKUP x y", "rejected")
+                except ValueError:
+                    pass
+                ut.ExpectEq(client.Request("LOOKUP 1 1"),
+                        ["GTAAATATAGTTTAAC\tN"])
+                # A request which is not UTF-8 is answered with an
+                # error, and the connection stays usable.
+                client.file.write(b"CLASSIFY \xff\xfe\n")
+                client.file.flush()
+                ut.ExpectEq(client.file.readline().startswith(b"ERROR "),
+                        True)
+                ut.ExpectEq(client.Request("INFO")[1], "fragments\t2")
+        finally:
+            trna_server.shutdown()
+            thread.join()
+            trna_server.server_close()
+        ut.ExpectEq(os.path.exists(socket_path), False)
+
+
+@ut()
+def RemoveStaleSocket_test():
+    with tempfile.TemporaryDirectory() as directory:
+        # A regular file is left alone.
+        path = os.path.join(directory, "notes.txt")
+        with open(path, "w") as notes_file:
+            notes_file.write("notes\n")
+        try:
+            server.Server(path, State(directory))
+            ut.ExpectEq(path, "rejected")
+        except ValueError:
+            pass
+        ut.ExpectEq(os.path.exists(path), True)
+
+        # The socket of a running server is not taken over.
+        socket_path = os.path.join(directory, "server.sock")
+        trna_server = server.Server(socket_path, State(directory))
+        try:
+            server.Server(socket_path, State(directory))
+            ut.ExpectEq(socket_path, "taken over")
+        except ValueError:
+            pass
+        # The socket file of a server which is gone is replaced.
+        trna_server.socket.close()
+        ut.ExpectEq(os.path.exists(socket_path), True)
+        trna_server = server.Server(socket_path, State(directory))
+        trna_server.server_close()
+
+
+if __name__ == "__main__":
+    ut.RunTests()
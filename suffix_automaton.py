@@ -0,0 +1,155 @@
+# This module provides a generalized suffix automaton (a DAWG) over a
+# set of sequences, such as the tRNAs of a catalogue.
+#
+# Each state of the automaton stands for a set of substrings which end
+# at the same positions of the sequences; every distinct substring is
+# reached from the initial state by exactly one path. The automaton
+# has at most twice as many states as the sequences have characters,
+# so its size depends on the distinct content of the sequences rather
+# than on the number of their substrings.
+#
+# Substrings() walks the paths in order of their characters, and so
+# yields each distinct substring once, in sorted order. The positions
+# at which a substring occurs are the end positions recorded on its
+# state and on the states below it in the tree of suffix links, which
+# EndPositions() gathers.
+#
+# Sample usage:
+#
+#   automaton = SuffixAutomaton()
+#   for sequence_id, sequence in enumerate(sequences):
+#       automaton.add(sequence, sequence_id)
+#   for substring, state in automaton.Substrings(16, 50):
+#       ends = automaton.EndPositions(state)
+
+
+class SuffixAutomaton:
+    def __init__(self):
+        # The transitions, suffix link and length of the longest
+        # substring of each state; state 0 is the initial state.
+        self.transitions = [{}]
+        self.links = [-1]
+        self.lengths = [0]
+        # The (sequence id, end position) pairs at which each state
+        # was reached while adding the sequences.
+        self.ends = [[]]
+        # The children of each state in the tree of suffix links,
+        # built when first needed.
+        self._children = None
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __str__(self):
+        return "<SuffixAutomaton with " + str(len(self)) + " states>"
+
+    def __repr__(self):
+        return str(self)
+
+    # Returns True iff text is a substring of one of the sequences.
+    def __contains__(self, text):
+        state = 0
+        for c in text:
+            state = self.transitions[state].get(c)
+            if state is None:
+                return False
+        return True
+
+    # Adds sequence to the automaton. Its end positions are recorded
+    # under sequence_id.
+    def add(self, sequence, sequence_id=None):
+        self._children = None
+        last = 0
+        for position, c in enumerate(sequence):
+            last = self._Extend(last, c)
+            self.ends[last].append((sequence_id, position))
+
+    # Yields a pair (substring, state) for each distinct substring of
+    # the sequences having a length between min_length and max_length,
+    # in sorted order.
+    def Substrings(self, min_length, max_length):
+        path = []
+        stack = [iter(sorted(self.transitions[0].items()))]
+        while stack:
+            transition = next(stack[-1], None)
+            if transition is None:
+                stack.pop()
+                if path:
+                    path.pop()
+                continue
+            c, state = transition
+            path.append(c)
+            if len(path) >= min_length:
+                yield "".join(path), state
+            if len(path) < max_length:
+                stack.append(iter(sorted(self.transitions[state].items())))
+            else:
+                path.pop()
+
+    # Returns the list of the (sequence id, end position) pairs at
+    # which the substrings of state end, in no particular order.
+    def EndPositions(self, state):
+        if self._children is None:
+            self._children = [[] for _ in self.lengths]
+            for child, link in enumerate(self.links):
+                if link >= 0:
+                    self._children[link].append(child)
+        ends = []
+        stack = [state]
+        while stack:
+            state = stack.pop()
+            ends.extend(self.ends[state])
+            stack.extend(self._children[state])
+        return ends
+
+    def _NewState(self, length, link, transitions):
+        self.transitions.append(transitions)
+        self.links.append(link)
+        self.lengths.append(length)
+        self.ends.append([])
+        return len(self.lengths) - 1
+
+    # Splits off a state of the given length from q, taking over its
+    # transitions and suffix link, and makes it q's suffix link.
+    def _Clone(self, q, length):
+        clone = self._NewState(length, self.links[q],
+                dict(self.transitions[q]))
+        self.links[q] = clone
+        return clone
+
+    # Redirects the transitions on c to q from p and its suffix links
+    # to clone.
+    def _Redirect(self, p, c, q, clone):
+        while p != -1 and self.transitions[p].get(c) == q:
+            self.transitions[p][c] = clone
+            p = self.links[p]
+
+    # Returns the state reached by appending c to the longest
+    # substring of last, creating it if need be.
+    def _Extend(self, last, c):
+        lengths = self.lengths
+        transitions = self.transitions
+        if c in transitions[last]:
+            # The substring is already known, as a part of another
+            # sequence.
+            q = transitions[last][c]
+            if lengths[last] + 1 == lengths[q]:
+                return q
+            clone = self._Clone(q, lengths[last] + 1)
+            self._Redirect(last, c, q, clone)
+            return clone
+
+        current = self._NewState(lengths[last] + 1, 0, {})
+        p = last
+        while p != -1 and c not in transitions[p]:
+            transitions[p][c] = current
+            p = self.links[p]
+        if p != -1:
+            q = transitions[p][c]
+            if lengths[p] + 1 == lengths[q]:
+                self.links[current] = q
+            else:
+                clone = self._Clone(q, lengths[p] + 1)
+                self._Redirect(p, c, q, clone)
+                self.links[current] = clone
+        return current
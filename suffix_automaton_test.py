@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+
+import random
+
+import suffix_automaton
+import testing
+
+ut = testing.UnitTestCollection()
+
+
+def BuildAutomaton(sequences):
+    automaton = suffix_automaton.SuffixAutomaton()
+    for sequence_id, sequence in enumerate(sequences):
+        automaton.add(sequence, sequence_id)
+    return automaton
+
+
+# Returns the substrings of the sequences having lengths between
+# min_length and max_length, sorted, each with its sorted list of
+# (sequence id, end position) pairs.
+def BruteForceSubstrings(sequences, min_length, max_length):
+    ends = {}
+    for sequence_id, sequence in enumerate(sequences):
+        for start in range(len(sequence)):
+            for length in range(min_length, max_length + 1):
+                if start + length > len(sequence):
+                    break
+                ends.setdefault(sequence[start : start + length],
+                        []).append((sequence_id, start + length - 1))
+    return sorted(ends.items())
+
+
+@ut()
+def Substrings_test():
+    sequences = ["GCATTGG", "ATTGGCA", "TTT", "GCATT"]
+    automaton = BuildAutomaton(sequences)
+    ut.ExpectEq([(substring, sorted(automaton.EndPositions(state)))
+        for substring, state in automaton.Substrings(2, 4)],
+        BruteForceSubstrings(sequences, 2, 4))
+
+
+@ut()
+def RandomSubstrings_test():
+    generator = random.Random(45)
+    for _ in range(20):
+        sequences = ["".join(generator.choice("ACGT")
+            for _ in range(generator.randint(1, 30)))
+            for _ in range(generator.randint(1, 6))]
+        automaton = BuildAutomaton(sequences)
+        ut.ExpectEq([(substring, sorted(automaton.EndPositions(state)))
+            for substring, state in automaton.Substrings(3, 8)],
+            BruteForceSubstrings(sequences, 3, 8))
+        # A suffix automaton has fewer than twice as many states as
+        # there are characters.
+        ut.ExpectEq(len(automaton) < 2 * sum(map(len, sequences)) + 1,
+                True)
+
+
+@ut()
+def Contains_test():
+    automaton = BuildAutomaton(["GCATTGG", "TTTA"])
+    ut.ExpectIn("CATT", automaton)
+    ut.ExpectIn("TTTA", automaton)
+    ut.ExpectIn("", automaton)
+    ut.ExpectEq("GGT" in automaton, False)
+    ut.ExpectEq("TTGGT" in automaton, False)
+
+
+if __name__ == "__main__":
+    ut.RunTests()
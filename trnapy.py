@@ -1,7 +1,10 @@
 # This module provides some basic functionality for working
 # with tRNA's.
 
+import array
+import bisect
 import copy
+import mmap
 import re
 from enum import Enum, auto
 
@@ -260,27 +263,14 @@ class FragmentableTRNARecord(tRNARecord):
                 fragment_type=self.FragmentType(start_index, length))
 
 
+# Complements A, C, G and T, and leaves all other characters alone.
+_NUCLEOTIDE_COMPLEMENTS = str.maketrans("ACGT", "TGCA")
+
+
 # Computes and returns the inverse complement of a fragment,
 # represented as a string.
 def InverseComplement(fragment_str):
-    # Returns the complement of a nucleotide.
-    def NucleotideComplement(c):
-        if c == 'A':
-            return 'T'
-        elif c == 'T':
-            return 'A'
-        elif c == 'C':
-            return 'G'
-        elif c == 'G':
-            return 'C'
-        else:
-            return c
-    fragment_list = list(fragment_str)
-    fragment_list.reverse()
-    ic = []
-    for c in fragment_list:
-        ic.append(NucleotideComplement(c))
-    return "".join(ic)
+    return fragment_str.translate(_NUCLEOTIDE_COMPLEMENTS)[::-1]
 
 
 # Reads a .ss file and returns the all the records as a tRNA
@@ -410,6 +400,16 @@ def ReadTRNARecordsFromTRNAFile(trna_file):
 
     return trna_records
 
+# Reads the tRNA records held in records_file, which is in the given
+# FileFormat.
+def ReadTRNARecords(records_file, file_format):
+    if file_format == FileFormat.FA:
+        return ReadTRNARecordsFromFAFile(records_file)
+    elif file_format == FileFormat.TRNA:
+        return ReadTRNARecordsFromTRNAFile(records_file)
+    return ReadTRNARecordsFromSSFile(records_file)
+
+
 # Represents a tRNA fragment. The type of the fragment is
 # automatically computed. The source trna is stored.
 # The fragment_type field can be omitted, in which case
@@ -572,6 +572,119 @@ def ReadMatchDictFromFile(matches_file, chromosome,
         match_dict[key].append(match)
 
 
+# Yields the fragments of trna having lengths between range_lower and
+# range_upper, by start index and then by length. Only the fragments
+# starting at the first base of an expanded tRNA are yielded, as the
+# others are fragments of the tRNA it was expanded from.
+def TRNAFragments(trna, range_lower, range_upper):
+    # If [ACTG] has been prepended.
+    if trna.expanded:
+        for length in range(range_lower, 1 + min(range_upper, len(trna))):
+            yield trna.fragment(0, length)
+    else:
+        for start_index in range(len(trna) - range_lower + 1):
+            for length in range(range_lower, 1 + min(
+                        range_upper, len(trna) - start_index)):
+                yield trna.fragment(start_index, length)
+
+
+# Returns the index of fragment in fragments, a sorted sequence of
+# fragments, or None if it is not there.
+def FindFragment(fragments, fragment):
+    i = bisect.bisect_left(fragments, fragment)
+    if i < len(fragments) and fragments[i] == fragment:
+        return i
+    return None
+
+
+# Yields a pair (fragment, id) for each fragment of sorted_fragments,
+# an iterable of fragments in sorted order, which is in fragments, as
+# FindFragment() would find them. Each binary search starts from the
+# position the last one ended at.
+def FindSortedFragments(fragments, sorted_fragments):
+    i = 0
+    for fragment in sorted_fragments:
+        i = bisect.bisect_left(fragments, fragment, i)
+        if i < len(fragments) and fragments[i] == fragment:
+            yield fragment, i
+
+
+# The fragments listed in a .names file, in the order in which they
+# appear. The id of a fragment is its (0-based) line number in the
+# file, blank lines aside, so the ids are dense and fixed once the
+# .names file has been written.
+#
+# The file is mapped into memory, and only the offsets of its lines
+# are held, so that a NamesFile takes 8 bytes per fragment, and
+# processes forked from its owner share its pages. Since .names files
+# are written in sorted order, the id of a fragment is found by binary
+# search (see find()). The fragments must be in strictly increasing
+# byte order, as naming.py and batch.py write them; a ValueError is
+# raised otherwise. A .names file from elsewhere can be put in that
+# order with LC_ALL=C sort -u -k1,1 (see the README).
+class NamesFile:
+    def __init__(self, path):
+        self.path = path
+        self.starts = array.array("Q")
+        with open(path, "rb") as names_file:
+            position = 0
+            previous = None
+            for line in names_file:
+                if not line.isspace():
+                    fragment = line.split(None, 1)[0]
+                    if previous is not None and fragment <= previous:
+                        raise ValueError("The .names file " + path +
+                                " is not sorted; sort it with "
+                                "LC_ALL=C sort -u -k1,1")
+                    previous = fragment
+                    self.starts.append(position)
+                position += len(line)
+            # An empty file cannot be mapped.
+            self.mapping = mmap.mmap(names_file.fileno(), 0,
+                    access=mmap.ACCESS_READ) if position else b""
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __str__(self):
+        return "<NamesFile " + self.path + " with " + str(len(self)) + \
+                " fragments>"
+
+    def __repr__(self):
+        return str(self)
+
+    # Returns the fragment with id i, or the list of those in slice i.
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._Line(i).split(None, 1)[0].decode()
+
+    # Returns the line of the fragment with id i, without its line end.
+    def line(self, i):
+        return self._Line(i).decode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self.mapping, mmap.mmap):
+            self.mapping.close()
+
+    # Returns the id of fragment, or None if it is not listed.
+    def find(self, fragment):
+        return FindFragment(self, fragment)
+
+    def _Line(self, i):
+        start = self.starts[i]
+        end = self.mapping.find(b"\n", start)
+        if end < 0:
+            end = len(self.mapping)
+        return self.mapping[start:end].rstrip(b"\r")
+
+
 # Returns a dictionary keyed by a <chromosome name, sign> pair.
 # E.g. (chr19, "-")
 # Each value is a list of ordered pairs <start_index, end_index>,
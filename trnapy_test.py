@@ -3,6 +3,8 @@
 import copy
 import functools
 import io
+import os
+import tempfile
 
 import testing
 import trnapy
@@ -383,6 +385,32 @@ def GenomePosition_test2(
             expected_genome_interval)
 
 
+@ut()
+def NamesFile_test():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "a.names")
+        with open(path, "w") as names_file:
+            names_file.write("AAC\tExclusive\n\nCGT\tAmbiguous\nTTA")
+        with trnapy.NamesFile(path) as fragments:
+            ut.ExpectEq(len(fragments), 3)
+            ut.ExpectEq(fragments[2], "TTA")
+            ut.ExpectEq(fragments[1:], ["CGT", "TTA"])
+            ut.ExpectEq(fragments.find("CGT"), 1)
+            ut.ExpectEq(fragments.find("AAA"), None)
+            ut.ExpectEq(fragments.find("TTT"), None)
+
+        with open(path, "w") as names_file:
+            names_file.write("CGT\nAAC\n")
+        try:
+            trnapy.NamesFile(path)
+            ut.ExpectEq("unsorted", "rejected")
+        except ValueError:
+            pass
+
+        open(path, "w").close()
+        ut.ExpectEq(len(trnapy.NamesFile(path)), 0)
+        ut.ExpectEq(trnapy.NamesFile(path).find("AAC"), None)
+
 
 if __name__ == "__main__":
     ut.RunTests()